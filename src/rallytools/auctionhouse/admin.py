@@ -3,9 +3,44 @@ from .models import *
 
 @admin.register(Commodity)
 class CommodityAdmin(admin.ModelAdmin):
-    list_display = ['item__name', 'market_price', 'quantity', 'timestamp', 'origin']
+    list_display = ['item__name', 'region', 'market_price', 'quantity', 'sold_quantity', 'timestamp', 'origin']
+    list_filter = ['region']
     ordering = ['-timestamp', 'item__name']
     search_fields = ['item__name', 'item__id']
 
     def has_change_permission(self, request, obj=None):
         return False
+
+
+@admin.register(CommoditySnapshot)
+class CommoditySnapshotAdmin(admin.ModelAdmin):
+    list_display = ['timestamp', 'region', 'last_modified', 'origin']
+    exclude = ['listings']
+    list_filter = ['region']
+    ordering = ['-timestamp']
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(CommodityCandle)
+class CommodityCandleAdmin(admin.ModelAdmin):
+    list_display = ['item__name', 'region', 'interval', 'start', 'open', 'high', 'low', 'close', 'volume']
+    list_filter = ['region', 'interval']
+    ordering = ['-start', 'item__name']
+    search_fields = ['item__name', 'item__id']
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(CommodityPriceSketch)
+class CommodityPriceSketchAdmin(admin.ModelAdmin):
+    list_display = ['item__name', 'region', 'day', 'snapshots']
+    exclude = ['sketch']
+    list_filter = ['region']
+    ordering = ['-day', 'item__name']
+    search_fields = ['item__name', 'item__id']
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,219 @@
+import os
+import platform
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+import numpy as np
+from rallytools import clients
+from lib import battlenet, indicators, market, synthetic
+from lib.standin import BattleNetStandInServer
+from lib.transport import FixtureStore
+from gamedata.models import Item
+from .jobs import AuctionHouseImporter
+
+# Stages that only need numpy, in the order they run
+ANALYSIS_STAGES = ('parse', 'group', 'cluster', 'analyze', 'analyze_parallel', 'diff', 'depth', 'pack', 'indicators')
+
+COMMODITIES_ENDPOINT = '/data/wow/auctions/commodities'
+
+# Hourly candles over a month, as charted
+INDICATOR_PERIODS = 720
+
+
+def time_runs(function, repeat):
+    """
+    Calls function repeat times.
+
+    Returns:
+        dict: Fastest and mean run time, in seconds, and the number of runs.
+    """
+    timings = []
+    for _ in range(max(1, repeat)):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return summarize(timings)
+
+
+def summarize(timings):
+    return {
+        'best_seconds': round(min(timings), 4),
+        'mean_seconds': round(sum(timings) / len(timings), 4),
+        'runs': len(timings),
+    }
+
+
+def environment():
+    """
+    What the results depend on besides the parameters
+    """
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'json_backend': battlenet.JSON_BACKEND,
+    }
+
+
+def _indicator_series(num_items, seed):
+    """
+    Random walk high/low/close prices and volumes of num_items items over INDICATOR_PERIODS periods
+    """
+    rng = np.random.default_rng(seed)
+    shape = (num_items, INDICATOR_PERIODS)
+    close = 5000 * np.exp(np.cumsum(rng.normal(0, 0.02, shape), axis=1))
+    high = close * (1 + rng.exponential(0.01, shape))
+    low = close * (1 - rng.uniform(0, 0.02, shape))
+    volume = rng.zipf(1.6, shape).astype(np.float64)
+    # Gaps where an item wasn't listed
+    volume[rng.random(shape) < 0.02] = np.nan
+    return high, low, close, volume
+
+
+def run_analysis_benchmarks(listings, next_listings, stages=ANALYSIS_STAGES, repeat=3, workers=0, seed=0):
+    """
+    Times the market analysis of a snapshot, stage by stage.
+
+    Args:
+        listings (CommodityListings): The snapshot to analyze.
+        next_listings (CommodityListings): The following snapshot, diffed against listings.
+        stages (iterable, optional): Some of ANALYSIS_STAGES.
+        repeat (int, optional): Runs per stage.
+        workers (int, optional): Processes for analyze_parallel. 0 for one per core.
+        seed (int, optional): Seed of the indicator series.
+
+    Returns:
+        dict: {stage: time_runs results, plus listings_per_second where it applies}.
+    """
+    results = {}
+    groups = market.ItemGroups(listings)
+    previous_analysis = market.analyze_market_data(listings)
+
+    def aggregate():
+        groups = market.ItemGroups(listings)
+        for ufunc, column in ((np.minimum, groups.unit_price), (np.maximum, groups.unit_price), (np.add, groups.quantity)):
+            groups.reduce(ufunc, column)
+
+    def diff():
+        snapshot_diff = market.SnapshotDiff(listings, next_listings)
+        market.update_market_data(previous_analysis, snapshot_diff, next_listings)
+        snapshot_diff.item_changes()
+
+    def pack():
+        market.unpack_snapshot(market.pack_snapshot(listings, previous_analysis))
+
+    high, low, close, volume = _indicator_series(len(groups), seed)
+    typical_price = (high + low + close) / 3
+
+    def compute_indicators():
+        indicators.vwap(typical_price, volume)
+        indicators.money_flow_index(typical_price, volume)
+        indicators.chaikin_money_flow(high, low, close, volume)
+        indicators.price_volume_correlation(close, volume)
+
+    body = synthetic.commodities_body(listings) if 'parse' in stages else None
+    functions = {
+        'parse': lambda: market.CommodityListings.from_auctions(battlenet.json_loads(body)['auctions']),
+        'group': aggregate,
+        'cluster': lambda: market.calculate_market_prices(groups),
+        'analyze': lambda: market.analyze_market_data(listings),
+        'analyze_parallel': lambda: market.analyze_market_data(listings, workers=workers, min_parallel_listings=0),
+        'diff': diff,
+        'depth': lambda: market.OrderBookDepth(listings).depth_points(),
+        'pack': pack,
+        'indicators': compute_indicators,
+    }
+    for stage in stages:
+        results[stage] = time_runs(functions[stage], repeat)
+        if stage != 'indicators':
+            results[stage]['listings_per_second'] = round(len(listings) / results[stage]['best_seconds']) if results[stage]['best_seconds'] else None
+    return results
+
+
+def run_import_benchmark(snapshots, region='us'):
+    """
+    Times AuctionHouseImporter.import_region_commodities on each snapshot in turn, served by
+    a lib.standin.BattleNetStandInServer.  The first import analyzes the whole snapshot,
+    the following ones diff against the one before.
+
+    Writes items, commodities, snapshots and candles: only run it against a throwaway
+    database.  Items are created up front so that no item is fetched from Battle.net.
+
+    Args:
+        snapshots (list): CommodityListings to import, oldest first.
+        region (str, optional): Region to import them into.
+
+    Returns:
+        dict: {'import_full': ..., 'import_incremental': ...} time_runs style results plus the
+              number of commodities added, the latter only with more than one snapshot.
+    """
+    item_ids = np.unique(np.concatenate([listings.item_id for listings in snapshots])).tolist()
+    Item.objects.bulk_create(
+        [Item(id=item_id, name=f"Synthetic {item_id}", icon='', item_class='Synthetic', item_subclass='Synthetic') for item_id in item_ids],
+        batch_size=5000,
+        ignore_conflicts=True,
+    )
+
+    timings = []
+    num_added = []
+    first_hour = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    with tempfile.TemporaryDirectory() as fixture_dir:
+        store = FixtureStore(fixture_dir)
+        server = BattleNetStandInServer(fixture_dir)
+        server.start()
+        battlenet_clients = clients.BattleNetClients([region], client_factory=lambda region: battlenet.BattleNetAPI(
+            'benchmark', 'benchmark', region=region, api_host=server.url, token_url=f"{server.url}/oauth/token"
+        ))
+        try:
+            importer = AuctionHouseImporter(battlenet_clients=battlenet_clients)
+            for i, listings in enumerate(snapshots):
+                headers = {
+                    'Content-Type': 'application/json',
+                    'Last-Modified': format_datetime(first_hour + timedelta(hours=i), usegmt=True),
+                }
+                params = {'namespace': f"dynamic-{region}", 'locale': 'en_US'}
+                store.save('GET', COMMODITIES_ENDPOINT, params, 200, headers, synthetic.commodities_body(listings))
+
+                started = time.perf_counter()
+                results = importer.import_region_commodities(region)
+                timings.append(time.perf_counter() - started)
+                num_added.append(results['num_added'])
+        finally:
+            battlenet_clients.close()
+            server.stop()
+
+    results = {'import_full': dict(summarize(timings[:1]), num_added=num_added[0])}
+    if len(timings) > 1:
+        results['import_incremental'] = dict(summarize(timings[1:]), num_added=sum(num_added[1:]))
+    return results
+
+
+def compare_results(results, baseline, tolerance=0.2):
+    """
+    Compares the best time of every stage with a baseline run.
+
+    Args:
+        results (dict): Benchmark results, as written by benchmark_market.
+        baseline (dict): Earlier results, with the same parameters.
+        tolerance (float, optional): How much slower than the baseline a stage may get.
+
+    Returns:
+        tuple: ({stage: {'baseline_seconds', 'best_seconds', 'ratio'}}, list of regressed stages).
+    """
+    comparison = {}
+    regressions = []
+    for stage, result in results['stages'].items():
+        before = baseline.get('stages', {}).get(stage)
+        if not before or not before['best_seconds']:
+            continue
+        ratio = result['best_seconds'] / before['best_seconds']
+        comparison[stage] = {
+            'baseline_seconds': before['best_seconds'],
+            'best_seconds': result['best_seconds'],
+            'ratio': round(ratio, 3),
+        }
+        if ratio > 1 + tolerance:
+            regressions.append(stage)
+    return comparison, regressions
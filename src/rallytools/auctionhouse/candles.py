@@ -0,0 +1,113 @@
+import logging
+from datetime import datetime, timezone
+import numpy as np
+from django.db import transaction
+from django.db.models import Min
+from lib.candles import Candles
+from .models import Commodity, CommodityCandle
+
+logger = logging.getLogger('__name__')
+
+CANDLE_FIELDS = ('open', 'high', 'low', 'close', 'volume', 'quantity', 'snapshots')
+
+
+def snapshot_times(region, origins=None):
+    """
+    Import time of every snapshot of a region, as {origin: datetime}, oldest first.
+    A snapshot is timestamped by its first commodity, so all of its commodities fall in the same candles
+    """
+    commodities = Commodity.objects.filter(region=region)
+    if origins is not None:
+        commodities = commodities.filter(origin__in=origins)
+    times = commodities.values('origin').annotate(time=Min('timestamp')).order_by('time')
+    return {row['origin']: row['time'] for row in times}
+
+
+def _to_epoch(time):
+    return int(time.timestamp())
+
+
+def _from_epoch(seconds):
+    return datetime.fromtimestamp(seconds, tz=timezone.utc)
+
+
+def load_candles(region, interval, item_ids, starts):
+    """
+    Stored candles of the given items and starts, as lib.candles.Candles
+    """
+    rows = list(CommodityCandle.objects.filter(
+        region=region, interval=interval, item_id__in=item_ids, start__in=[_from_epoch(start) for start in starts]
+    ).values_list('item_id', 'start', *CANDLE_FIELDS))
+    if not rows:
+        return Candles.empty()
+    columns = list(zip(*rows))
+    columns[1] = [_to_epoch(start) for start in columns[1]]
+    return Candles(**dict(zip(Candles.COLUMNS, columns)))
+
+
+def update_candles(region, origins, intervals):
+    """
+    Adds snapshots to the candles of a region.
+
+    The snapshots' commodities are resampled into candles (lib.candles), which
+    are merged into the stored candles they overlap. Snapshots must be added
+    once each, oldest first: after every import, or in order by rebuild_candles.
+
+    Args:
+        region (str): Region of the snapshots.
+        origins (list): Origins of the snapshots to add.
+        intervals (list): Candle intervals to update, e.g. ['1h', '1d', '1w'].
+
+    Returns:
+        int: Number of candles written.
+    """
+    times = snapshot_times(region, origins)
+    if not times:
+        return 0
+    epochs = {origin: _to_epoch(time) for origin, time in times.items()}
+    rows = Commodity.objects.filter(region=region, origin__in=list(times)).values_list(
+        'item_id', 'origin', 'market_price', 'quantity', 'sold_quantity'
+    )
+    item_id, origin, price, quantity, volume = zip(*rows.iterator(chunk_size=10000))
+    time = np.array([epochs[o] for o in origin], dtype=np.int64)
+    volume = np.array([np.nan if v is None else v for v in volume], dtype=np.float64)
+
+    num_written = 0
+    with transaction.atomic():
+        for interval in intervals:
+            candles = Candles.from_observations(item_id, time, price, quantity, volume, interval)
+            stored = load_candles(region, interval, np.unique(candles.item_id).tolist(), np.unique(candles.start).tolist())
+            candles = stored.merge(candles)
+            columns = {column: getattr(candles, column).tolist() for column in Candles.COLUMNS}
+            CommodityCandle.objects.bulk_create(
+                [
+                    CommodityCandle(
+                        item_id=columns['item_id'][i], region=region, interval=interval, start=_from_epoch(columns['start'][i]),
+                        **{field: columns[field][i] for field in CANDLE_FIELDS}
+                    )
+                    for i in range(len(candles))
+                ],
+                batch_size=5000,
+                update_conflicts=True,
+                unique_fields=['item', 'region', 'interval', 'start'],
+                update_fields=list(CANDLE_FIELDS),
+            )
+            num_written += len(candles)
+    return num_written
+
+
+def rebuild_candles(region, intervals, batch_size=24):
+    """
+    Deletes the candles of a region and builds them again from every stored snapshot,
+    batch_size snapshots at a time
+
+    Returns:
+        int: Number of candles written.
+    """
+    CommodityCandle.objects.filter(region=region, interval__in=intervals).delete()
+    origins = list(snapshot_times(region))
+    num_written = 0
+    for i in range(0, len(origins), batch_size):
+        num_written += update_candles(region, origins[i:i + batch_size], intervals)
+        logger.info(f"INFO: Added {min(i + batch_size, len(origins))}/{len(origins)} {region} snapshots to candles")
+    return num_written
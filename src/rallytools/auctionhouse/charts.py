@@ -0,0 +1,211 @@
+import hashlib
+import io
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.core.cache import caches
+from django.utils import timezone
+from rallytools import settings
+from lib import indicators, plotting
+from lib.candles import INTERVALS
+from .history import CandleHistory
+from gamedata.models import Item
+from .models import CommoditySnapshot
+
+INDICATORS = ('price', 'vwap', 'mfi', 'cmf')
+FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+DEFAULT_PERIODS = {
+    'mfi': 14,
+    'cmf': 20,
+}
+RANGE_UNITS = {
+    'h': timedelta(hours=1),
+    'd': timedelta(days=1),
+    'w': timedelta(weeks=1),
+}
+# Bounds on what a request may ask for, which also bound how many distinct charts can be cached
+MAX_RANGE = timedelta(days=365)
+MAX_PERIOD = 100
+
+_render_lock = threading.Lock()
+_render_pool = None
+# Renders in progress, by cache key, so concurrent requests for the same chart share one render
+_rendering = {}
+_style_applied = False
+
+
+class ChartError(Exception):
+    """
+    Raised for chart requests that can't be rendered
+    """
+    pass
+
+class ChartDataError(ChartError):
+    """
+    Raised when there are no candles to chart
+    """
+    pass
+
+
+class ChartRequest(object):
+    """
+    A validated chart request.  Its key identifies the rendered image, given the latest snapshot of its region
+    """
+
+    def __init__(self, item_id, indicator, interval='1d', range='30d', format='png', region='us', period=None):
+        if indicator not in INDICATORS:
+            raise ChartError(f"Unknown indicator '{indicator}'.  Expected one of {', '.join(INDICATORS)}")
+        if interval not in INTERVALS:
+            raise ChartError(f"Unknown interval '{interval}'.  Expected one of {', '.join(INTERVALS)}")
+        if format not in FORMATS:
+            raise ChartError(f"Unknown format '{format}'.  Expected one of {', '.join(FORMATS)}")
+        if region not in settings.BATTLENET_REGIONS:
+            raise ChartError(f"Unknown region '{region}'.  Expected one of {', '.join(settings.BATTLENET_REGIONS)}")
+        match = re.fullmatch(r'([1-9]\d{0,3})([hdw])', range or '')
+        try:
+            duration = int(match.group(1)) * RANGE_UNITS[match.group(2)] if match else None
+        except OverflowError:
+            duration = None
+        if duration is None or duration > MAX_RANGE:
+            raise ChartError(f"Invalid range '{range}'.  Expected e.g. 12h, 30d or 8w, of at most {MAX_RANGE.days} days")
+        try:
+            period = int(period) if period is not None else DEFAULT_PERIODS.get(indicator)
+        except ValueError:
+            raise ChartError(f"Invalid period '{period}'")
+        if period is not None and not 1 <= period <= MAX_PERIOD:
+            raise ChartError(f"Invalid period '{period}'.  Expected 1 to {MAX_PERIOD}")
+
+        self.item_id = item_id
+        self.indicator = indicator
+        self.interval = interval
+        self.range = range
+        self.duration = duration
+        self.format = format
+        self.region = region
+        self.period = period
+
+    @property
+    def content_type(self):
+        return FORMATS[self.format]
+
+    def key(self, snapshot_id):
+        # Keyed by the duration rather than the range as written, so 24h and 1d share a chart
+        return f"chart:{self.region}:{self.item_id}:{self.indicator}:{self.period}:{self.interval}:{int(self.duration.total_seconds())}:{snapshot_id}.{self.format}"
+
+
+def _pool():
+    global _render_pool
+    with _render_lock:
+        if _render_pool is None:
+            _render_pool = ThreadPoolExecutor(max_workers=settings.CHART_RENDER_WORKERS, thread_name_prefix='charts')
+        return _render_pool
+
+
+def chart_key(chart):
+    """
+    Cache key and ETag of a chart's current image, given the latest snapshot of its region.
+    Cheap enough to answer conditional requests without reading the cache
+
+    Returns:
+        tuple: (cache key, ETag).
+    """
+    snapshot_id = CommoditySnapshot.objects.filter(region=chart.region).order_by('-id').values_list('id', flat=True).first()
+    key = chart.key(snapshot_id)
+    return key, hashlib.sha256(key.encode()).hexdigest()[:32]
+
+
+def get_chart(chart, key=None):
+    """
+    Returns a chart's image, from the render cache when possible.
+
+    Images are cached under the region's latest snapshot id, so a new import
+    invalidates them, and a cache hit never imports matplotlib. Misses are
+    rendered by a pool of CHART_RENDER_WORKERS threads, which bounds how many
+    charts render at once.
+
+    Args:
+        chart (ChartRequest): The chart to render.
+        key (str, optional): The chart's cache key, if chart_key was already called.
+
+    Returns:
+        bytes: The image.
+    """
+    if key is None:
+        key, _ = chart_key(chart)
+    cache = caches[settings.CHART_CACHE_ALIAS]
+    image = cache.get(key)
+    if image is not None:
+        return image
+
+    with _render_lock:
+        future = _rendering.get(key)
+    if future is None:
+        history = CandleHistory.load(
+            chart.interval, [chart.item_id], region=chart.region, start=timezone.now() - chart.duration
+        )
+        if not len(history):
+            raise ChartDataError(f"No {chart.interval} candles of item {chart.item_id} in {chart.region} over the last {chart.range}")
+        title = Item.objects.filter(id=chart.item_id).values_list('name', flat=True).first() or str(chart.item_id)
+        pool = _pool()
+        with _render_lock:
+            future = _rendering.get(key)
+            if future is None:
+                future = pool.submit(_render_and_cache, key, chart, history, title)
+                _rendering[key] = future
+    return future.result()
+
+
+def _render_and_cache(key, chart, history, title):
+    try:
+        image = render_chart(chart.indicator, history, chart.format, period=chart.period, title=title)
+        caches[settings.CHART_CACHE_ALIAS].set(key, image, settings.CHART_CACHE_SECONDS)
+        return image
+    finally:
+        with _render_lock:
+            _rendering.pop(key, None)
+
+
+def render_chart(indicator, history, format='png', period=None, title=''):
+    """
+    Renders an indicator chart of the first item of a CandleHistory with matplotlib's non-interactive Agg backend.
+
+    Returns:
+        bytes: The image, in format ('png' or 'svg').
+    """
+    global _style_applied
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib import style
+    from matplotlib.figure import Figure
+
+    if not _style_applied:
+        # Style settings are process wide; apply them once rather than around every (concurrent) render
+        style.use(plotting.STYLE)
+        _style_applied = True
+
+    x = history.starts
+    high, low, close, volume = history.high[0], history.low[0], history.close[0], history.volume[0]
+    typical_price = (high + low + close) / 3
+
+    figure = Figure(figsize=(12, 6))
+    ax = figure.subplots()
+    if indicator == 'price':
+        plotting.plot_price(ax, close, high, low, title, x=x)
+    elif indicator == 'vwap':
+        plotting.plot_vwap(ax, close, indicators.vwap(typical_price, volume), title, x=x)
+    elif indicator == 'mfi':
+        plotting.plot_money_flow_index(ax, indicators.money_flow_index(typical_price, volume, period), period, title, x=x)
+    elif indicator == 'cmf':
+        plotting.plot_chaikin_money_flow(ax, indicators.chaikin_money_flow(high, low, close, volume, period), period, title, x=x)
+    else:
+        raise ChartError(f"Unknown indicator '{indicator}'")
+    figure.autofmt_xdate()
+    figure.tight_layout()
+
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format=format)
+    return buffer.getvalue()
@@ -0,0 +1,151 @@
+from datetime import datetime, timezone
+import numpy as np
+from lib.candles import INTERVALS
+from .models import Commodity, CommodityCandle
+
+
+class CommodityHistory(object):
+    """
+    Stored commodities of many items as items x snapshots matrices, ready for lib.indicators.
+
+    Row i of every matrix is item_ids[i], column j is the snapshot imported at
+    timestamps[j]. Snapshots where an item wasn't listed are NaN.
+    """
+
+    FIELDS = ('market_price', 'quantity', 'sold_quantity')
+
+    def __init__(self, item_ids, origins, timestamps, **matrices):
+        self.item_ids = item_ids
+        self.origins = origins
+        self.timestamps = timestamps
+        self.market_price = matrices['market_price']
+        self.quantity = matrices['quantity']
+        self.sold_quantity = matrices['sold_quantity']
+
+    def __len__(self):
+        return len(self.item_ids)
+
+    def row(self, item_id):
+        """
+        Index of an item's row
+        """
+        i = int(np.searchsorted(self.item_ids, item_id))
+        if i == len(self.item_ids) or self.item_ids[i] != item_id:
+            raise KeyError(item_id)
+        return i
+
+    @classmethod
+    def load(cls, item_ids=None, region='us', start=None, end=None):
+        """
+        Args:
+            item_ids (list, optional): Items to load.  Defaults to every item.
+            region (str, optional): Region of the commodities.
+            start (datetime, optional): First import time to include.
+            end (datetime, optional): Last import time to include.
+        """
+        commodities = Commodity.objects.filter(region=region)
+        if item_ids is not None:
+            commodities = commodities.filter(item_id__in=item_ids)
+        if start is not None:
+            commodities = commodities.filter(timestamp__gte=start)
+        if end is not None:
+            commodities = commodities.filter(timestamp__lte=end)
+        rows = commodities.order_by('timestamp').values_list('item_id', 'origin', 'timestamp', *cls.FIELDS)
+        return cls.from_rows(rows.iterator(chunk_size=10000))
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Builds the matrices from (item_id, origin, timestamp, market_price, quantity, sold_quantity) rows
+        ordered by timestamp.  A snapshot is timestamped by its first commodity
+        """
+        item_ids = []
+        columns = {}
+        timestamps = []
+        values = []
+        for item_id, origin, timestamp, *fields in rows:
+            if origin not in columns:
+                columns[origin] = len(columns)
+                timestamps.append(timestamp)
+            item_ids.append(item_id)
+            values.append([columns[origin]] + [np.nan if value is None else value for value in fields])
+
+        values = np.array(values, dtype=np.float64).reshape(-1, len(cls.FIELDS) + 1)
+        keys, item_rows = np.unique(np.array(item_ids, dtype=np.int64), return_inverse=True)
+        snapshot = values[:, 0].astype(np.intp)
+        matrices = {}
+        for i, field in enumerate(cls.FIELDS):
+            matrix = np.full((len(keys), len(columns)), np.nan)
+            matrix[item_rows, snapshot] = values[:, i + 1]
+            matrices[field] = matrix
+        return cls(keys, list(columns), timestamps, **matrices)
+
+
+class CandleHistory(object):
+    """
+    Stored candles of many items as items x intervals matrices, ready for lib.indicators,
+    e.g. chaikin_money_flow(history.high, history.low, history.close, history.volume).
+
+    Columns are every interval between the first and last candle loaded, starting
+    at starts[j]. Intervals without a candle for an item are NaN.
+    """
+
+    FIELDS = ('open', 'high', 'low', 'close', 'volume', 'quantity')
+
+    def __init__(self, interval, item_ids, starts, **matrices):
+        self.interval = interval
+        self.item_ids = item_ids
+        self.starts = starts
+        for field in self.FIELDS:
+            setattr(self, field, matrices[field])
+
+    def __len__(self):
+        return len(self.item_ids)
+
+    row = CommodityHistory.row
+
+    @classmethod
+    def load(cls, interval, item_ids=None, region='us', start=None, end=None):
+        """
+        Args:
+            interval (str): Candle interval, e.g. '1d'.
+            item_ids (list, optional): Items to load.  Defaults to every item.
+            region (str, optional): Region of the candles.
+            start (datetime, optional): First interval start to include.
+            end (datetime, optional): Last interval start to include.
+        """
+        candles = CommodityCandle.objects.filter(region=region, interval=interval)
+        if item_ids is not None:
+            candles = candles.filter(item_id__in=item_ids)
+        if start is not None:
+            candles = candles.filter(start__gte=start)
+        if end is not None:
+            candles = candles.filter(start__lte=end)
+        rows = candles.values_list('item_id', 'start', *cls.FIELDS)
+        return cls.from_rows(interval, rows.iterator(chunk_size=10000))
+
+    @classmethod
+    def from_rows(cls, interval, rows):
+        """
+        Builds the matrices from (item_id, start, open, high, low, close, volume, quantity) rows
+        """
+        item_ids = []
+        starts = []
+        values = []
+        for item_id, start, *fields in rows:
+            item_ids.append(item_id)
+            starts.append(int(start.timestamp()))
+            values.append(fields)
+
+        seconds = INTERVALS[interval]
+        values = np.array(values, dtype=np.float64).reshape(-1, len(cls.FIELDS))
+        starts = np.array(starts, dtype=np.int64)
+        keys, item_rows = np.unique(np.array(item_ids, dtype=np.int64), return_inverse=True)
+        grid = np.arange(starts.min(), starts.max() + 1, seconds) if len(starts) else np.empty(0, dtype=np.int64)
+        columns = (starts - grid[0]) // seconds if len(starts) else starts
+        matrices = {}
+        for i, field in enumerate(cls.FIELDS):
+            matrix = np.full((len(keys), len(grid)), np.nan)
+            matrix[item_rows, columns] = values[:, i]
+            matrices[field] = matrix
+        return cls(interval, keys, [datetime.fromtimestamp(start, tz=timezone.utc) for start in grid.tolist()], **matrices)
@@ -1,8 +1,9 @@
-import json
-import hashlib
 import logging
-from rallytools import settings
+from concurrent.futures import ThreadPoolExecutor
+from django.db import connection
+from rallytools import settings, clients
 from .models import *
+from . import candles, sketches
 from lib import battlenet, market
 
 logger = logging.getLogger('__name__')
@@ -14,29 +15,102 @@ class AuctionHouseImportError(Exception):
     pass
 
 class AuctionHouseImporter(object):
-    def __init__(self):
-        self.battlenet_client = battlenet.BattleNetAPI(settings.BATTLENET_CLIENT_ID, settings.BATTLENET_CLIENT_SECRET)
+    def __init__(self, battlenet_clients=None):
+        """
+        battlenet_clients defaults to a new clients.BattleNetClients
+        """
+        if battlenet_clients is None:
+            battlenet_clients = clients.BattleNetClients()
+        self.battlenet_clients = battlenet_clients
+
+    def _results(self, battlenet_client, results, stopped=None):
+        """
+        Attaches a snapshot of the Battle.net client's per endpoint telemetry to a job's results,
+        and the reason the job stopped early if it did
+        """
+        if stopped is not None:
+            results['stopped'] = str(stopped)
+        results['client_stats'] = battlenet_client.stats()
+        return results
+
+    def import_commodities(self, regions=None):
+        """
+        Imports the commodities snapshot of every region at once, each through its own client and quota.
+        regions defaults to all configured regions.  Returns the results keyed by region
+        """
+        regions = list(regions or self.battlenet_clients.regions)
+        with ThreadPoolExecutor(max_workers=len(regions), thread_name_prefix='commodities') as executor:
+            futures = {region: executor.submit(self._import_in_thread, region) for region in regions}
+            # A failed region raises here, after every other region has finished
+            return {region: future.result() for region, future in futures.items()}
+
+    def _import_in_thread(self, region):
+        try:
+            return self.import_region_commodities(region)
+        finally:
+            # Each worker thread opened its own database connection
+            connection.close()
 
-    def import_commodities(self):
+    def import_region_commodities(self, region=None):
         num_added = 0
         num_skipped = 0
-        
-        origin_hash = hashlib.sha256()
+        num_reused = 0
+        num_candles = 0
+        num_sketches = 0
+        stopped = None
+        battlenet_client = self.battlenet_clients.get(region)
+        region = battlenet_client.region
 
         try:
-            response = self.battlenet_client.get_commodities()
-
-            # Generate an origin; helps prevent duplicates
-
-            origin_hash.update(json.dumps(response, sort_keys=True).encode('utf-8'))
-            origin = origin_hash.hexdigest()
+            # Ask for the snapshot conditionally; an unchanged snapshot is detected before its body is downloaded
+            latest_snapshot = CommoditySnapshot.objects.filter(region=region).defer('listings').order_by('-timestamp').first()
+            snapshot = battlenet_client.get_commodities_snapshot(
+                if_modified_since=latest_snapshot.last_modified if latest_snapshot else None,
+                stream=settings.BATTLENET_STREAM_COMMODITIES
+            )
+            if snapshot.not_modified:
+                logger.info(f"INFO: Commodities snapshot unchanged since {snapshot.last_modified}. Skipping")
+                return self._results(battlenet_client, {"num_added": num_added, "num_skipped": num_skipped, "num_reused": num_reused, "num_candles": num_candles, "num_sketches": num_sketches, "not_modified": True})
+
+            # The origin is derived from the snapshot's Last-Modified header; helps prevent duplicates
+            if snapshot.origin and CommoditySnapshot.objects.filter(origin=snapshot.origin).exists():
+                logger.info(f"INFO: Commodities snapshot {snapshot.origin} was already imported. Skipping")
+                snapshot.close()
+                return self._results(battlenet_client, {"num_added": num_added, "num_skipped": num_skipped, "num_reused": num_reused, "num_candles": num_candles, "num_sketches": num_sketches, "not_modified": True})
+
+            # Parse the body (as it streams in, when streaming) straight into compact columns
+            listings = market.CommodityListings.from_auctions(snapshot.iter_auctions())
+
+            # Without a Last-Modified header the origin is only known once the body has been hashed
+            origin = snapshot.origin
 
             # Check for existing matches
-            existing_commodities = Commodity.objects.filter(origin=origin).values_list('item__id', flat=True)
-            existing_items = Item.objects.all().values_list('id', flat=True)
-
-            # Run market analysis
-            market_data = market.analyze_market_data(response['auctions'])
+            existing_commodities = set(Commodity.objects.filter(origin=origin).values_list('item__id', flat=True))
+            existing_items = set(Item.objects.all().values_list('id', flat=True))
+
+            # Run market analysis, and price buying standard quantities off the order book.  When the previous snapshot's
+            # listings were kept, diff against them by auction id: only items whose listings changed are analyzed again
+            analysis_options = {
+                'workers': settings.MARKET_ANALYSIS_WORKERS,
+                'min_parallel_listings': settings.MARKET_ANALYSIS_PARALLEL_MIN_LISTINGS,
+            }
+            item_changes = {}
+            # The listings were deferred above so that unchanged snapshots don't load them; only now are they needed
+            previous_packed = CommoditySnapshot.objects.filter(id=latest_snapshot.id).values_list('listings', flat=True).first() if latest_snapshot else None
+            if previous_packed:
+                previous_listings, previous_market_data = market.unpack_snapshot(bytes(previous_packed))
+                diff = market.SnapshotDiff(previous_listings, listings)
+                market_data = market.update_market_data(previous_market_data, diff, listings, **analysis_options)
+                item_changes = diff.item_changes()
+                num_reused = len(diff.unchanged_items)
+                logger.info(f"INFO: {len(diff.changed_items)} items changed since snapshot {latest_snapshot.origin}, reused the analysis of {num_reused}")
+            else:
+                market_data = market.analyze_market_data(listings, **analysis_options)
+            depth = market.OrderBookDepth(listings).depth_points()
+
+            # Fetch data + media for every item we haven't seen before in one concurrent batch
+            new_item_ids = [item_id for item_id in market_data if item_id not in existing_commodities and item_id not in existing_items]
+            new_items = dict(zip(new_item_ids, battlenet_client.get_many('item', new_item_ids, media=True, search=True)))
             
             for item_id in market_data:
                 if item_id in existing_commodities:
@@ -49,16 +123,18 @@ class AuctionHouseImporter(object):
                     logging.info(f"INFO: Creating entry for item {item_id}")
 
                     # First get the item data
-                    try:
-                        item_response = self.battlenet_client.get_item(item_id)
-                    except battlenet.BattleNetAPINotFoundError as e:
+                    fetched = new_items[item_id]
+                    if isinstance(fetched, battlenet.BattleNetAPINotFoundError):
                         logger.warning(f"WARNING: item id {item_id} has an existing listing but is not found in the Battle.net API.  It's likely a junk item")
                         continue
-
-
+                    if isinstance(fetched, battlenet.BattleNetAPIUnavailableError):
+                        stopped = fetched
+                        break
+                    if isinstance(fetched, Exception):
+                        raise fetched
 
                     # Then handle the media
-                    item_media_response = self.battlenet_client.get_item_media(item_id)
+                    item_response, item_media_response = fetched
                     icon = item_media_response['assets'][0]['value']
 
                     item, created = Item.objects.get_or_create(
@@ -76,16 +152,46 @@ class AuctionHouseImporter(object):
                     item=item,
                     quantity=market_data[item_id]['total_quantity'],
                     market_price=market_data[item_id]['market_price'],
-                    origin=origin
+                    depth=depth[item_id],
+                    new_quantity=item_changes[item_id]['new_quantity'] if item_changes else None,
+                    sold_quantity=item_changes[item_id]['sold_quantity'] if item_changes else None,
+                    origin=origin,
+                    region=region
                 )
                 commodity.save()
                 num_added += 1
                 logging.debug(f"DEBUG: saved commodity for {item_id} with origin: {origin}")
 
-                num_added += 1
-
+            if stopped is None:
+                commodity_snapshot = CommoditySnapshot.objects.create(
+                    origin=origin,
+                    region=region,
+                    last_modified=snapshot.last_modified or '',
+                    listings=market.pack_snapshot(listings, market_data)
+                )
+                # Only the latest snapshot is diffed against
+                CommoditySnapshot.objects.filter(region=region).exclude(id=commodity_snapshot.id).update(listings=None)
+
+                # Fold the snapshot into the price candles.  They can always be rebuilt from the commodities with build_candles
+                try:
+                    num_candles = candles.update_candles(region, [origin], settings.CANDLE_INTERVALS)
+                except Exception as e:
+                    logger.error(f"ERROR: Failed to update {region} candles with snapshot {origin}: {e}")
+
+                # Likewise the daily price sketches, which build_price_sketches can rebuild
+                try:
+                    num_sketches = sketches.update_sketches(region, [origin])
+                except Exception as e:
+                    logger.error(f"ERROR: Failed to update {region} price sketches with snapshot {origin}: {e}")
+            else:
+                # Leave the snapshot unrecorded: the next run imports it again, skipping commodities already saved
+                logger.warning(f"WARNING: Battle.net unavailable, stopping commodity import at item {item_id}: {stopped}")
+
+        except battlenet.BattleNetAPIUnavailableError as e:
+            logger.warning(f"WARNING: Battle.net unavailable, stopping {region} commodity import: {e}")
+            stopped = e
         except Exception as e:
-            logger.error(f"ERROR: Failed to import auction house commodity data: {e}")
-            raise AuctionHouseImportError(f"Failed to import auction house commodity data: {e}")
+            logger.error(f"ERROR: Failed to import {region} auction house commodity data: {e}")
+            raise AuctionHouseImportError(f"Failed to import {region} auction house commodity data: {e}")
 
-        return {"num_added": num_added, "num_skipped": num_skipped} 
+        return self._results(battlenet_client, {"num_added": num_added, "num_skipped": num_skipped, "num_reused": num_reused, "num_candles": num_candles, "num_sketches": num_sketches, "not_modified": False}, stopped)
@@ -1,14 +1,44 @@
 from django.db import models
 from gamedata.models import Item
 
+REGION_CHOICES = [
+    ('us', 'us'),
+    ('eu', 'eu')
+]
+
+INTERVAL_CHOICES = [
+    ('1h', '1h'),
+    ('1d', '1d'),
+    ('1w', '1w')
+]
+
+
+class CommoditySnapshot(models.Model):
+    """
+    A Battle.net commodities snapshot that has been fully imported
+    """
+    id = models.AutoField(primary_key=True)
+    origin = models.CharField(max_length=64, unique=True, help_text="SHA256 of the snapshot's region and Last-Modified header")
+    region = models.CharField(max_length=2, default='us', db_index=True, choices=REGION_CHOICES, help_text="Region of the snapshot")
+    last_modified = models.CharField(max_length=64, blank=True, help_text="Last-Modified header Battle.net served the snapshot with")
+    listings = models.BinaryField(null=True, blank=True, help_text="Listings and market analysis of the snapshot (lib.market.pack_snapshot).  Only kept for the latest snapshot of a region, to diff the next one against")
+    timestamp = models.DateTimeField(auto_now_add=True, help_text="Automatically set a timestamp")
+
+    def __str__(self):
+        return f"{self.region} {self.last_modified} ({self.origin})"
+
 
 class Commodity(models.Model):
     id = models.AutoField(primary_key=True)
     item = models.ForeignKey(Item, on_delete=models.CASCADE, db_index=True)
     quantity = models.IntegerField(help_text="Quantity of item on Auction House at a given timestamp")
     market_price = models.BigIntegerField(help_text="Price in copper")
+    depth = models.JSONField(default=dict, blank=True, help_text="Average and marginal price in copper to buy standard quantities, keyed by quantity")
+    new_quantity = models.BigIntegerField(null=True, blank=True, help_text="Units listed since the previous snapshot")
+    sold_quantity = models.BigIntegerField(null=True, blank=True, help_text="Estimated units sold since the previous snapshot.  Includes expired and cancelled listings")
     timestamp = models.DateTimeField(auto_now_add=True, help_text="Automatically set a timestamp")
     origin = models.CharField(max_length=64, db_index=True, help_text="SHA256 value to prevent duplicates")
+    region = models.CharField(max_length=2, default='us', db_index=True, choices=REGION_CHOICES, help_text="Region of the Auction House")
     
     class Meta:
         verbose_name_plural = "Commodities"
@@ -17,3 +47,47 @@ class Commodity(models.Model):
     def __str__(self):
         return f"{self.item.name}({self.item.id}) - {self.timestamp}"
 
+
+
+class CommodityCandle(models.Model):
+    """
+    Open/high/low/close market price of an item over one interval, built from the imported snapshots (lib.candles)
+    """
+    id = models.AutoField(primary_key=True)
+    item = models.ForeignKey(Item, on_delete=models.CASCADE)
+    region = models.CharField(max_length=2, default='us', choices=REGION_CHOICES, help_text="Region of the Auction House")
+    interval = models.CharField(max_length=2, choices=INTERVAL_CHOICES, help_text="Length of the candle")
+    start = models.DateTimeField(db_index=True, help_text="Start of the interval")
+    open = models.BigIntegerField(help_text="Market price in copper of the first snapshot in the interval")
+    high = models.BigIntegerField(help_text="Highest market price in copper")
+    low = models.BigIntegerField(help_text="Lowest market price in copper")
+    close = models.BigIntegerField(help_text="Market price in copper of the last snapshot in the interval")
+    volume = models.BigIntegerField(default=0, help_text="Estimated units sold over the interval")
+    quantity = models.BigIntegerField(help_text="Quantity on the Auction House at close")
+    snapshots = models.IntegerField(help_text="Number of snapshots in the interval")
+
+    class Meta:
+        unique_together = [['item', 'region', 'interval', 'start']]
+        indexes = [models.Index(fields=['region', 'interval', 'start'])]
+
+    def __str__(self):
+        return f"{self.item_id} {self.region} {self.interval} {self.start}"
+
+
+class CommodityPriceSketch(models.Model):
+    """
+    Quantile sketch (lib.sketches.TDigest) of an item's market prices over one UTC day.  Merged on read for percentiles over any range of days
+    """
+    id = models.AutoField(primary_key=True)
+    item = models.ForeignKey(Item, on_delete=models.CASCADE)
+    region = models.CharField(max_length=2, default='us', choices=REGION_CHOICES, help_text="Region of the Auction House")
+    day = models.DateField(db_index=True, help_text="UTC day of the snapshots")
+    sketch = models.BinaryField(help_text="Serialized lib.sketches.TDigest of the market prices in copper")
+    snapshots = models.IntegerField(help_text="Number of snapshots sketched")
+
+    class Meta:
+        unique_together = [['item', 'region', 'day']]
+        indexes = [models.Index(fields=['region', 'day'])]
+
+    def __str__(self):
+        return f"{self.item_id} {self.region} {self.day}"
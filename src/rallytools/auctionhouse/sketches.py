@@ -0,0 +1,144 @@
+import logging
+from datetime import datetime, timezone
+import numpy as np
+from django.db import transaction
+from rallytools import settings
+from lib.sketches import TDigest
+from .candles import snapshot_times
+from .models import Commodity, CommodityPriceSketch
+
+logger = logging.getLogger('__name__')
+
+
+def _day(value):
+    """
+    UTC day of a datetime, or the date itself
+    """
+    if isinstance(value, datetime):
+        return value.astimezone(timezone.utc).date() if value.tzinfo else value.date()
+    return value
+
+
+def update_sketches(region, origins, compression=None):
+    """
+    Adds snapshots to the daily market price sketches of a region.
+
+    Each item's market price in every snapshot is added to the sketch of the
+    UTC day the snapshot was imported. Sketches don't depend on the order
+    snapshots are added in, but each snapshot must only be added once.
+
+    Args:
+        region (str): Region of the snapshots.
+        origins (list): Origins of the snapshots to add.
+        compression (int, optional): Compression of new sketches.  Defaults to PRICE_SKETCH_COMPRESSION.
+
+    Returns:
+        int: Number of sketches written.
+    """
+    compression = compression or settings.PRICE_SKETCH_COMPRESSION
+    times = snapshot_times(region, origins)
+    if not times:
+        return 0
+    days = {origin: _day(time) for origin, time in times.items()}
+    rows = Commodity.objects.filter(region=region, origin__in=list(times)).values_list('item_id', 'origin', 'market_price')
+
+    prices = {}
+    for item_id, origin, market_price in rows.iterator(chunk_size=10000):
+        prices.setdefault((item_id, days[origin]), []).append(market_price)
+
+    with transaction.atomic():
+        stored = CommodityPriceSketch.objects.filter(
+            region=region, item_id__in={item_id for item_id, _ in prices}, day__in=set(days.values())
+        ).values_list('item_id', 'day', 'sketch')
+        digests = {(item_id, day): TDigest.from_bytes(sketch) for item_id, day, sketch in stored}
+
+        sketches = []
+        for (item_id, day), values in prices.items():
+            digest = digests.get((item_id, day)) or TDigest(compression)
+            digest.add(values)
+            sketches.append(CommodityPriceSketch(
+                item_id=item_id, region=region, day=day, sketch=digest.to_bytes(), snapshots=digest.count
+            ))
+        CommodityPriceSketch.objects.bulk_create(
+            sketches,
+            batch_size=5000,
+            update_conflicts=True,
+            unique_fields=['item', 'region', 'day'],
+            update_fields=['sketch', 'snapshots'],
+        )
+    return len(sketches)
+
+
+def rebuild_sketches(region, batch_size=24):
+    """
+    Deletes the price sketches of a region and builds them again from every stored snapshot,
+    batch_size snapshots at a time
+
+    Returns:
+        int: Number of sketches written.
+    """
+    CommodityPriceSketch.objects.filter(region=region).delete()
+    origins = list(snapshot_times(region))
+    num_written = 0
+    for i in range(0, len(origins), batch_size):
+        num_written += update_sketches(region, origins[i:i + batch_size])
+        logger.info(f"INFO: Added {min(i + batch_size, len(origins))}/{len(origins)} {region} snapshots to price sketches")
+    return num_written
+
+
+def load_sketches(item_ids=None, region='us', start=None, end=None):
+    """
+    Merged price sketch of each item over a range of days.
+
+    Args:
+        item_ids (list, optional): Items to load.  Defaults to every item.
+        region (str, optional): Region of the sketches.
+        start (date or datetime, optional): First day to include.
+        end (date or datetime, optional): Last day to include.
+
+    Returns:
+        dict: {item_id: TDigest}.
+    """
+    sketches = CommodityPriceSketch.objects.filter(region=region)
+    if item_ids is not None:
+        sketches = sketches.filter(item_id__in=item_ids)
+    if start is not None:
+        sketches = sketches.filter(day__gte=_day(start))
+    if end is not None:
+        sketches = sketches.filter(day__lte=_day(end))
+
+    daily = {}
+    for item_id, sketch in sketches.values_list('item_id', 'sketch').iterator(chunk_size=10000):
+        daily.setdefault(item_id, []).append(TDigest.from_bytes(sketch))
+    return {item_id: TDigest.merge(digests) for item_id, digests in daily.items()}
+
+
+def price_percentiles(item_ids=None, percentiles=(50,), region='us', start=None, end=None):
+    """
+    Percentiles of the market price of items over a range of days, from their daily sketches.
+
+    Reads and merges one sketch per item and day, whatever the number of
+    snapshots that day, so queries don't slow down as commodities pile up.
+
+    Args:
+        item_ids (list, optional): Items to query.  Defaults to every item.
+        percentiles (iterable, optional): Percentiles to estimate, between 0 and 100.
+        region (str, optional): Region of the commodities.
+        start (date or datetime, optional): First day to include.
+        end (date or datetime, optional): Last day to include.
+
+    Returns:
+        dict: {item_id: {'snapshots': int, 'min': int, 'max': int, 'percentiles': {percentile: float}}}
+              for every item with a snapshot in the range.
+    """
+    percentiles = list(percentiles)
+    quantiles = np.asarray(percentiles, dtype=np.float64) / 100
+    results = {}
+    for item_id, digest in load_sketches(item_ids, region=region, start=start, end=end).items():
+        results[item_id] = {
+            'snapshots': digest.count,
+            'min': int(digest.min),
+            'max': int(digest.max),
+            'percentiles': dict(zip(percentiles, np.atleast_1d(digest.quantile(quantiles)).tolist())),
+        }
+    return results
@@ -1,3 +1,719 @@
-from django.test import TestCase
+import json
+import os
+import random
+import tempfile
+import unittest
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+import numpy as np
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone as django_timezone
+from gamedata.models import Item
+from lib import candles, clustering, indicators, market, sketches, synthetic
+from lib import battlenet, sharedstate, transport
+from rallytools import clients, startup
+from . import charts, views
+from .jobs import AuctionHouseImporter, AuctionHouseImportError
+from .sketches import price_percentiles, update_sketches
+from .history import CandleHistory, CommodityHistory
+from .models import Commodity, CommodityCandle, CommodityPriceSketch, CommoditySnapshot
 
-# Create your tests here.
+try:
+    from sklearn.cluster import DBSCAN
+except ImportError: # scikit-learn is optional; it is only used as a reference here
+    DBSCAN = None
+
+try:
+    import pandas as pd
+except ImportError: # So is pandas
+    pd = None
+
+try:
+    import matplotlib
+except ImportError: # and matplotlib, which only charts need
+    matplotlib = None
+
+
+def create_test_auctions(num_items=50, num_auctions=2000, seed=0):
+    """
+    Random commodities listings in the shape Battle.net returns them
+    """
+    rng = random.Random(seed)
+    auctions = []
+    for auction_id in range(1, num_auctions + 1):
+        item_id = rng.randint(1, num_items) * 1000
+        auctions.append({
+            'id': auction_id,
+            'item': {'id': item_id},
+            'quantity': rng.randint(1, 200),
+            'unit_price': rng.choice([rng.randint(100, 5000), rng.randint(10000, 2000000)]),
+            'time_left': 'SHORT',
+        })
+    return auctions
+
+
+class AnalyzeMarketDataTests(SimpleTestCase):
+
+    def reference_analysis(self, auctions):
+        """
+        Per item aggregation as the original list based implementation computed it
+        """
+        grouped = defaultdict(list)
+        for listing in auctions:
+            grouped[listing['item']['id']].append(listing)
+
+        results = {}
+        for item_id, listings in grouped.items():
+            prices = [listing['unit_price'] for listing in listings]
+            results[item_id] = {
+                'min_price': min(prices),
+                'max_price': max(prices),
+                'market_price': market.calculate_market_price(prices),
+                'total_quantity': sum(listing['quantity'] for listing in listings),
+                'listing_count': len(listings),
+            }
+        return results
+
+    def test_matches_reference(self):
+        auctions = create_test_auctions()
+        self.assertEqual(market.analyze_market_data(auctions), self.reference_analysis(auctions))
+
+    def test_columnar_and_list_input_agree(self):
+        auctions = create_test_auctions(seed=1)
+        listings = market.CommodityListings.from_auctions(auctions)
+        self.assertEqual(market.analyze_market_data(listings), market.analyze_market_data(auctions))
+
+    def test_few_listings_use_minimum(self):
+        auctions = create_test_auctions(num_items=1, num_auctions=2)
+        analysis = market.analyze_market_data(auctions)[1000]
+        self.assertEqual(analysis['market_price'], analysis['min_price'])
+        self.assertEqual(analysis['listing_count'], 2)
+
+    def test_empty(self):
+        self.assertEqual(market.analyze_market_data([]), {})
+
+    def test_parallel_matches_serial(self):
+        listings = market.CommodityListings.from_auctions(create_test_auctions(num_items=300, num_auctions=6000, seed=6))
+        serial = market.analyze_market_data(listings)
+        parallel = market.analyze_market_data(listings, workers=3, min_parallel_listings=0)
+        self.assertEqual(list(parallel.items()), list(serial.items()))
+
+    def test_shard_bounds(self):
+        self.assertEqual(market._shard_bounds(np.array([5, 5, 5, 5]), 2).tolist(), [0, 2, 4])
+        self.assertEqual(market._shard_bounds(np.array([100, 1, 1]), 3).tolist(), [0, 1, 3])
+        self.assertEqual(market._shard_bounds(np.array([7]), 4).tolist(), [0, 1])
+
+
+
+class OrderBookDepthTests(SimpleTestCase):
+
+    def reference_cost(self, auctions, item_id, units):
+        """
+        Buys units of an item listing by listing, cheapest first
+        """
+        listings = sorted((a['unit_price'], a['quantity']) for a in auctions if a['item']['id'] == item_id)
+        cost = 0
+        remaining = units
+        for unit_price, quantity in listings:
+            bought = min(quantity, remaining)
+            cost += bought * unit_price
+            remaining -= bought
+            if not remaining:
+                return cost, unit_price
+        return None, None
+
+    def test_matches_reference(self):
+        auctions = create_test_auctions(num_items=20, num_auctions=1000, seed=4)
+        depth = market.OrderBookDepth(market.CommodityListings.from_auctions(auctions))
+        for units in [1, 7, 50, 333, 2500, 10**6]:
+            prices = depth.cost_to_buy(units)
+            for i, item_id in enumerate(depth.keys.tolist()):
+                cost, marginal_price = self.reference_cost(auctions, item_id, units)
+                if cost is None:
+                    self.assertTrue(np.isnan(prices['cost'][i]))
+                    continue
+                self.assertEqual(prices['cost'][i], cost)
+                self.assertEqual(prices['marginal_price'][i], marginal_price)
+                self.assertAlmostEqual(prices['average_price'][i], cost / units)
+
+    def test_units_per_item(self):
+        auctions = create_test_auctions(num_items=5, num_auctions=200, seed=5)
+        depth = market.OrderBookDepth(market.CommodityListings.from_auctions(auctions))
+        units = np.arange(1, len(depth) + 1) * 10
+        prices = depth.cost_to_buy(units)
+        for i, item_id in enumerate(depth.keys.tolist()):
+            self.assertEqual(prices['cost'][i], self.reference_cost(auctions, item_id, units[i])[0])
+
+    def test_depth_points(self):
+        auctions = [
+            {'id': 1, 'item': {'id': 9}, 'quantity': 5, 'unit_price': 300},
+            {'id': 2, 'item': {'id': 9}, 'quantity': 10, 'unit_price': 100},
+        ]
+        points = market.OrderBookDepth(market.CommodityListings.from_auctions(auctions)).depth_points((1, 12, 100))
+        self.assertEqual(points, {9: {
+            '1': {'average_price': 100.0, 'marginal_price': 100},
+            '12': {'average_price': 1600 / 12, 'marginal_price': 300},
+            '100': {'average_price': None, 'marginal_price': None},
+        }})
+
+
+class SnapshotDiffTests(SimpleTestCase):
+
+    def next_snapshot(self, auctions, seed):
+        """
+        The following snapshot: some auctions sold out or expired, some partially bought, some new ones listed.
+        Only the first 50 items change
+        """
+        rng = random.Random(seed)
+        following = []
+        for auction in auctions:
+            roll = rng.random() if auction['item']['id'] <= 50000 else 1
+            if roll < 0.1:
+                continue
+            auction = dict(auction)
+            if roll < 0.2 and auction['quantity'] > 1:
+                auction['quantity'] = rng.randint(1, auction['quantity'] - 1)
+            following.append(auction)
+        new_auctions = create_test_auctions(num_items=10, num_auctions=300, seed=seed)
+        for auction in new_auctions:
+            auction['id'] += 10**6
+        return following + new_auctions
+
+    def test_item_changes(self):
+        previous = [
+            {'id': 1, 'item': {'id': 5}, 'quantity': 10, 'unit_price': 100},
+            {'id': 2, 'item': {'id': 5}, 'quantity': 4, 'unit_price': 150},
+            {'id': 3, 'item': {'id': 6}, 'quantity': 7, 'unit_price': 900},
+            {'id': 4, 'item': {'id': 8}, 'quantity': 1, 'unit_price': 50},
+        ]
+        current = [
+            {'id': 1, 'item': {'id': 5}, 'quantity': 6, 'unit_price': 100},
+            {'id': 3, 'item': {'id': 6}, 'quantity': 7, 'unit_price': 900},
+            {'id': 9, 'item': {'id': 7}, 'quantity': 20, 'unit_price': 10},
+        ]
+        diff = market.SnapshotDiff(market.CommodityListings.from_auctions(previous), market.CommodityListings.from_auctions(current))
+        changes = diff.item_changes()
+        self.assertEqual(changes[5], {
+            'new_listings': 0, 'new_quantity': 0, 'removed_listings': 1, 'removed_quantity': 4,
+            'partially_filled_listings': 1, 'filled_quantity': 4, 'sold_quantity': 8,
+        })
+        self.assertEqual(changes[7]['new_quantity'], 20)
+        self.assertEqual(changes[8]['sold_quantity'], 1)
+        self.assertEqual(diff.unchanged_items.tolist(), [6])
+        self.assertEqual(diff.changed_items.tolist(), [5, 7, 8])
+
+    def test_update_matches_full_analysis(self):
+        auctions = create_test_auctions(num_items=100, num_auctions=3000, seed=7)
+        previous = market.CommodityListings.from_auctions(auctions)
+        current = market.CommodityListings.from_auctions(self.next_snapshot(auctions, seed=8))
+        diff = market.SnapshotDiff(previous, current)
+        self.assertTrue(len(diff.unchanged_items))
+        updated = market.update_market_data(market.analyze_market_data(previous), diff, current)
+        self.assertEqual(list(updated.items()), list(market.analyze_market_data(current).items()))
+
+    def test_pack_round_trip(self):
+        listings = market.CommodityListings.from_auctions(create_test_auctions(seed=9))
+        market_analysis = market.analyze_market_data(listings)
+        unpacked_listings, unpacked_analysis = market.unpack_snapshot(market.pack_snapshot(listings, market_analysis))
+        self.assertEqual(unpacked_analysis, market_analysis)
+        self.assertEqual([type(analysis['market_price']) for analysis in unpacked_analysis.values()],
+                         [type(analysis['market_price']) for analysis in market_analysis.values()])
+        for column in market.CommodityListings.COLUMNS:
+            self.assertEqual(getattr(unpacked_listings, column).tolist(), getattr(listings, column).tolist())
+
+
+class SyntheticSnapshotTests(SimpleTestCase):
+
+    def test_generate_listings(self):
+        listings = synthetic.generate_listings(num_listings=20000, num_items=500, seed=3)
+        self.assertEqual(len(listings), 20000)
+        self.assertEqual(len(np.unique(listings.item_id)), 500)
+        self.assertEqual(len(np.unique(listings.auction_id)), 20000)
+        self.assertTrue((np.diff(listings.auction_id) > 0).all())
+        self.assertTrue((listings.unit_price % synthetic.PRICE_STEP == 0).all() and (listings.unit_price > 0).all())
+        self.assertTrue((listings.quantity >= 1).all() and (listings.quantity <= synthetic.MAX_QUANTITY).all())
+
+        # Heavy tails: a few items hold most listings, and prices span orders of magnitude
+        counts = np.sort(np.unique(listings.item_id, return_counts=True)[1])[::-1]
+        self.assertGreater(counts[:50].sum(), len(listings) / 2)
+        self.assertGreater(listings.unit_price.max() / listings.unit_price.min(), 1000)
+
+        same = synthetic.generate_listings(num_listings=20000, num_items=500, seed=3)
+        other = synthetic.generate_listings(num_listings=20000, num_items=500, seed=4)
+        self.assertEqual(same.unit_price.tolist(), listings.unit_price.tolist())
+        self.assertNotEqual(other.unit_price.tolist(), listings.unit_price.tolist())
+
+    def test_outliers_are_priced_above_the_market(self):
+        listings = synthetic.generate_listings(num_listings=5000, num_items=20, seed=5, outlier_rate=0.05)
+        market_data = market.analyze_market_data(listings)
+        popular = [data for data in market_data.values() if data['listing_count'] >= 100]
+        self.assertTrue(popular)
+        self.assertTrue(all(data['max_price'] > 4 * data['market_price'] for data in popular))
+
+    def test_next_listings(self):
+        listings = synthetic.generate_listings(num_listings=10000, num_items=200, seed=1)
+        following = synthetic.next_listings(listings, seed=2, sold_rate=0.1, partial_rate=0.05, new_rate=0.1)
+        diff = market.SnapshotDiff(listings, following)
+        changes = diff.item_changes()
+        self.assertEqual(sum(change['new_listings'] for change in changes.values()), 1000)
+        self.assertAlmostEqual(sum(change['removed_listings'] for change in changes.values()) / len(listings), 0.1, delta=0.02)
+        multiple_units = np.isin(listings.auction_id[listings.quantity > 1], following.auction_id).sum()
+        self.assertAlmostEqual(sum(change['partially_filled_listings'] for change in changes.values()) / multiple_units, 0.05, delta=0.02)
+        self.assertEqual(len(np.unique(following.auction_id)), len(following))
+
+    def test_commodities_body(self):
+        listings = synthetic.generate_listings(num_listings=300, num_items=10, seed=6)
+        parsed = market.CommodityListings.from_auctions(json.loads(synthetic.commodities_body(listings))['auctions'])
+        for column in market.CommodityListings.COLUMNS:
+            self.assertEqual(getattr(parsed, column).tolist(), getattr(listings, column).tolist())
+
+
+@unittest.skipIf(pd is None, "pandas is not installed, see requirements-dev.txt")
+class IndicatorTests(SimpleTestCase):
+    """
+    lib.indicators against the pandas implementations the calculate_and_graph_* functions used to compute
+    """
+
+    def setUp(self):
+        rng = np.random.default_rng(10)
+        self.prices = rng.integers(1000, 1100, (30, 60)).astype(np.float64)
+        self.volumes = rng.integers(0, 500, (30, 60)).astype(np.float64)
+        self.lows = self.prices - rng.integers(0, 50, self.prices.shape)
+        self.highs = self.prices + rng.integers(0, 50, self.prices.shape)
+
+    def reference_mfi(self, prices, volumes, period):
+        prices = pd.Series(prices)
+        money_flow = prices * pd.Series(volumes)
+        price_diff = prices.diff(1)
+        positive_mf = pd.Series(np.where(price_diff > 0, money_flow, 0)).rolling(window=period).sum()
+        negative_mf = pd.Series(np.where(price_diff < 0, money_flow, 0)).rolling(window=period).sum()
+        money_flow_ratio = (positive_mf / negative_mf).replace([np.inf], 9999)
+        return (100 - (100 / (1 + money_flow_ratio))).to_numpy()
+
+    def reference_cmf(self, highs, lows, closes, volumes, period):
+        highs, lows, closes, volumes = (pd.Series(values) for values in (highs, lows, closes, volumes))
+        mf_multiplier = (((closes - lows) - (highs - closes)) / (highs - lows)).fillna(0)
+        return ((mf_multiplier * volumes).rolling(window=period).sum() / volumes.rolling(window=period).sum()).to_numpy()
+
+    def test_vwap(self):
+        vwap = indicators.vwap(self.prices, self.volumes)
+        expected = np.cumsum(self.prices * self.volumes, axis=1) / np.cumsum(self.volumes, axis=1)
+        np.testing.assert_allclose(vwap, expected)
+        self.assertTrue(np.isnan(indicators.vwap([5, 6], [0, 2])[0]))
+
+    def test_money_flow_index(self):
+        self.prices[3, 20:40] = 1050 # No flow at all
+        self.prices[4, 10:] = np.arange(50) + 1000 # Only positive flow
+        mfi = indicators.money_flow_index(self.prices, self.volumes, 14)
+        for i in range(len(self.prices)):
+            np.testing.assert_allclose(mfi[i], self.reference_mfi(self.prices[i], self.volumes[i], 14))
+        np.testing.assert_allclose(indicators.money_flow_index(self.prices[0], self.volumes[0], 14), mfi[0])
+
+    def test_chaikin_money_flow(self):
+        self.highs[2, 5:9] = self.lows[2, 5:9] = self.prices[2, 5:9]
+        cmf = indicators.chaikin_money_flow(self.highs, self.lows, self.prices, self.volumes, 20)
+        for i in range(len(self.prices)):
+            np.testing.assert_allclose(cmf[i], self.reference_cmf(self.highs[i], self.lows[i], self.prices[i], self.volumes[i], 20))
+
+    def test_price_volume_correlation(self):
+        self.prices[5, ::3] = np.nan
+        self.volumes[6] = 7
+        correlation = indicators.price_volume_correlation(self.prices, self.volumes)
+        for i in range(len(self.prices)):
+            observed = ~np.isnan(self.prices[i])
+            if i == 6:
+                self.assertTrue(np.isnan(correlation[i]))
+                continue
+            self.assertAlmostEqual(correlation[i], np.corrcoef(self.prices[i][observed], self.volumes[i][observed])[0, 1])
+
+    def test_commodity_history(self):
+        rows = [
+            (7, 'a', 1, 100, 5, None),
+            (3, 'a', 1, 40, 2, None),
+            (7, 'b', 2, 110, 4, 1),
+            (3, 'c', 3, 45, 1, 1),
+        ]
+        history = CommodityHistory.from_rows(rows)
+        self.assertEqual(history.item_ids.tolist(), [3, 7])
+        self.assertEqual(history.origins, ['a', 'b', 'c'])
+        np.testing.assert_array_equal(history.market_price, [[40, np.nan, 45], [100, 110, np.nan]])
+        np.testing.assert_array_equal(history.sold_quantity[history.row(7)], [np.nan, 1, np.nan])
+        self.assertEqual(len(CommodityHistory.from_rows([])), 0)
+
+
+class CandleTests(SimpleTestCase):
+
+    def observations(self, seed):
+        """
+        Hourly-ish snapshots of a few items over three weeks
+        """
+        rng = np.random.default_rng(seed)
+        times = np.cumsum(rng.integers(600, 5400, 400)) + 1700000000
+        item_id = rng.integers(1, 8, (len(times), 5)) * 10
+        rows = [
+            (int(item), int(time), int(rng.integers(100, 10000)), int(rng.integers(1, 500)), float(rng.choice([np.nan, rng.integers(0, 50)])))
+            for time, items in zip(times, item_id) for item in set(items.tolist())
+        ]
+        return [np.array(column) for column in zip(*rows)]
+
+    def reference_candles(self, item_id, time, price, quantity, volume, interval):
+        grouped = defaultdict(list)
+        for row in sorted(zip(time.tolist(), item_id.tolist(), price.tolist(), quantity.tolist(), volume.tolist())):
+            grouped[(row[1], int(candles.bucket_starts([row[0]], interval)[0]))].append(row)
+        return {
+            key: (rows[0][2], max(r[2] for r in rows), min(r[2] for r in rows), rows[-1][2],
+                  sum(0 if np.isnan(r[4]) else int(r[4]) for r in rows), rows[-1][3], len(rows))
+            for key, rows in grouped.items()
+        }
+
+    def as_dict(self, built):
+        columns = [getattr(built, column).tolist() for column in candles.Candles.COLUMNS]
+        return {(row[0], row[1]): tuple(row[2:]) for row in zip(*columns)}
+
+    def test_matches_reference(self):
+        observations = self.observations(11)
+        for interval in candles.INTERVALS:
+            built = candles.Candles.from_observations(*observations, interval)
+            self.assertEqual(self.as_dict(built), self.reference_candles(*observations, interval))
+
+    def test_incremental_merge_matches_batch(self):
+        observations = self.observations(12)
+        time = observations[1]
+        for interval in candles.INTERVALS:
+            merged = candles.Candles.empty()
+            for snapshot_time in np.unique(time).tolist():
+                snapshot = [column[time == snapshot_time] for column in observations]
+                merged = merged.merge(candles.Candles.from_observations(*snapshot, interval))
+            self.assertEqual(self.as_dict(merged), self.as_dict(candles.Candles.from_observations(*observations, interval)))
+
+    def test_weeks_start_on_monday(self):
+        wednesday = datetime(2025, 7, 16, 15, 30, tzinfo=timezone.utc).timestamp()
+        start = datetime.fromtimestamp(int(candles.bucket_starts([wednesday], '1w')[0]), tz=timezone.utc)
+        self.assertEqual(start, datetime(2025, 7, 14, tzinfo=timezone.utc))
+        with self.assertRaises(ValueError):
+            candles.bucket_starts([wednesday], '5m')
+
+    def test_candle_history(self):
+        day = lambda d: datetime(2025, 7, d, tzinfo=timezone.utc)
+        rows = [
+            (5, day(1), 10, 12, 9, 11, 3, 100),
+            (5, day(4), 11, 15, 10, 14, 0, 90),
+            (2, day(2), 50, 50, 40, 45, 7, 20),
+        ]
+        history = CandleHistory.from_rows('1d', rows)
+        self.assertEqual(history.item_ids.tolist(), [2, 5])
+        self.assertEqual(history.starts, [day(1), day(2), day(3), day(4)])
+        np.testing.assert_array_equal(history.close, [[np.nan, 45, np.nan, np.nan], [11, np.nan, np.nan, 14]])
+        self.assertEqual(len(CandleHistory.from_rows('1h', [])), 0)
+
+
+class TDigestTests(SimpleTestCase):
+
+    def test_small_streams_are_exact(self):
+        digest = sketches.TDigest().add([300, 100, 200, 500, 400])
+        self.assertEqual(len(digest), 5)
+        self.assertEqual(digest.quantile([0, 0.5, 1]).tolist(), [100, 300, 500])
+        self.assertTrue(np.isnan(sketches.TDigest().quantile(0.5)))
+        with self.assertRaises(ValueError):
+            digest.quantile(1.5)
+
+    def test_accuracy(self):
+        values = np.exp(np.random.default_rng(1).normal(8, 1.5, 100000))
+        digest = sketches.TDigest(compression=100)
+        for chunk in np.array_split(values, 1000):
+            digest.add(chunk)
+        self.assertEqual(digest.count, len(values))
+        self.assertLessEqual(len(digest), 100)
+        for q in (0.01, 0.1, 0.5, 0.9, 0.99):
+            self.assertAlmostEqual((values < digest.quantile(q)).mean(), q, delta=0.01)
+
+    def test_merged_days_match_the_whole_range(self):
+        values = np.random.default_rng(2).pareto(2.0, 30 * 24 * 50)
+        days = [sketches.TDigest().add(day) for day in np.array_split(values, 30)]
+        merged = sketches.TDigest.merge(days)
+        self.assertEqual(merged.count, len(values))
+        self.assertEqual((merged.min, merged.max), (values.min(), values.max()))
+        for q in (0.05, 0.5, 0.95):
+            self.assertAlmostEqual((values < merged.quantile(q)).mean(), q, delta=0.01)
+
+    def test_bytes_round_trip(self):
+        digest = sketches.TDigest(compression=50).add(np.random.default_rng(3).normal(0, 1, 5000))
+        restored = sketches.TDigest.from_bytes(digest.to_bytes())
+        self.assertEqual(restored.compression, 50)
+        self.assertEqual(restored.quantile([0.1, 0.5, 0.9]).tolist(), digest.quantile([0.1, 0.5, 0.9]).tolist())
+        self.assertEqual(len(digest.to_bytes()), sketches.HEADER.size + 12 * len(digest))
+
+
+class PriceSketchTests(TestCase):
+
+    def setUp(self):
+        self.item = Item.objects.create(id=7, name='Ore', icon='', item_class='Trade Goods', item_subclass='Metal')
+
+    def add_snapshot(self, origin, time, market_price):
+        Commodity.objects.create(item=self.item, quantity=10, market_price=market_price, origin=origin, region='us')
+        Commodity.objects.filter(origin=origin).update(timestamp=time)
+        update_sketches('us', [origin])
+
+    def test_percentiles_over_days(self):
+        day = lambda d, h: datetime(2025, 7, d, h, tzinfo=timezone.utc)
+        for i, (time, price) in enumerate([(day(1, 0), 900), (day(2, 1), 100), (day(2, 5), 300), (day(2, 23), 200), (day(3, 2), 700)]):
+            self.add_snapshot(f"origin-{i}", time, price)
+
+        self.assertEqual(CommodityPriceSketch.objects.count(), 3)
+        self.assertEqual(CommodityPriceSketch.objects.get(day=day(2, 0).date()).snapshots, 3)
+
+        everything = price_percentiles([7], percentiles=(0, 50, 100))[7]
+        self.assertEqual(everything['snapshots'], 5)
+        self.assertEqual(everything['percentiles'], {0: 100, 50: 300, 100: 900})
+        second_day = price_percentiles([7], region='us', start=day(2, 12), end=day(2, 12).date())[7]
+        self.assertEqual((second_day['snapshots'], second_day['min'], second_day['max']), (3, 100, 300))
+        self.assertEqual(second_day['percentiles'], {50: 200})
+        self.assertEqual(price_percentiles([7], region='eu'), {})
+
+
+class ConditionalTransport(transport.ReplayTransport):
+    """
+    Replays fixtures and keeps the If-Modified-Since header of every commodities request
+    """
+
+    def __init__(self, directory):
+        super().__init__(directory)
+        self.if_modified_since = []
+
+    def request(self, method, url, **kwargs):
+        if method == 'GET':
+            self.if_modified_since.append((kwargs.get('headers') or {}).get('If-Modified-Since'))
+        return super().request(method, url, **kwargs)
+
+
+class ImportCommoditiesTests(TestCase):
+
+    last_modified = 'Mon, 14 Jul 2025 10:00:00 GMT'
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        listings = synthetic.generate_listings(num_listings=300, num_items=12, seed=3)
+        Item.objects.bulk_create([
+            Item(id=item_id, name=f"Item {item_id}", icon='', item_class='Trade Goods', item_subclass='Metal')
+            for item_id in np.unique(listings.item_id).tolist()
+        ])
+        transport.FixtureStore(directory.name).save(
+            'GET', '/data/wow/auctions/commodities', {'namespace': 'dynamic-us', 'locale': 'en_US'}, 200,
+            {'Content-Type': 'application/json', 'Last-Modified': self.last_modified}, synthetic.commodities_body(listings)
+        )
+        self.transport = ConditionalTransport(directory.name)
+        registry = clients.BattleNetClients(['us'], client_factory=lambda region: battlenet.BattleNetAPI(
+            'id', 'secret', region=region, state_store=sharedstate.MemoryStateStore(), transport=self.transport
+        ))
+        self.addCleanup(registry.close)
+        self.importer = AuctionHouseImporter(battlenet_clients=registry)
+
+    def test_unchanged_snapshots_are_skipped(self):
+        first = self.importer.import_region_commodities('us')
+        self.assertFalse(first['not_modified'])
+        self.assertEqual(first['num_added'], 12)
+        num_commodities = Commodity.objects.count()
+
+        # The second request is conditional, and the 304 skips the import
+        second = self.importer.import_region_commodities('us')
+        self.assertEqual(self.transport.if_modified_since, [None, self.last_modified])
+        self.assertTrue(second['not_modified'])
+        self.assertEqual(Commodity.objects.count(), num_commodities)
+        self.assertEqual(second.keys(), first.keys())
+
+    def test_known_origins_are_skipped(self):
+        self.importer.import_region_commodities('us')
+        num_commodities = Commodity.objects.count()
+        # Revalidate with another validator, so the snapshot is downloaded and recognised by its origin
+        CommoditySnapshot.objects.update(last_modified='Mon, 14 Jul 2025 09:00:00 GMT')
+
+        results = self.importer.import_region_commodities('us')
+        self.assertTrue(results['not_modified'])
+        self.assertEqual(Commodity.objects.count(), num_commodities)
+        self.assertEqual(CommoditySnapshot.objects.count(), 1)
+        self.assertEqual((results['num_added'], results['num_reused'], results['num_candles'], results['num_sketches']), (0, 0, 0, 0))
+
+
+class ImportRegionsTests(SimpleTestCase):
+
+    def setUp(self):
+        registry = clients.BattleNetClients(['us', 'eu', 'kr'], client_factory=lambda region: mock.Mock(region=region))
+        self.importer = AuctionHouseImporter(battlenet_clients=registry)
+        self.finished = []
+
+    def import_region(self, region=None):
+        if region == 'eu':
+            raise AuctionHouseImportError(f"Failed to import {region}")
+        self.finished.append(region)
+        return {'region': region}
+
+    def test_one_result_per_region(self):
+        with mock.patch.object(self.importer, 'import_region_commodities', side_effect=self.import_region):
+            self.assertEqual(self.importer.import_commodities(['us', 'kr']), {'us': {'region': 'us'}, 'kr': {'region': 'kr'}})
+
+    def test_a_failed_region_doesnt_cancel_the_others(self):
+        with mock.patch.object(self.importer, 'import_region_commodities', side_effect=self.import_region):
+            with self.assertRaises(AuctionHouseImportError):
+                self.importer.import_commodities()
+        self.assertEqual(sorted(self.finished), ['kr', 'us'])
+
+
+@unittest.skipIf(matplotlib is None, "matplotlib is not installed")
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'charts'}})
+class CommodityChartTests(TestCase):
+
+    def setUp(self):
+        Item.objects.create(id=5, name="Test Ore", item_class="Tradeskill", item_subclass="Metal & Stone", icon="http://fake.icon/ore.jpg")
+        start = django_timezone.now().replace(minute=0, second=0, microsecond=0)
+        rng = np.random.default_rng(13)
+        for i in range(48):
+            close = int(rng.integers(100, 200))
+            CommodityCandle.objects.create(
+                item_id=5, region='us', interval='1h', start=start - timedelta(hours=i),
+                open=close, high=close + 10, low=close - 10, close=close, volume=int(rng.integers(0, 50)), quantity=100, snapshots=1
+            )
+        self.snapshot = CommoditySnapshot.objects.create(origin='a' * 64, region='us')
+
+    def get_chart(self, indicator, headers=None, **params):
+        return self.client.get(reverse('commodity-chart', args=[5, indicator]), {'interval': '1h', 'range': '2d', 'region': 'us', **params}, headers=headers)
+
+    def test_renders_every_indicator(self):
+        for indicator in charts.INDICATORS:
+            response = self.get_chart(indicator)
+            self.assertEqual(response.status_code, 200, indicator)
+            self.assertEqual(response['Content-Type'], 'image/png')
+            self.assertTrue(response.content.startswith(b'\x89PNG'))
+        response = self.get_chart('cmf', format='svg', period=5)
+        self.assertEqual(response['Content-Type'], 'image/svg+xml')
+        self.assertIn(b'<svg', response.content)
+
+    def test_cache_hits_skip_rendering(self):
+        first = self.get_chart('mfi')
+        with mock.patch.object(charts, 'render_chart') as render_chart:
+            second = self.get_chart('mfi')
+            self.assertEqual(second.content, first.content)
+            self.assertEqual(self.get_chart('mfi', headers={'If-None-Match': first['ETag']}).status_code, 304)
+            render_chart.assert_not_called()
+
+            # A new snapshot invalidates every chart of its region
+            CommoditySnapshot.objects.create(origin='b' * 64, region='us')
+            render_chart.return_value = b'new'
+            self.assertEqual(self.get_chart('mfi').content, b'new')
+            render_chart.assert_called_once()
+
+    def test_bad_requests(self):
+        self.assertEqual(self.get_chart('rsi').status_code, 400)
+        self.assertEqual(self.get_chart('mfi', range='forever').status_code, 400)
+        self.assertEqual(self.get_chart('mfi', format='gif').status_code, 400)
+        self.assertEqual(self.get_chart('mfi', region='zz zz').status_code, 400)
+        with mock.patch.object(charts.settings, 'BATTLENET_REGIONS', ['us', 'eu']):
+            self.assertEqual(self.get_chart('mfi', region='eu').status_code, 404)
+
+    def test_unbounded_requests_are_rejected(self):
+        for range in ('200000w', '1000000000w', '53w', '366d', '0d', '007d'):
+            self.assertEqual(self.get_chart('mfi', range=range).status_code, 400, range)
+        for period in ('0', '101', 'ten'):
+            self.assertEqual(self.get_chart('mfi', period=period).status_code, 400, period)
+        self.assertEqual(self.get_chart('mfi', range='52w', period='100').status_code, 200)
+
+    def test_revalidation_skips_the_cache(self):
+        etag = self.get_chart('price')['ETag']
+        with mock.patch.object(views, 'get_chart') as get_chart:
+            self.assertEqual(self.get_chart('price', headers={'If-None-Match': etag}).status_code, 304)
+            get_chart.assert_not_called()
+        # The same chart, asked for with a different but equal range
+        self.assertEqual(self.get_chart('price', range='48h')['ETag'], etag)
+
+
+class ImportCostTests(SimpleTestCase):
+    """
+    Importing the auction house must not pull in charting or reference libraries
+    """
+
+    def test_market_libraries_stay_light(self):
+        results = startup.measure_imports(['lib.market', 'lib.indicators', 'lib.plotting', 'lib.clustering', 'lib.battlenet'])
+        self.assertEqual(results['heavy_modules'], [])
+
+    @unittest.skipIf('DJANGO_SETTINGS_MODULE' not in os.environ, "needs the project settings, e.g. through manage.py test")
+    def test_import_commodities_stays_light(self):
+        results = startup.measure_imports(command=('rallytools', 'import_commodities'))
+        self.assertEqual(results['heavy_modules'], [])
+
+    def test_charts_still_importable_from_market(self):
+        from lib import plotting
+        self.assertIs(market.calculate_and_graph_vwap, plotting.calculate_and_graph_vwap)
+        with self.assertRaises(AttributeError):
+            market.calculate_and_graph_nothing
+
+
+def sklearn_market_price(prices):
+    """
+    calculate_market_price as implemented with scikit-learn's DBSCAN
+    """
+    if len(prices) < 3:
+        return min(prices)
+    prices_array = np.array(prices).reshape(-1, 1)
+    eps_value = max(np.ptp(prices_array) * 0.05, 1000)
+    labels = DBSCAN(eps=eps_value, min_samples=2).fit(prices_array).labels_
+    clusters = set(labels) - {-1}
+    if not clusters:
+        return min(prices)
+    best = min(clusters, key=lambda label: np.mean(prices_array[labels == label]))
+    return float(np.min(prices_array[labels == best]))
+
+
+@unittest.skipIf(DBSCAN is None, "scikit-learn is not installed, see requirements-dev.txt")
+class DBSCAN1DEquivalenceTests(SimpleTestCase):
+    """
+    lib.clustering must label samples exactly like sklearn.cluster.DBSCAN
+    """
+
+    def assertSameLabels(self, values, eps, min_samples):
+        expected = DBSCAN(eps=eps, min_samples=min_samples).fit(np.asarray(values, dtype=np.float64).reshape(-1, 1)).labels_
+        labels = clustering.dbscan_1d(values, eps, min_samples)
+        self.assertEqual(labels.tolist(), expected.tolist(), f"values={list(values)} eps={eps} min_samples={min_samples}")
+
+    def test_random_samples(self):
+        rng = np.random.default_rng(0)
+        for _ in range(500):
+            values = rng.integers(0, 60, rng.integers(1, 40))
+            self.assertSameLabels(values, float(rng.choice([0.5, 1, 2.5, 4, 10])), int(rng.integers(1, 6)))
+
+    def test_price_like_samples(self):
+        rng = np.random.default_rng(1)
+        for _ in range(200):
+            cheap = rng.integers(100, 5000, rng.integers(1, 20))
+            expensive = rng.integers(1000000, 1200000, rng.integers(0, 20))
+            values = rng.permutation(np.concatenate([cheap, expensive]))
+            self.assertSameLabels(values, max(np.ptp(values) * 0.05, 1000), 2)
+
+    def test_duplicates_and_borders(self):
+        self.assertSameLabels([5, 5, 5, 5], 0.5, 3)
+        self.assertSameLabels([0, 1, 2, 10, 11, 12, 6], 4, 3)  # 6 is a border of both clusters
+        self.assertSameLabels([12, 11, 10, 6, 2, 1, 0], 4, 3)  # ... and joins the one discovered first
+        self.assertSameLabels([1, 100, 200], 10, 2)  # All noise
+        self.assertSameLabels([7], 1, 1)
+
+    def test_segments_match_separate_runs(self):
+        rng = np.random.default_rng(2)
+        segments = [rng.integers(0, 100, rng.integers(1, 30)) for _ in range(100)]
+        eps = rng.uniform(1, 8, len(segments))
+        labels = clustering.segmented_dbscan_1d(np.concatenate(segments), [len(s) for s in segments], eps, 3)
+        expected = np.concatenate([
+            DBSCAN(eps=e, min_samples=3).fit(segment.reshape(-1, 1).astype(np.float64)).labels_
+            for segment, e in zip(segments, eps)
+        ])
+        self.assertEqual(labels.tolist(), expected.tolist())
+
+    def test_market_prices_match_sklearn(self):
+        auctions = create_test_auctions(num_items=200, num_auctions=3000, seed=3)
+        analysis = market.analyze_market_data(auctions)
+        prices = defaultdict(list)
+        for listing in auctions:
+            prices[listing['item']['id']].append(listing['unit_price'])
+        for item_id, item_prices in prices.items():
+            self.assertEqual(analysis[item_id]['market_price'], sklearn_market_price(item_prices))
+            self.assertEqual(market.calculate_market_price(item_prices), sklearn_market_price(item_prices))
@@ -0,0 +1,6 @@
+from django.urls import path
+from .views import commodity_chart
+
+urlpatterns = [
+    path('charts/<int:item_id>/<str:indicator>/', commodity_chart, name='commodity-chart'),
+]
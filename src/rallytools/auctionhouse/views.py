@@ -1,3 +1,39 @@
-from django.shortcuts import render
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.http import require_GET
+from rallytools import settings
+from .charts import ChartDataError, ChartError, ChartRequest, chart_key, get_chart
 
-# Create your views here.
+
+@require_GET
+def commodity_chart(request, item_id, indicator):
+    """
+    Renders a chart of an item's candles as an image.
+
+    Query parameters: interval (1h, 1d or 1w), range (e.g. 30d), format (png or svg),
+    region and period (look-back period of mfi and cmf).
+    """
+    try:
+        chart = ChartRequest(
+            item_id,
+            indicator,
+            interval=request.GET.get('interval', '1d'),
+            range=request.GET.get('range', '30d'),
+            format=request.GET.get('format', 'png'),
+            region=request.GET.get('region', settings.BATTLENET_REGIONS[0]),
+            period=request.GET.get('period'),
+        )
+        key, etag = chart_key(chart)
+        # The ETag is known before the image, so revalidations never read the cache or render
+        if request.headers.get('If-None-Match') == f'"{etag}"':
+            response = HttpResponse(status=304)
+        else:
+            response = HttpResponse(get_chart(chart, key=key), content_type=chart.content_type)
+    except ChartDataError as e:
+        return JsonResponse({'detail': str(e)}, status=404)
+    except ChartError as e:
+        return JsonResponse({'detail': str(e)}, status=400)
+
+    response['ETag'] = f'"{etag}"'
+    # Browsers revalidate with the ETag, which changes with every imported snapshot
+    response['Cache-Control'] = 'no-cache'
+    return response
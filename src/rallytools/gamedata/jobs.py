@@ -1,5 +1,5 @@
 import logging
-from rallytools import settings
+from rallytools import clients
 from .models import *
 from lib import battlenet
 
@@ -12,8 +12,23 @@ class GameDataImportError(Exception):
     pass
 
 class GameDataImporter(object):
-    def __init__(self):
-        self.battlenet_client = battlenet.BattleNetAPI(settings.BATTLENET_CLIENT_ID, settings.BATTLENET_CLIENT_SECRET)
+    def __init__(self, battlenet_client=None):
+        """
+        battlenet_client defaults to clients.get_battlenet_client()
+        """
+        if battlenet_client is None:
+            battlenet_client = clients.get_battlenet_client()
+        self.battlenet_client = battlenet_client
+
+    def _results(self, results, stopped=None):
+        """
+        Attaches a snapshot of the Battle.net client's per endpoint telemetry to a job's results,
+        and the reason the job stopped early if it did
+        """
+        if stopped is not None:
+            results['stopped'] = str(stopped)
+        results['client_stats'] = self.battlenet_client.stats()
+        return results
 
     def import_playable_races(self):
         num_success = 0
@@ -31,7 +46,7 @@ class GameDataImporter(object):
         except Exception as e:
             raise GameDataImportError(f"Failed to get playable races: {e}")
 
-        return {"num_success": num_success} 
+        return self._results({"num_success": num_success})
 
 
     def import_playable_classes(self):
@@ -41,10 +56,11 @@ class GameDataImporter(object):
         try:
             response = self.battlenet_client.get_playable_classes()
             
-            # Get all playable class data at the top level first
-            for playable_class in response['classes']:
-                # Then look for associated media - the icon for example
-                media_response = self.battlenet_client.get_playable_class_media(playable_class['id'])
+            # Get all playable class data at the top level first, then the associated media - the icon for example
+            media_responses = self.battlenet_client.get_many('playable_class_media', [c['id'] for c in response['classes']])
+            for playable_class, media_response in zip(response['classes'], media_responses):
+                if isinstance(media_response, Exception):
+                    raise media_response
                 icon = media_response['assets'][0]['value'] # Always first item in the array
             
                 entry, created = PlayableClass.objects.get_or_create(
@@ -57,7 +73,7 @@ class GameDataImporter(object):
         except Exception as e:
             raise GameDataImportError(f"Failed to get playable classes: {e}")
 
-        return {"num_success": num_success} 
+        return self._results({"num_success": num_success})
 
 
     def import_playable_specializations(self):
@@ -67,13 +83,15 @@ class GameDataImporter(object):
         try:
             response = self.battlenet_client.get_playable_specializations()
 
-            # Get all playable specialization data at the top level first
-            for playable_specialization in response['character_specializations']:
-                # Then get specialization specifics
-                specialization_response = self.battlenet_client.get_playable_specializations(playable_specialization['id'])
+            # Get all playable specialization data at the top level first, then the specifics and media in one batch
+            specializations = response['character_specializations']
+            details = self.battlenet_client.get_many('playable_specialization', [spec['id'] for spec in specializations], media=True)
+            for playable_specialization, detail in zip(specializations, details):
+                if isinstance(detail, Exception):
+                    raise detail
+                specialization_response, media_response = detail
                 playable_class_id = specialization_response['playable_class']['id']
 
-                media_response = self.battlenet_client.get_playable_specialization_media(playable_specialization['id'])
                 icon = media_response['assets'][0]['value']
 
                 playable_class = PlayableClass.objects.get(id=playable_class_id)
@@ -91,7 +109,7 @@ class GameDataImporter(object):
         except Exception as e:
             raise GameDataImportError(f"Failed to get playable specializations: {e}")
 
-        return {"num_success": num_success} 
+        return self._results({"num_success": num_success})
 
 
     def import_professions(self):
@@ -101,8 +119,10 @@ class GameDataImporter(object):
         try:
             response = self.battlenet_client.get_professions()
 
-            for profession in response['professions']:
-                media_response = self.battlenet_client.get_profession_media(profession['id'])
+            media_responses = self.battlenet_client.get_many('profession_media', [p['id'] for p in response['professions']])
+            for profession, media_response in zip(response['professions'], media_responses):
+                if isinstance(media_response, Exception):
+                    raise media_response
 
                 entry, created = Profession.objects.get_or_create(
                     id=profession['id'],
@@ -115,16 +135,18 @@ class GameDataImporter(object):
             logger.error(f"ERROR: failed to import profession data for profession {profession['id']}: {e}")
             raise GameDataImportError(f"Failed to import profession data: {e}")
 
-        return {"num_success": num_success}
+        return self._results({"num_success": num_success})
 
     def import_profession_skill_tiers(self):
         """
         """
         num_success = 0
         try:
-            professions = Profession.objects.all()
-            for profession in professions:
-                profession_response = self.battlenet_client.get_professions(id=profession.id)
+            professions = list(Profession.objects.all())
+            profession_responses = self.battlenet_client.get_many('profession', [profession.id for profession in professions])
+            for profession, profession_response in zip(professions, profession_responses):
+                if isinstance(profession_response, Exception):
+                    raise profession_response
                 if 'skill_tiers' not in profession_response:
                     continue #This is a profession without a specialization or tier
 
@@ -136,12 +158,13 @@ class GameDataImporter(object):
                     )
                     num_success += 1
         except Exception as e:
-            raise GameDataImportError(f"Failed to import profession skill tier data: {tier['id']} {tier['name']}: {e}")
+            raise GameDataImportError(f"Failed to import profession skill tier data: {e}")
 
-        return {"num_success": num_success}
+        return self._results({"num_success": num_success})
 
-    def sync_recipe(self, id, skill_tier):
+    def sync_recipe(self, id, skill_tier, recipe_response=None, recipe_media_response=None):
         """
+        recipe_response and recipe_media_response may be passed in when they were already fetched in bulk
         """
 
         logger.debug(f"DEBUG: sync recipe {id}")
@@ -153,9 +176,11 @@ class GameDataImporter(object):
         num_recipes_added = 0
         num_reagents_added = 0
 
-        recipe_media_response = self.battlenet_client.get_recipe_media(id=id)
+        if recipe_media_response is None:
+            recipe_media_response = self.battlenet_client.get_recipe_media(id=id)
 
-        recipe_response = self.battlenet_client.get_recipe(id=id)
+        if recipe_response is None:
+            recipe_response = self.battlenet_client.get_recipe(id=id)
         crafted_quantity = self.extract_crafted_quantity(recipe_response)
 
         recipe_entry, recipe_created = Recipe.objects.get_or_create(
@@ -213,11 +238,14 @@ class GameDataImporter(object):
         skill_tiers = ProfessionSkillTier.objects.all()
 
         # Get some ids for caching, skipping redundant work
-        known_recipes = Recipe.objects.all().values_list('id', flat=True)
+        known_recipes = set(Recipe.objects.all().values_list('id', flat=True))
         logger.debug("DEBUG: pulled known recipes")
+        stopped = None
 
            
 
+        # First collect the unknown recipes of every skill tier
+        new_recipes = [] # (recipe id, skill tier)
         for skill_tier in skill_tiers:
             try:
                 skill_tier_response = self.battlenet_client.get_profession_skill_tier(profession_id=skill_tier.profession.id, skill_tier_id=skill_tier.id)
@@ -231,17 +259,43 @@ class GameDataImporter(object):
                             logger.debug(f"DEBUG: Skip recipe {recipe['id']} - already known")
                             continue # Already tracked
 
-                        logger.info(f"INFO: Add recipe {recipe['id']}")
+                        known_recipes.add(recipe['id'])
+                        new_recipes.append((recipe['id'], skill_tier))
 
-                        # First set the recipe + media
-                        results = self.sync_recipe(recipe['id'], skill_tier)
-                        num_recipes_added += results['num_recipes_added']
-                        num_reagents_added += results['num_reagents_added']
-       
+            except battlenet.BattleNetAPIUnavailableError as e:
+                # Nothing was written yet; a later run starts over from the recipes it still doesn't know
+                logger.warning(f"WARNING: Battle.net unavailable, stopping recipe import: {e}")
+                return self._results({"num_recipes_added": num_recipes_added, "num_reagents_added": num_reagents_added}, e)
+            except Exception as e:
+                logger.error(f"ERROR: Failed to import profession recipe data for skill tier {skill_tier.id}: {e}")
+                raise GameDataImportError(f"Failed to import profession recipe data for skill tier {skill_tier.id}: {e}")
+
+        # Then fetch every recipe + media in one batch; the search API returns up to 1,000 per request
+        recipe_responses = self.battlenet_client.get_many('recipe', [recipe_id for recipe_id, skill_tier in new_recipes], media=True, search=True)
+        for (recipe_id, skill_tier), fetched in zip(new_recipes, recipe_responses):
+            if isinstance(fetched, battlenet.BattleNetAPIUnavailableError):
+                # Recipes saved so far are known next run, so it picks up from here
+                logger.warning(f"WARNING: Battle.net unavailable, stopping recipe import at recipe {recipe_id}: {fetched}")
+                stopped = fetched
+                break
+            try:
+                if isinstance(fetched, Exception):
+                    raise fetched
+                recipe_response, recipe_media_response = fetched
+                logger.info(f"INFO: Add recipe {recipe_id}")
+
+                results = self.sync_recipe(
+                    recipe_id,
+                    skill_tier,
+                    recipe_response=recipe_response,
+                    recipe_media_response=recipe_media_response
+                )
+                num_recipes_added += results['num_recipes_added']
+                num_reagents_added += results['num_reagents_added']
 
             except Exception as e:
                 logger.error(f"ERROR: Failed to import profession recipe data for skill tier {skill_tier.id}: {e}")
                 raise GameDataImportError(f"Failed to import profession recipe data for skill tier {skill_tier.id}: {e}")
 
-        return {"num_recipes_added": num_recipes_added, "num_reagents_added": num_reagents_added}
+        return self._results({"num_recipes_added": num_recipes_added, "num_reagents_added": num_reagents_added}, stopped)
 
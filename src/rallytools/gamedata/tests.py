@@ -1,3 +1,635 @@
-from django.test import TestCase
+import asyncio
+import inspect
+import json
+import tempfile
+import threading
+import time
+from unittest import mock
+import requests
+from django.test import SimpleTestCase, TestCase, override_settings
+from lib import battlenet, circuitbreaker, ratelimit, sharedstate, telemetry, transport, warcraftlogs
+from lib.httpcache import HTTPCache
+from lib.standin import BattleNetStandInServer
+from rallytools import clients
+from .jobs import GameDataImporter, GameDataImportError
+from .models import Profession, ProfessionSkillTier, Recipe
 
-# Create your tests here.
+
+class Clock(object):
+    """
+    Stands in for time.time in the modules under test
+    """
+
+    def __init__(self, now=1000000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class BattleNetTokenTests(SimpleTestCase):
+
+    def test_token_exchange_happens_outside_the_store_lock(self):
+        store = sharedstate.MemoryStateStore()
+        held = []
+
+        class CheckingTransport(transport.ReplayTransport):
+            def request(self, method, url, **kwargs):
+                if method == 'POST':
+                    # Another thread must be able to use the token's key while the exchange is in flight
+                    def probe():
+                        with store.locked('battlenet-token:id:us'):
+                            held.append(False)
+                    thread = threading.Thread(target=probe)
+                    thread.start()
+                    thread.join(timeout=2)
+                    held.append(thread.is_alive())
+                return super().request(method, url, **kwargs)
+
+        with tempfile.TemporaryDirectory() as fixture_dir:
+            client = battlenet.BattleNetAPI('id', 'secret', state_store=store, transport=CheckingTransport(fixture_dir))
+            client._get_access_token()
+            self.assertEqual(held, [False, False])
+            self.assertEqual(client.access_token, transport.REPLAY_TOKEN['access_token'])
+
+            # A second client sharing the store reuses the token instead of exchanging again
+            other = battlenet.BattleNetAPI('id', 'secret', state_store=store, transport=CheckingTransport(fixture_dir))
+            other._get_access_token()
+            self.assertEqual(len(held), 2)
+            self.assertEqual(other.token_expiry, client.token_expiry)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'sharedstate'}})
+class SharedStateTests(SimpleTestCase):
+
+    def test_cache_lock_of_a_dead_holder_expires_before_waiters_give_up(self):
+        store = sharedstate.DjangoCacheStateStore()
+        # A holder that died without releasing its lock
+        store.cache.add('state:lock', 'dead', timeout=1)
+        with mock.patch.object(sharedstate.DjangoCacheStateStore, 'LOCK_WAIT_SECONDS', 3):
+            with store.locked('state') as state:
+                state['value'] = 1
+        with store.locked('state') as state:
+            self.assertEqual(state, {'value': 1})
+        self.assertGreater(sharedstate.DjangoCacheStateStore.LOCK_WAIT_SECONDS, sharedstate.DjangoCacheStateStore.LOCK_TIMEOUT_SECONDS)
+
+
+class IterJsonArrayTests(SimpleTestCase):
+
+    document = json.dumps({
+        '_links': {'self': {'href': 'https://us.api.blizzard.com/data/wow/auctions/commodities'}},
+        'auctions': [
+            {'id': 1, 'item': {'id': 5}, 'quantity': 20, 'unit_price': 1500, 'note': 'caf\u00e9 \u20ac \U0001f4b0'},
+            {'id': 2, 'item': {'id': 6}, 'quantity': 1, 'unit_price': 99, 'note': '[not, the, end]'},
+            {'id': 3, 'item': {'id': 5}, 'quantity': 7, 'unit_price': 123456789},
+        ],
+        'auctions_count': 3,
+    }, ensure_ascii=False).encode('utf-8')
+
+    def parse(self, body, size):
+        return list(battlenet.iter_json_array((body[i:i + size] for i in range(0, len(body), size)), 'auctions'))
+
+    def test_every_chunk_boundary(self):
+        expected = json.loads(self.document)['auctions']
+        # Boundaries fall inside the key, numbers, strings and multi-byte UTF-8 characters
+        for size in range(1, 40):
+            self.assertEqual(self.parse(self.document, size), expected, size)
+        for split in range(1, len(self.document)):
+            chunks = [self.document[:split], self.document[split:]]
+            self.assertEqual(list(battlenet.iter_json_array(chunks, 'auctions')), expected, split)
+
+    def test_numbers_split_across_chunks(self):
+        self.assertEqual(list(battlenet.iter_json_array([b'{"values": [12', b'34, 5', b'6]}'], 'values')), [1234, 56])
+
+    def test_empty_and_truncated_arrays(self):
+        self.assertEqual(self.parse(b'{"auctions": [ ]}', 3), [])
+        with self.assertRaises(battlenet.BattleNetAPIError):
+            self.parse(self.document[:len(self.document) // 2], 16)
+        with self.assertRaises(battlenet.BattleNetAPIError):
+            self.parse(b'{"other": []}', 4)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        patcher = mock.patch.object(circuitbreaker.time, 'time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = circuitbreaker.CircuitBreaker(
+            failure_rate=0.5, min_requests=4, window_seconds=60, open_seconds=30, store=sharedstate.MemoryStateStore()
+        )
+
+    def test_state_transitions(self):
+        breaker = self.breaker
+        breaker.record_success()
+        breaker.record_failure()
+        breaker.record_success()
+        self.assertEqual(breaker.state, circuitbreaker.CLOSED)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, circuitbreaker.OPEN)
+        self.assertEqual(breaker.allow(), 30)
+
+        # After open_seconds one probe goes through; a failed probe reopens the circuit
+        self.clock.now += 30
+        self.assertEqual(breaker.allow(), 0)
+        self.assertEqual(breaker.state, circuitbreaker.HALF_OPEN)
+        self.assertGreater(breaker.allow(), 0)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, circuitbreaker.OPEN)
+
+        # A successful probe closes it
+        self.clock.now += 30
+        self.assertEqual(breaker.allow(), 0)
+        breaker.record_success()
+        self.assertEqual(breaker.state, circuitbreaker.CLOSED)
+        self.assertEqual(breaker.allow(), 0)
+
+    def test_failures_age_out_of_the_window(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.clock.now += 61
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, circuitbreaker.CLOSED)
+
+    def test_probe_that_never_reports_back_is_forgotten(self):
+        for _ in range(4):
+            self.breaker.record_failure()
+        self.clock.now += 30
+        self.assertEqual(self.breaker.allow(), 0)
+        self.clock.now += 30
+        self.assertEqual(self.breaker.allow(), 0)
+
+
+class RateLimiterTests(SimpleTestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        patcher = mock.patch.object(ratelimit.time, 'time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_buckets_refill_over_time(self):
+        limiter = ratelimit.RateLimiter([(2, 1), (3, 60)], store=sharedstate.MemoryStateStore())
+        self.assertEqual([limiter.reserve(), limiter.reserve()], [0, 0])
+        self.assertAlmostEqual(limiter.reserve(), 0.5)
+        self.clock.now += 0.5
+        self.assertEqual(limiter.reserve(), 0)
+        # The slower bucket is now empty and has refilled 1.5s * 3/60 tokens, so 0.925 tokens are 18.5s away
+        self.clock.now += 1
+        self.assertAlmostEqual(limiter.reserve(), 18.5)
+        self.clock.now += 18.5
+        self.assertEqual(limiter.reserve(), 0)
+
+    def test_penalize_pauses_every_user_of_the_quota(self):
+        store = sharedstate.MemoryStateStore()
+        limiter = ratelimit.RateLimiter([(100, 1)], store=store, key='quota')
+        other = ratelimit.RateLimiter([(100, 1)], store=store, key='quota')
+        limiter.penalize(5)
+        self.assertAlmostEqual(other.reserve(), 5)
+        self.clock.now += 5
+        self.assertEqual(other.reserve(), 0)
+
+
+class HTTPCacheTests(SimpleTestCase):
+
+    def test_not_modified_responses_are_served_from_the_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = transport.FixtureStore(f"{directory}/fixtures")
+            item = {'id': 5, 'name': 'Test Ore'}
+            store.save('GET', '/data/wow/item/5', {'namespace': 'static-us', 'locale': 'en_US'}, 200,
+                       {'Content-Type': 'application/json', 'ETag': '"v1"'}, json.dumps(item).encode())
+
+            statuses = []
+
+            class CountingTransport(transport.ReplayTransport):
+                def request(self, method, url, **kwargs):
+                    response = super().request(method, url, **kwargs)
+                    if method == 'GET':
+                        statuses.append(response.status_code)
+                    return response
+
+            client = battlenet.BattleNetAPI(
+                'id', 'secret', state_store=sharedstate.MemoryStateStore(),
+                http_cache=HTTPCache(f"{directory}/cache.sqlite3"), transport=CountingTransport(f"{directory}/fixtures")
+            )
+            self.assertEqual(client.get_item(5), item)
+            self.assertEqual(client.get_item(5), item)
+            self.assertEqual(statuses, [200, 304])
+            self.assertEqual(client.stats()['/data/wow/item/{id}']['cache_hits'], 1)
+
+            # A changed resource replaces the cached copy
+            store.save('GET', '/data/wow/item/5', {'namespace': 'static-us', 'locale': 'en_US'}, 200,
+                       {'Content-Type': 'application/json', 'ETag': '"v2"'}, json.dumps(dict(item, name='Ore')).encode())
+            self.assertEqual(client.get_item(5)['name'], 'Ore')
+            self.assertEqual(statuses, [200, 304, 200])
+
+
+class FakeUpstream(object):
+    """
+    Transport answering GETs from {path: (status, headers, body)} like Battle.net would,
+    304 included
+    """
+
+    def __init__(self, responses):
+        self.responses = responses
+
+    def request(self, method, url, **kwargs):
+        if method == 'POST':
+            return transport.build_response(method, url, 200, {}, json.dumps(transport.REPLAY_TOKEN).encode())
+        path, _ = transport.FixtureStore.split_url(url)
+        status, headers, body = self.responses.get(path, (404, {}, b''))
+        if headers.get('ETag') and (kwargs.get('headers') or {}).get('If-None-Match') == headers['ETag']:
+            return transport.build_response(method, url, 304, headers, b'')
+        return transport.build_response(method, url, status, headers, body)
+
+    def close(self):
+        pass
+
+
+class TransportTests(SimpleTestCase):
+
+    item = {'id': 5, 'name': 'Test Ore'}
+    races = {'races': [{'id': 1, 'name': 'Human'}]}
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        headers = {'Content-Type': 'application/json', 'ETag': '"v1"'}
+        self.upstream = FakeUpstream({
+            '/data/wow/item/5': (200, headers, json.dumps(self.item).encode()),
+            '/data/wow/playable-race/index': (200, headers, json.dumps(self.races).encode()),
+            '/data/wow/item/6': (503, {}, b''),
+        })
+
+    def api(self, transport_, http_cache=None, **kwargs):
+        return battlenet.BattleNetAPI('id', 'secret', state_store=sharedstate.MemoryStateStore(),
+                                      http_cache=http_cache, transport=transport_, **kwargs)
+
+    def fetch(self, client):
+        return client.get_item(5), client.get_playable_races()
+
+    def test_record_then_replay(self):
+        recorded = self.fetch(self.api(transport.RecordingTransport(f"{self.directory}/fixtures", self.upstream)))
+        replayed = self.fetch(self.api(transport.ReplayTransport(f"{self.directory}/fixtures")))
+        self.assertEqual(recorded, (self.item, self.races))
+        self.assertEqual(replayed, recorded)
+
+    def test_recording_with_a_warm_http_cache(self):
+        cache = HTTPCache(f"{self.directory}/cache.sqlite3")
+        self.fetch(self.api(self.upstream, http_cache=cache))
+
+        # The client revalidates, but the fixture must still hold the full body
+        recorder = self.api(transport.RecordingTransport(f"{self.directory}/fixtures", self.upstream), http_cache=cache)
+        self.assertEqual(self.fetch(recorder), (self.item, self.races))
+        replayer = self.api(transport.ReplayTransport(f"{self.directory}/fixtures"))
+        self.assertEqual(self.fetch(replayer), (self.item, self.races))
+
+    def test_failed_responses_are_not_recorded(self):
+        recorder = transport.RecordingTransport(f"{self.directory}/fixtures", self.upstream)
+        url = 'https://us.api.blizzard.com/data/wow/item/6'
+        self.assertEqual(recorder.request('GET', url).status_code, 503)
+        self.assertIsNone(recorder.store.load('GET', '/data/wow/item/6', {}))
+
+        # Nor do they replace an earlier good fixture
+        recorder.store.save('GET', '/data/wow/item/6', {}, 200, {}, b'{"id": 6}')
+        recorder.request('GET', url)
+        self.assertEqual(recorder.store.load('GET', '/data/wow/item/6', {})[1], b'{"id": 6}')
+
+    def test_replayed_snapshots_stream(self):
+        auctions = [{'id': 1, 'item': {'id': 5}, 'quantity': 2, 'unit_price': 100}]
+        transport.FixtureStore(self.directory).save(
+            'GET', '/data/wow/auctions/commodities', {'namespace': 'dynamic-us', 'locale': 'en_US'}, 200,
+            {'Last-Modified': 'Mon, 14 Jul 2025 10:00:00 GMT'}, json.dumps({'auctions': auctions}).encode()
+        )
+        snapshot = self.api(transport.ReplayTransport(self.directory)).get_commodities_snapshot(stream=True)
+        self.assertEqual(list(snapshot.iter_auctions()), auctions)
+        snapshot.close()
+
+    def test_unusable_bodies_raise_api_errors(self):
+        store = transport.FixtureStore(self.directory)
+        params = {'namespace': 'static-us', 'locale': 'en_US'}
+        store.save('GET', '/data/wow/item/5', params, 200, {'Content-Type': 'application/json'}, b'<html>')
+        # A 304 recorded before conditional headers were dropped
+        store.save('GET', '/data/wow/item/7', params, 304, {'ETag': '"v1"'}, b'')
+        client = self.api(transport.ReplayTransport(self.directory))
+        for item_id in (5, 7):
+            with self.assertRaises(battlenet.BattleNetAPIError):
+                client.get_item(item_id)
+
+    def test_standin_server_serves_fixtures(self):
+        fixtures = f"{self.directory}/fixtures"
+        self.fetch(self.api(transport.RecordingTransport(fixtures, self.upstream)))
+        server = BattleNetStandInServer(fixtures)
+        server.start()
+        self.addCleanup(server.stop)
+
+        client = self.api(transport.LiveTransport(), http_cache=HTTPCache(f"{self.directory}/cache.sqlite3"),
+                             api_host=server.url, token_url=f"{server.url}/oauth/token")
+        self.addCleanup(client.close)
+        self.assertEqual(self.fetch(client), (self.item, self.races))
+        # Revalidated against the fixture's ETag
+        self.assertEqual(self.fetch(client), (self.item, self.races))
+        self.assertEqual(client.stats()['/data/wow/item/{id}']['cache_hits'], 1)
+        with self.assertRaises(battlenet.BattleNetAPINotFoundError):
+            client.get_item(8)
+
+
+class JSONBackendTests(SimpleTestCase):
+
+    def setUp(self):
+        self.addCleanup(battlenet.set_json_backend, battlenet.JSON_BACKEND)
+
+    def test_explicit_and_auto_selection(self):
+        self.assertEqual(battlenet.set_json_backend('json'), 'json')
+        self.assertIs(battlenet.json_loads, json.loads)
+        expected = 'json' if battlenet.orjson is None else 'orjson'
+        for name in ('auto', None, ''):
+            self.assertEqual(battlenet.set_json_backend(name), expected)
+            self.assertEqual(battlenet.JSON_BACKEND, expected)
+        self.assertEqual(battlenet.json_loads(b'{"id": 1, "name": "caf\xc3\xa9"}'), {'id': 1, 'name': 'caf\u00e9'})
+
+    def test_falls_back_to_json_without_orjson(self):
+        with mock.patch.dict(battlenet.JSON_BACKENDS, {'orjson': None}):
+            self.assertEqual(battlenet.set_json_backend('auto'), 'json')
+            with self.assertLogs(battlenet.logger, 'WARNING'):
+                self.assertEqual(battlenet.set_json_backend('orjson'), 'json')
+            self.assertIs(battlenet.json_loads, json.loads)
+
+    def test_unknown_backends_are_rejected(self):
+        battlenet.set_json_backend('json')
+        with self.assertRaisesRegex(ValueError, 'Unknown JSON backend: ujson'):
+            battlenet.set_json_backend('ujson')
+        # The previous backend stays in use
+        self.assertEqual(battlenet.JSON_BACKEND, 'json')
+
+
+class TelemetryTests(SimpleTestCase):
+
+    def test_counters(self):
+        events = []
+        recorder = telemetry.ClientTelemetry(callback=lambda template, event: events.append((template, event['type'])))
+        recorder.record_request('/a', 3, status=200, response_bytes=100)
+        recorder.record_request('/a', 30, status=429, retry=True)
+        recorder.record_request('/a', 20000, status=502, retry=True)
+        recorder.record_request('/a', 7)
+        recorder.record_cache_hit('/a')
+
+        stats = recorder.stats()['/a']
+        self.assertEqual(
+            {key: stats[key] for key in ('count', 'errors', 'retries', 'throttled', 'bad_gateway', 'cache_hits', 'bytes')},
+            {'count': 4, 'errors': 3, 'retries': 2, 'throttled': 1, 'bad_gateway': 1, 'cache_hits': 1, 'bytes': 100}
+        )
+        histogram = stats['latency_ms']['histogram']
+        self.assertEqual((histogram['<=5'], histogram['<=10'], histogram['<=50'], histogram['>10000']), (1, 1, 1, 1))
+        self.assertEqual((stats['latency_ms']['mean'], stats['latency_ms']['max']), (5010.0, 20000))
+        self.assertEqual(events, [('/a', 'request')] * 4 + [('/a', 'cache_hit')])
+
+        recorder.reset()
+        self.assertEqual(recorder.stats(), {})
+
+    def test_endpoint_templates(self):
+        self.assertEqual(battlenet._endpoint_template('/data/wow/item/19019'), '/data/wow/item/{id}')
+        self.assertEqual(battlenet._endpoint_template('/data/wow/media/item/19019'), '/data/wow/media/item/{id}')
+        self.assertEqual(battlenet._endpoint_template('/data/wow/profession/164/skill-tier/2822'), '/data/wow/profession/{id}/skill-tier/{id}')
+        self.assertEqual(battlenet._endpoint_template('/profile/wow/character/area-52/thrall/professions'),
+                         '/profile/wow/character/{realm}/{name}/professions')
+        self.assertEqual(battlenet._endpoint_template('/data/wow/guild/area-52/rally'), '/data/wow/guild/{realm}/{name}')
+        self.assertEqual(battlenet._endpoint_template('/data/wow/playable-race/index'), '/data/wow/playable-race/index')
+
+    def test_battlenet_requests_are_counted_per_template(self):
+        class SequenceUpstream(FakeUpstream):
+            def request(self, method, url, **kwargs):
+                if method == 'GET' and url.endswith('/item/6'):
+                    if not attempts:
+                        raise requests.exceptions.ConnectionError('connection reset')
+                    status, headers = attempts.pop(0)
+                    return transport.build_response(method, url, status, headers, b'')
+                return super().request(method, url, **kwargs)
+
+        item = json.dumps({'id': 5}).encode()
+        upstream = SequenceUpstream({'/data/wow/item/5': (200, {}, item)})
+        attempts = [(502, {}), (429, {'Retry-After': '0'})]
+        client = battlenet.BattleNetAPI('id', 'secret', state_store=sharedstate.MemoryStateStore(), transport=upstream)
+        client.get_item(5)
+        with mock.patch.object(battlenet.time, 'sleep'):
+            with self.assertRaises(battlenet.BattleNetAPIError):
+                client.get_item(6)
+
+        stats = client.stats()
+        self.assertEqual(list(stats), ['/data/wow/item/{id}'])
+        stats = stats['/data/wow/item/{id}']
+        self.assertEqual(
+            {key: stats[key] for key in ('count', 'errors', 'retries', 'throttled', 'bad_gateway', 'bytes')},
+            {'count': 4, 'errors': 3, 'retries': 2, 'throttled': 1, 'bad_gateway': 1, 'bytes': len(item)}
+        )
+
+    def test_warcraftlogs_operations_are_counted(self):
+        client = warcraftlogs.WarcraftLogsAPI('id', 'secret')
+        client.access_token = 'token'
+        body = json.dumps({'data': {'reportData': {'report': None}}}).encode()
+        with mock.patch.object(warcraftlogs.requests, 'post', return_value=transport.build_response('POST', client.api_endpoint, 200, {}, body)):
+            client.get_report('abc')
+        with mock.patch.object(warcraftlogs.requests, 'post', side_effect=requests.exceptions.ConnectionError('down')):
+            with mock.patch('builtins.print'):
+                self.assertIsNone(client.get_fight('abc', 1))
+
+        stats = client.stats()
+        self.assertEqual((stats['get_report']['count'], stats['get_report']['errors'], stats['get_report']['bytes']), (1, 0, len(body)))
+        self.assertEqual((stats['get_fight']['count'], stats['get_fight']['errors']), (1, 1))
+
+
+class GetManyTests(SimpleTestCase):
+
+    def setUp(self):
+        responses = {}
+        for id in (1, 2, 3, 4):
+            responses[f'/data/wow/item/{id}'] = (200, {}, json.dumps({'id': id}).encode())
+            responses[f'/data/wow/media/item/{id}'] = (200, {}, json.dumps({'id': id, 'assets': []}).encode())
+        del responses['/data/wow/item/2']
+
+        class SlowUpstream(FakeUpstream):
+            def request(self, method, url, **kwargs):
+                # Earlier ids answer last, so completion order is the reverse of the request order
+                if method == 'GET' and url.endswith('/1'):
+                    time.sleep(0.05)
+                return super().request(method, url, **kwargs)
+
+        self.client = battlenet.BattleNetAPI('id', 'secret', state_store=sharedstate.MemoryStateStore(), transport=SlowUpstream(responses))
+
+    def test_results_follow_the_order_of_ids(self):
+        items = self.client.get_many('item', [4, 1, 3], max_workers=3)
+        self.assertEqual(items, [{'id': 4}, {'id': 1}, {'id': 3}])
+        self.assertEqual(self.client.get_many('item', []), [])
+
+    def test_failures_are_returned_in_their_slot(self):
+        items = self.client.get_many('item', [1, 2, 3], media=True)
+        self.assertEqual(items[0], ({'id': 1}, {'id': 1, 'assets': []}))
+        self.assertIsInstance(items[1], battlenet.BattleNetAPINotFoundError)
+        self.assertEqual(items[2], ({'id': 3}, {'id': 3, 'assets': []}))
+
+    def test_unknown_resources_are_rejected(self):
+        with self.assertRaises(ValueError):
+            self.client.get_many('mount', [1])
+
+
+class SearchTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = transport.FixtureStore(directory.name)
+        self.client = battlenet.BattleNetAPI('id', 'secret', state_store=sharedstate.MemoryStateStore(),
+                                             transport=transport.ReplayTransport(directory.name))
+
+    def save_page(self, document, params, page, page_count, page_size, ids):
+        params = dict(params, namespace='static-us', locale='en_US', _page=page, _pageSize=page_size)
+        results = [{'data': {'id': id, 'name': {'en_US': f"Item {id}", 'fr_FR': f"Objet {id}"}}} for id in ids]
+        self.store.save('GET', f'/data/wow/search/{document}', params, 200, {'Content-Type': 'application/json'},
+                        json.dumps({'page': page, 'pageCount': page_count, 'results': results}).encode())
+
+    def test_pages_until_the_last_short_page(self):
+        self.save_page('item', {'orderby': 'id'}, 1, 2, 2, [1, 2])
+        self.save_page('item', {'orderby': 'id'}, 2, 2, 2, [3])
+        # A request for a third page would find no fixture and raise BattleNetAPINotFoundError
+        results = list(self.client.search('item', {'orderby': 'id'}, page_size=2))
+        self.assertEqual(results, [{'id': 1, 'name': 'Item 1'}, {'id': 2, 'name': 'Item 2'}, {'id': 3, 'name': 'Item 3'}])
+
+    def test_search_by_ids_searches_each_range(self):
+        self.save_page('item', {'id': '[1,3]', 'orderby': 'id'}, 1, 1, battlenet.SEARCH_PAGE_SIZE, [1, 2, 3])
+        self.save_page('item', {'id': '[500,500]', 'orderby': 'id'}, 1, 1, battlenet.SEARCH_PAGE_SIZE, [])
+        # Documents in a range that weren't asked for are left out, and so are ids the search doesn't know
+        self.assertEqual(self.client.search_by_ids('item', [3, 1, 500]), {1: {'id': 1, 'name': 'Item 1'}, 3: {'id': 3, 'name': 'Item 3'}})
+        self.assertEqual(self.client.search_by_ids('item', []), {})
+
+    def test_id_ranges(self):
+        gap = battlenet.SEARCH_MAX_ID_GAP
+        self.assertEqual(battlenet._id_ranges([], gap), [])
+        self.assertEqual(battlenet._id_ranges([7], gap), [(7, 7)])
+        self.assertEqual(battlenet._id_ranges([1, 1 + gap], gap), [(1, 1 + gap)])
+        self.assertEqual(battlenet._id_ranges([1, 2 + gap], gap), [(1, 1), (2 + gap, 2 + gap)])
+        self.assertEqual(battlenet._id_ranges([1, 2, 3, 4, 5], gap, max_size=2), [(1, 2), (3, 4), (5, 5)])
+
+    def test_delocalize(self):
+        document = {
+            'name': {'en_US': 'Linen Cloth', 'de_DE': 'Leinenstoff'},
+            'reagents': [{'reagent': {'name': {'en_US': 'Thread', 'fr_FR': 'Fil'}}, 'quantity': 2}],
+            'description': {'de_DE': 'Nur deutsch'},
+            'media': {'id': 5, 'en_US': 'not a localized mapping'},
+        }
+        self.assertEqual(battlenet._delocalize(document), {
+            'name': 'Linen Cloth',
+            'reagents': [{'reagent': {'name': 'Thread'}, 'quantity': 2}],
+            'description': {'de_DE': 'Nur deutsch'},
+            'media': {'id': 5, 'en_US': 'not a localized mapping'},
+        })
+        self.assertEqual(battlenet._delocalize(document, locale='de_DE')['name'], 'Leinenstoff')
+
+
+class GameDataImporterTests(TestCase):
+
+    def setUp(self):
+        self.client = mock.Mock(spec=battlenet.BattleNetAPI)
+        self.client.stats.return_value = {}
+        self.importer = GameDataImporter(battlenet_client=self.client)
+        profession = Profession.objects.create(id=164, name='Blacksmithing', icon='')
+        ProfessionSkillTier.objects.create(id=2822, name='Khaz Algar Blacksmithing', profession=profession)
+        self.client.get_profession_skill_tier.return_value = {'categories': [{'recipes': [{'id': 1}, {'id': 2}, {'id': 3}]}]}
+
+    @staticmethod
+    def recipe(id):
+        return {'id': id, 'name': f"Recipe {id}"}, {'assets': [{'value': f"icon-{id}"}]}
+
+    def test_recipes_stop_at_an_unavailable_slot(self):
+        unavailable = battlenet.BattleNetAPICircuitOpenError('circuit open')
+        self.client.get_many.return_value = [self.recipe(1), unavailable, self.recipe(3)]
+        results = self.importer.import_recipes_and_reagents()
+        self.assertEqual(results['num_recipes_added'], 1)
+        self.assertEqual(results['stopped'], 'circuit open')
+        self.assertEqual(list(Recipe.objects.values_list('id', flat=True)), [1])
+
+    def test_failed_slots_fail_the_import(self):
+        self.client.get_many.return_value = [self.recipe(1), battlenet.BattleNetAPIError('bad gateway'), self.recipe(3)]
+        with self.assertRaises(GameDataImportError):
+            self.importer.import_recipes_and_reagents()
+
+        self.client.get_many.return_value = [battlenet.BattleNetAPINotFoundError('not found')]
+        with self.assertRaises(GameDataImportError):
+            self.importer.import_profession_skill_tiers()
+
+
+class BattleNetClientsTests(SimpleTestCase):
+
+    def setUp(self):
+        self.built = []
+
+        def factory(region):
+            client = mock.Mock(spec=battlenet.BattleNetAPI, region=region)
+            self.built.append(client)
+            return client
+
+        self.registry = clients.BattleNetClients(['US', 'eu'], client_factory=factory)
+        self.addCleanup(self.registry.close)
+
+    def test_one_client_per_region(self):
+        self.assertIs(self.registry.get('us'), self.registry.get('US'))
+        self.assertIs(self.registry.get(), self.registry.get('us'))
+        self.assertIsNot(self.registry.get('eu'), self.registry.get('us'))
+        # Regions outside the configured ones are served too
+        self.assertEqual(self.registry.get('KR').region, 'kr')
+        self.assertEqual([client.region for client in self.built], ['us', 'eu', 'kr'])
+
+    def test_concurrent_gets_build_one_client(self):
+        threads = [threading.Thread(target=self.registry.get, args=('eu',)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.built), 1)
+
+    def test_async_clients_share_the_region_client(self):
+        async_client = self.registry.get_async('EU')
+        self.assertIs(async_client.client, self.registry.get('eu'))
+        self.assertIs(self.registry.get_async('eu'), async_client)
+        self.assertIsNot(self.registry.get_async(), async_client)
+
+    def test_close_resets_the_registry(self):
+        client = self.registry.get('us')
+        async_client = self.registry.get_async('us')
+        self.registry.close()
+        client.close.assert_called_once_with()
+        self.assertTrue(async_client._executor._shutdown)
+        self.assertEqual(self.registry.stats(), {})
+        self.assertIsNot(self.registry.get('us'), client)
+        self.assertIsNot(self.registry.get_async('us'), async_client)
+
+
+class AsyncBattleNetAPITests(SimpleTestCase):
+
+    def test_signatures_match_the_synchronous_client(self):
+        for name in ('search', 'search_by_ids', 'get_many', 'get_commodities_snapshot'):
+            expected = [p for p in inspect.signature(getattr(battlenet.BattleNetAPI, name)).parameters if p != 'max_workers']
+            self.assertEqual(list(inspect.signature(getattr(battlenet.AsyncBattleNetAPI, name)).parameters), expected, name)
+
+    def test_get_many_searches_first(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = transport.FixtureStore(directory)
+            headers = {'Content-Type': 'application/json'}
+            search = {
+                'namespace': 'static-us', 'locale': 'en_US', 'id': '[5,7]', 'orderby': 'id',
+                '_page': 1, '_pageSize': battlenet.SEARCH_PAGE_SIZE,
+            }
+            results = {'pageCount': 1, 'results': [{'data': {'id': 5, 'name': {'en_US': 'Test Ore', 'de_DE': 'Testerz'}}}]}
+            store.save('GET', '/data/wow/search/item', search, 200, headers, json.dumps(results).encode())
+            store.save('GET', '/data/wow/item/7', {'namespace': 'static-us', 'locale': 'en_US'}, 200, headers,
+                       json.dumps({'id': 7, 'name': 'Test Herb'}).encode())
+
+            client = battlenet.BattleNetAPI('id', 'secret', state_store=sharedstate.MemoryStateStore(),
+                                            transport=transport.ReplayTransport(directory))
+            async_client = battlenet.AsyncBattleNetAPI.from_client(client, max_concurrency=2)
+            try:
+                items = asyncio.run(async_client.get_many('item', [5, 7], search=True))
+            finally:
+                async_client.close()
+            self.assertEqual(items, [{'id': 5, 'name': 'Test Ore'}, {'id': 7, 'name': 'Test Herb'}])
@@ -1,34 +1,129 @@
 from datetime import datetime, timedelta
+import asyncio
 import logging
-from rallytools import settings
+from rallytools import clients, settings
 from .models import *
 from gamedata.models import PlayableClass, PlayableRace, PlayableSpecialization, Recipe
 from gamedata.jobs import GameDataImporter
-from lib import battlenet
+from lib import battlenet, sharedstate
 
 
 logger = logging.getLogger(__name__)
 
+# Characters fetched concurrently per batch.  Progress is checkpointed after each batch is written
+CHARACTER_BATCH_SIZE = 100
+
+
+def _resume_note():
+    """
+    What happens to the progress of a stopped sync.  Checkpoints are kept in the shared state store,
+    which only outlives the process with the file or cache backend
+    """
+    if settings.BATTLENET_SHARED_STATE_BACKEND == 'memory':
+        return "The next run starts over: set BATTLENET_SHARED_STATE_BACKEND to file or cache to resume"
+    return "The next run resumes where this one stopped"
+
 class GuildDataImportError(Exception):
     """
     Base exception class for jobs related to Guild Data Imports
     """
     pass
 
+def character_region(character):
+    """
+    Region a character is synced from: its guild's, or the default region for guildless characters
+    """
+    return character.guild.region if character.guild else None
+
+
 class GuildDataImporter(object):
-    def __init__(self):
-        self.battlenet_client = battlenet.BattleNetAPI(settings.BATTLENET_CLIENT_ID, settings.BATTLENET_CLIENT_SECRET)
-        self.gdi = GameDataImporter()
+    def __init__(self, battlenet_clients=None):
+        """
+        battlenet_clients defaults to a new clients.BattleNetClients.
+        Guilds and their characters are synced with the client of the guild's region
+        """
+        if battlenet_clients is None:
+            battlenet_clients = clients.BattleNetClients()
+        self.battlenet_clients = battlenet_clients
+        # Static game data is the same everywhere, so it comes from the default region
+        self.gdi = GameDataImporter(battlenet_client=self.battlenet_clients.get())
+
+    def _results(self, results, stopped=None):
+        """
+        Attaches a snapshot of each region's Battle.net client telemetry to a job's results,
+        and the reason the job stopped early if it did
+        """
+        if stopped is not None:
+            results['stopped'] = str(stopped)
+        results['client_stats'] = self.battlenet_clients.stats()
+        return results
+
+    async def _fetch_characters(self, characters, *getters):
+        """
+        Concurrently calls each of the named AsyncBattleNetAPI getters for every character,
+        through the client of the character's guild region.
+        Returns one entry per character, in order: a list of responses, or the
+        BattleNetAPINotFoundError/BattleNetAPIUnavailableError raised for that character.
+        """
+        async def fetch(character):
+            try:
+                return await asyncio.gather(*[
+                    getattr(self.battlenet_clients.get_async(character_region(character)), getter)(character.realm, character.name)
+                    for getter in getters
+                ])
+            except (battlenet.BattleNetAPINotFoundError, battlenet.BattleNetAPIUnavailableError) as e:
+                return e
+
+        return await asyncio.gather(*[fetch(character) for character in characters])
+
+    def _iter_characters(self, job, *getters):
+        """
+        Yields (character, responses) for every character, fetched in batches of CHARACTER_BATCH_SIZE.
+
+        The id of the last character handled is checkpointed after each batch, and whenever
+        iteration stops early, so the next run resumes after it.  Checkpoints are kept in the
+        shared state store, so resuming across runs requires BATTLENET_SHARED_STATE_BACKEND=file
+        or cache; the default memory store forgets them when the process exits.  If Battle.net becomes
+        unavailable, the BattleNetAPIUnavailableError is raised to the caller.
+        """
+        checkpoint = sharedstate.Checkpoint(f"guild.{job}", clients.get_shared_state_store())
+        characters = Character.objects.select_related('guild').order_by('id')
+        position = checkpoint.load()
+        if position is not None:
+            logger.info(f"INFO: Resuming {job} after character {position}")
+            characters = characters.filter(id__gt=position)
+        characters = list(characters)
+        logger.debug(f"DEBUG: need to sync {len(characters)} characters")
 
-    def import_guild(self, realm, name):
+        completed = False
+        try:
+            for start in range(0, len(characters), CHARACTER_BATCH_SIZE):
+                batch = characters[start:start + CHARACTER_BATCH_SIZE]
+                responses = asyncio.run(self._fetch_characters(batch, *getters))
+                for character, response in zip(batch, responses):
+                    if isinstance(response, battlenet.BattleNetAPIUnavailableError):
+                        raise response
+                    yield character, response
+                    position = character.id
+                checkpoint.save(position)
+            completed = True
+        finally:
+            # Also runs when the caller stops iterating, e.g. on an error while handling a character
+            if completed:
+                checkpoint.clear()
+            elif position is not None:
+                checkpoint.save(position)
+
+    def import_guild(self, realm, name, region=None):
         num_success = 0
         try:
-            response = self.battlenet_client.get_guild(realm, name)
+            battlenet_client = self.battlenet_clients.get(region)
+            response = battlenet_client.get_guild(realm, name)
             entry, created = Guild.objects.get_or_create(
                 id=response['id'],
                 name=response['name'],
                 realm=response['realm']['slug'],
-                region=self.battlenet_client.region,
+                region=battlenet_client.region,
                 faction=response['faction']['name']
             )
             num_success += 1
@@ -36,10 +131,10 @@ class GuildDataImporter(object):
         except Exception as e:
             raise GuildDataImportError(f"Failed to import guild: {e}")
 
-        return {"num_success": num_success} 
+        return self._results({"num_success": num_success})
 
 
-    def sync_guild_roster(self, realm, name):
+    def sync_guild_roster(self, realm, name, region=None):
         """
         """
 
@@ -50,12 +145,14 @@ class GuildDataImporter(object):
 
         try:
             guild = Guild.objects.filter(name=name,realm=realm)
+            if region:
+                guild = guild.filter(region=region)
             if not guild:
                 raise GuildDataImportError(f"No existing guild named {name} on realm {realm}.  Check the name or run import_guild first")
 
             existing_member_ids = guild.values_list('character__id', flat=True) #Use this to skip redundant checks
             added_or_skipped = set([])
-            response = self.battlenet_client.get_guild_roster(realm, name)
+            response = self.battlenet_clients.get(guild[0].region).get_guild_roster(realm, name)
 
             # Handle additions & skip those already existing
             for member in response['members']:
@@ -100,7 +197,7 @@ class GuildDataImporter(object):
             "num_removed": num_removed
         }
 
-        return results
+        return self._results(results)
 
 
     def sync_characters(self):
@@ -108,10 +205,9 @@ class GuildDataImporter(object):
         """
         num_success = 0
         characters_not_found = []
+        stopped = None
 
         yesterday = datetime.now() - timedelta(days=1)
-        characters = Character.objects.all() #filter(last_updated__lte=yesterday)
-        logger.debug(f"DEBUG: need to sync {len(characters)} characters")
 
         def extract_character_icons(character_media_response):
             """
@@ -132,32 +228,37 @@ class GuildDataImporter(object):
                     icons['character_model'] = asset['value']
             return icons
 
-                    
-        for character in characters:
 
-            try:
-                character_response = self.battlenet_client.get_character_summary(character.realm, character.name)
-                character_media_response =  self.battlenet_client.get_character_media(character.realm, character.name)
+        # Fetch in batches with bounded concurrency, then write each batch sequentially
+        try:
+            for character, response in self._iter_characters('sync_characters', 'get_character_summary', 'get_character_media'):
+
+                if isinstance(response, battlenet.BattleNetAPINotFoundError):
+                    logger.warning(f"WARNING: character {character.id} not found. skipping")
+                    characters_not_found.append(character.id)
+                    continue
+
+                character_response, character_media_response = response
                 icons = extract_character_icons(character_media_response)
-            except battlenet.BattleNetAPINotFoundError as e:
-                logger.warning(f"WARNING: character {character.id} not found. skipping")
-                characters_not_found.append(character.id)
-                continue
 
              
-            active_spec = PlayableSpecialization.objects.get(id=character_response['active_spec']['id']) 
-            character.icon = icons['icon']
-            character.inset_icon = icons['inset_icon']
-            character.character_model = icons['character_model']
-            character.active_spec = active_spec
-            character.achievement_points = character_response['achievement_points']
-            character.average_item_level = character_response['average_item_level']
-            character.equipped_item_level = character_response['equipped_item_level']
-            character.save()
+                active_spec = PlayableSpecialization.objects.get(id=character_response['active_spec']['id']) 
+                character.icon = icons['icon']
+                character.inset_icon = icons['inset_icon']
+                character.character_model = icons['character_model']
+                character.active_spec = active_spec
+                character.achievement_points = character_response['achievement_points']
+                character.average_item_level = character_response['average_item_level']
+                character.equipped_item_level = character_response['equipped_item_level']
+                character.save()
 
-            num_success += 1
+                num_success += 1
 
-        return {"num_success": num_success, 'characters_not_found': characters_not_found}
+        except battlenet.BattleNetAPIUnavailableError as e:
+            logger.warning(f"WARNING: Battle.net unavailable, stopping character sync. {_resume_note()}: {e}")
+            stopped = e
+
+        return self._results({"num_success": num_success, 'characters_not_found': characters_not_found}, stopped)
 
 
 
@@ -170,70 +271,76 @@ class GuildDataImporter(object):
         num_removed = 0
         characters_not_found = []
         extra_results = {} #Used if we call downstream additions
+        stopped = None
 
-        characters = Character.objects.all()
-        for character in characters:
-            try:
-                profession_response = self.battlenet_client.get_character_professions(character.realm, character.name)
-            except battlenet.BattleNetAPINotFoundError as e:
-                # Some characters actually 404 ?
-                logger.warning(f"WARNING: character {character.id} not found. skipping")
-                characters_not_found.append(character.id)
-                continue
-
-            known_recipes = character.known_recipes.all().values_list('id', flat=True)
-            known_recipes = set(known_recipes)
-            discovered_recipes = set([])
-
-            has_changes = False #Track if we need to save
-
-            # Handle Additions
-            for profession_type in ['primaries', 'secondaries']:
-                for tiers in profession_response.get(profession_type, []):
-                    for tier in tiers.get('tiers', []): #Some professions such as Archaeology don't have tiers
-                        for recipe_response in tier.get('known_recipes', []): # People may have picked up a profession but have 0 known recipes
-                            discovered_recipes.update([recipe_response['id']])
-                            if recipe_response['id'] in known_recipes:
-                                logger.debug(f"DEBUG: skip already known recipe {recipe_response['id']}")
-                                # Skip professions already known
-                                continue
-
-                            has_changes = True
-
-                            logger.debug(f"DEBUG: query recipe {recipe_response['id']}")
-                            try:
-                                recipe = Recipe.objects.get(id=recipe_response['id'])
-                            except Recipe.DoesNotExist:
-                                # Interesting edge case
-                                local_results = self.gdi.sync_recipe(recipe_response['id'], skill_tier=tier['tier']['id'])
-                                for key in local_results:
-                                    if key not in extra_results:
-                                        extra_results.update({key: 0})
-                                    extra_results[key] += local_results[key]
-
-                                recipe = Recipe.objects.get(id=recipe_response['id'])
-
-                            logging.info(f"INFO: Add recipe {recipe_response['id']} to {character.id}")
-                            num_added += 1
-                            character.known_recipes.add(recipe)
-
-            # Handle removals
-            recipes_to_remove = known_recipes - discovered_recipes
-            for recipe_to_remove in recipes_to_remove:
-                has_changes = True
-                logging.info(f"INFO: Remove recipe {recipe_to_remove} from {character.id}")
-                recipe = Recipe.objects.get(id=recipe_to_remove)
-                character.known_recipes.remove(recipe)
-                num_removed += 1
+        try:
+            for character, response in self._iter_characters('sync_character_recipes', 'get_character_professions'):
+                if isinstance(response, battlenet.BattleNetAPINotFoundError):
+                    # Some characters actually 404 ?
+                    logger.warning(f"WARNING: character {character.id} not found. skipping")
+                    characters_not_found.append(character.id)
+                    continue
 
-            if has_changes:
-                logging.info(f"INFO: Save character {character.id}")
-                character.save()
+                profession_response = response[0]
+
+                known_recipes = character.known_recipes.all().values_list('id', flat=True)
+                known_recipes = set(known_recipes)
+                discovered_recipes = set([])
+
+                has_changes = False #Track if we need to save
+
+                # Handle Additions
+                for profession_type in ['primaries', 'secondaries']:
+                    for tiers in profession_response.get(profession_type, []):
+                        for tier in tiers.get('tiers', []): #Some professions such as Archaeology don't have tiers
+                            for recipe_response in tier.get('known_recipes', []): # People may have picked up a profession but have 0 known recipes
+                                discovered_recipes.update([recipe_response['id']])
+                                if recipe_response['id'] in known_recipes:
+                                    logger.debug(f"DEBUG: skip already known recipe {recipe_response['id']}")
+                                    # Skip professions already known
+                                    continue
+
+                                has_changes = True
+
+                                logger.debug(f"DEBUG: query recipe {recipe_response['id']}")
+                                try:
+                                    recipe = Recipe.objects.get(id=recipe_response['id'])
+                                except Recipe.DoesNotExist:
+                                    # Interesting edge case
+                                    local_results = self.gdi.sync_recipe(recipe_response['id'], skill_tier=tier['tier']['id'])
+                                    for key in local_results:
+                                        if key not in extra_results:
+                                            extra_results.update({key: 0})
+                                        extra_results[key] += local_results[key]
+
+                                    recipe = Recipe.objects.get(id=recipe_response['id'])
+
+                                logging.info(f"INFO: Add recipe {recipe_response['id']} to {character.id}")
+                                num_added += 1
+                                character.known_recipes.add(recipe)
+
+                # Handle removals
+                recipes_to_remove = known_recipes - discovered_recipes
+                for recipe_to_remove in recipes_to_remove:
+                    has_changes = True
+                    logging.info(f"INFO: Remove recipe {recipe_to_remove} from {character.id}")
+                    recipe = Recipe.objects.get(id=recipe_to_remove)
+                    character.known_recipes.remove(recipe)
+                    num_removed += 1
+
+                if has_changes:
+                    logging.info(f"INFO: Save character {character.id}")
+                    character.save()
+
+        except battlenet.BattleNetAPIUnavailableError as e:
+            # Also raised by sync_recipe for recipes we didn't know yet
+            logger.warning(f"WARNING: Battle.net unavailable, stopping character recipe sync. {_resume_note()}: {e}")
+            stopped = e
 
         results = {"num_added": num_added, "num_removed": num_removed, 'characters_not_found': characters_not_found}
         if extra_results:
             results.update(**extra_results)
-        return results
+        return self._results(results, stopped)
 
 
 
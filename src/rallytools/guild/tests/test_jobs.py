@@ -0,0 +1,70 @@
+from unittest import mock
+from django.test import TestCase
+from guild import jobs
+from guild.models import Character
+from gamedata.models import PlayableClass, PlayableRace
+from lib import battlenet, sharedstate
+from rallytools import clients
+
+
+class CharacterCheckpointTests(TestCase):
+
+    def setUp(self):
+        playable_class = PlayableClass.objects.create(id=1, name='Warrior', icon='')
+        playable_race = PlayableRace.objects.create(id=2, name='Orc')
+        for id in range(1, 6):
+            Character.objects.create(id=id, name=f"Char{id}", level=80, realm='test-realm',
+                                     playable_class=playable_class, playable_race=playable_race)
+
+        self.store = sharedstate.MemoryStateStore()
+        for patcher in (mock.patch.object(jobs.clients, 'get_shared_state_store', return_value=self.store),
+                        mock.patch.object(jobs, 'CHARACTER_BATCH_SIZE', 2)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        registry = clients.BattleNetClients(['us'], client_factory=lambda region: mock.Mock(spec=battlenet.BattleNetAPI, region=region))
+        self.importer = jobs.GuildDataImporter(battlenet_clients=registry)
+        self.unavailable = set()
+
+        async def fetch_characters(characters, *getters):
+            return [
+                battlenet.BattleNetAPICircuitOpenError('circuit open') if character.id in self.unavailable else [{'id': character.id}]
+                for character in characters
+            ]
+        self.importer._fetch_characters = fetch_characters
+        self.checkpoint = sharedstate.Checkpoint('guild.test', self.store)
+
+    def handled(self):
+        return [character.id for character, response in self.importer._iter_characters('test', 'get_character_summary')]
+
+    def test_unavailable_mid_batch_resumes_after_the_last_handled_character(self):
+        self.unavailable = {4}
+        handled = []
+        with self.assertRaises(battlenet.BattleNetAPIUnavailableError):
+            for character, response in self.importer._iter_characters('test', 'get_character_summary'):
+                handled.append(character.id)
+        # Character 4 is in the same batch as 3
+        self.assertEqual(handled, [1, 2, 3])
+        self.assertEqual(self.checkpoint.load(), 3)
+
+        self.unavailable = set()
+        self.assertEqual(self.handled(), [4, 5])
+        self.assertIsNone(self.checkpoint.load())
+        # A completed run leaves nothing to resume from
+        self.assertEqual(self.handled(), [1, 2, 3, 4, 5])
+
+    def test_error_while_handling_a_character_retries_it(self):
+        with self.assertRaises(ValueError):
+            for character, response in self.importer._iter_characters('test', 'get_character_summary'):
+                if character.id == 2:
+                    raise ValueError(character.id)
+        # Character 2 wasn't handled, so the next run starts with it
+        self.assertEqual(self.checkpoint.load(), 1)
+        self.assertEqual(self.handled(), [2, 3, 4, 5])
+
+    def test_stopped_sync_reports_why(self):
+        self.unavailable = {1}
+        results = self.importer.sync_characters()
+        self.assertEqual(results['num_success'], 0)
+        self.assertEqual(results['stopped'], 'circuit open')
+        self.assertIsNone(sharedstate.Checkpoint('guild.sync_characters', self.store).load())
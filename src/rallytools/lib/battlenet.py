@@ -1,15 +1,138 @@
 import requests
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
+import threading
 import time
 import random
 import logging
+from email.utils import parsedate_to_datetime
+import codecs
+import hashlib
+import json
+import re
+from lib import sharedstate
+from lib.ratelimit import RateLimiter
+from lib.circuitbreaker import CircuitBreaker, RetryBudget
+from lib.transport import LiveTransport
+from lib.telemetry import ClientTelemetry
+
+try:
+    import orjson
+except ImportError: # Optional, the json module is used instead
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
 RETRY_STATUS_CODES = [429, 502]
+# Statuses counted as upstream failures by the circuit breaker, besides network errors.
+# 429 means Battle.net is up but throttling us, which the rate limiter handles instead.
+CIRCUIT_FAILURE_STATUS_CODES = range(500, 600)
 NOT_FOUND_STATUS_CODES = [404]
+NOT_MODIFIED_STATUS_CODE = 304
 MAX_RETRIES = 3
 BASE_BACKOFF_SECONDS = 1
 
+# Connection pooling defaults.  Each client owns a keep-alive session so
+# repeated calls reuse the same TCP+TLS connection instead of renegotiating.
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 30
+
+# Blizzard quotas per client: 100 requests per second and 36,000 per hour
+RATE_LIMITS = [(100, 1), (36000, 3600)]
+
+# Circuit breaker defaults: open when half the requests of the last minute failed
+# (given at least 20 of them), then probe again after 30 seconds
+CIRCUIT_FAILURE_RATE = 0.5
+CIRCUIT_MIN_REQUESTS = 20
+CIRCUIT_WINDOW_SECONDS = 60
+CIRCUIT_OPEN_SECONDS = 30
+
+# Namespaces whose responses are cached and revalidated with conditional requests.
+# Static game data only changes with patches.
+CACHEABLE_NAMESPACE_PREFIXES = ('static-',)
+
+# Bytes read per chunk when streaming large responses such as the commodities dump
+STREAM_CHUNK_SIZE = 1 << 20
+
+# Resources available to get_many, mapped to the getter that fetches one id.
+# Each '<resource>' also has a '<resource>_media' counterpart.
+BULK_GETTERS = {
+    'item': 'get_item',
+    'item_media': 'get_item_media',
+    'recipe': 'get_recipe',
+    'recipe_media': 'get_recipe_media',
+    'playable_class': 'get_playable_classes',
+    'playable_class_media': 'get_playable_class_media',
+    'playable_specialization': 'get_playable_specializations',
+    'playable_specialization_media': 'get_playable_specialization_media',
+    'profession': 'get_professions',
+    'profession_media': 'get_profession_media',
+}
+
+# Resources get_many can fetch through the search API, mapped to their search document.
+# Media is searched in the 'media' document, filtered by the resource name as tag.
+SEARCH_DOCUMENTS = {
+    'item': 'item',
+    'recipe': 'recipe',
+}
+# Battle.net returns at most 1,000 documents per search page
+SEARCH_PAGE_SIZE = 1000
+# Ids further apart than this are searched as separate id ranges, so sparse id
+# lists don't page through thousands of unwanted documents
+SEARCH_MAX_ID_GAP = 50
+
+# Upper bound on in-flight requests for AsyncBattleNetAPI
+DEFAULT_MAX_CONCURRENCY = 10
+
+# Decoders for whole response bodies, see set_json_backend.  orjson decodes straight from bytes and is several
+# times faster; json decodes the bytes to a str first.  Streamed commodities snapshots (iter_json_array) are
+# always parsed with the json module, whichever backend is selected
+JSON_BACKENDS = {
+    'orjson': orjson.loads if orjson is not None else None,
+    'json': json.loads,
+}
+
+
+def set_json_backend(name='auto'):
+    """
+    Selects the decoder used for API response bodies.
+
+    Args:
+        name (str, optional): 'orjson', 'json' or 'auto' (orjson when it is installed).
+                              Falls back to the json module if the backend isn't installed.
+
+    Returns:
+        str: The name of the backend in use.
+    """
+    global JSON_BACKEND, json_loads
+    if name in (None, '', 'auto'):
+        name = 'orjson' if JSON_BACKENDS['orjson'] is not None else 'json'
+    if name not in JSON_BACKENDS:
+        raise ValueError(f"Unknown JSON backend: {name}. Options are {', '.join(JSON_BACKENDS)} or auto")
+    if JSON_BACKENDS[name] is None:
+        logger.warning(f"WARNING: JSON backend {name} is not installed, falling back to json")
+        name = 'json'
+    JSON_BACKEND = name
+    json_loads = JSON_BACKENDS[name]
+    return name
+
+
+JSON_BACKEND = None
+json_loads = json.loads
+set_json_backend()
+
+
+def _decode(body, url):
+    """
+    Decodes a JSON response body with the selected backend, raising BattleNetAPIError if it isn't JSON
+    """
+    try:
+        return json_loads(body)
+    except ValueError as e:
+        raise BattleNetAPIError(f"Invalid JSON in the response from {url}: {e}") from e
+
 # Define a custom exception class for the API
 class BattleNetAPIError(Exception):
     """Base exception class for BattleNetAPI errors."""
@@ -22,121 +145,167 @@ class BattleNetAPINotFoundError(Exception):
     """
     pass
 
-class BattleNetAPI:
+class BattleNetAPIUnavailableError(BattleNetAPIError):
     """
-    A Python class to interact with the Blizzard Battle.net API.
-    This class handles authentication and provides methods to access
-    World of Warcraft game data and profile data.
+    Battle.net is considered unavailable and the request was not (re)tried.
+    Importers stop and keep their progress when they see it.
     """
+    pass
 
-    def __init__(self, client_id, client_secret, region='us'):
-        """
-        Initializes the BattleNetAPI client.
+class BattleNetAPICircuitOpenError(BattleNetAPIUnavailableError):
+    """Refused without contacting Battle.net because the circuit breaker is open."""
+    pass
+
+class BattleNetAPIRetryBudgetError(BattleNetAPIUnavailableError):
+    """A request needed a retry but the job's retry budget is spent."""
+    pass
 
+class CommoditiesSnapshot(object):
+    """
+    An hourly commodities snapshot as returned by BattleNetAPI.get_commodities_snapshot
+    """
+
+    def __init__(self, region, last_modified, data=None, origin=None, not_modified=False, response=None):
+        """
         Args:
-            client_id (str): Your Blizzard application client ID.
-            client_secret (str): Your Blizzard application client secret.
-            region (str, optional): The API region to use. Defaults to 'us'.
-                                    Other options include 'eu', 'kr', 'tw'.
+            region (str): Region the snapshot belongs to.
+            last_modified (str): The snapshot's Last-Modified header.
+            data (dict, optional): The decoded response. None when not_modified is set or when streaming.
+            origin (str, optional): SHA256 identifying the snapshot, derived from region and Last-Modified.
+            not_modified (bool, optional): True if the snapshot is unchanged since the requested date.
+            response (requests.Response, optional): Open streaming response consumed by iter_auctions.
         """
-        if not client_id or not client_secret:
-            raise ValueError("Client ID and Client Secret cannot be empty.")
-
-        self.client_id = client_id
-        self.client_secret = client_secret
         self.region = region
-        self.api_host = f"https://{self.region}.api.blizzard.com"
-        self.token_url = f"https://{self.region}.battle.net/oauth/token"
-        self.access_token = None
-        self.token_expiry = 0
+        self.last_modified = last_modified
+        self.data = data
+        self.origin = origin
+        self.not_modified = not_modified
+        self._response = response
 
-    def _get_access_token(self):
+    @property
+    def auctions(self):
+        if self._response is not None:
+            return list(self.iter_auctions())
+        return self.data['auctions'] if self.data else []
+
+    def close(self):
         """
-        Retrieves an OAuth access token from the Blizzard API.
-        It caches the token and renews it only when it has expired.
-        
-        Raises:
-            BattleNetAPIError: If there's an issue obtaining the access token.
+        Releases the connection of a streamed snapshot that will not be iterated.
         """
-        # If we have a token and it hasn't expired, reuse it
-        if self.access_token and time.time() < self.token_expiry:
+        if self._response is not None:
+            self._response.close()
+            self._response = None
+
+    def iter_auctions(self):
+        """
+        Yields each auction of the snapshot.
+
+        For streamed snapshots the body is parsed incrementally as it is downloaded,
+        so only one auction is materialized at a time. A streamed snapshot can only
+        be iterated once; if it has no Last-Modified header, `origin` is set from a
+        hash of the body once iteration completes.
+        """
+        if self._response is None:
+            yield from self.auctions
             return
 
+        response, self._response = self._response, None
+        body_hash = hashlib.sha256() if self.origin is None else None
+
+        def chunks():
+            for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                if body_hash is not None:
+                    body_hash.update(chunk)
+                yield chunk
+
         try:
-            data = {'grant_type': 'client_credentials'}
-            response = requests.post(self.token_url, data=data, auth=(self.client_id, self.client_secret))
-            response.raise_for_status()  # Raise an exception for bad status codes
+            yield from iter_json_array(chunks(), 'auctions')
+        finally:
+            response.close()
+        if body_hash is not None:
+            self.origin = body_hash.hexdigest()
 
-            token_data = response.json()
-            self.access_token = token_data['access_token']
-            # Set expiry time with a small buffer
-            self.token_expiry = time.time() + token_data['expires_in'] - 180
 
-        except requests.exceptions.RequestException as e:
-            # Wrap the original exception in our custom exception
-            raise BattleNetAPIError(f"Error obtaining access token: {e}") from e
+def iter_json_array(chunks, key):
+    """
+    Incrementally parses the array stored under `key` in a JSON document,
+    yielding its elements one at a time.
 
-    def _make_request(self, endpoint, namespace, params=None):
-        """
-        A helper function to make authenticated requests to the API.
+    Only the elements of the array are decoded; the rest of the document is
+    skipped. At most one chunk plus one partially received element is held in
+    memory. Elements are decoded with the json module's raw_decode, which finds
+    where each one ends, so the selected JSON backend (e.g. orjson) is not used.
 
-        Args:
-            endpoint (str): The API endpoint to request (e.g., '/data/wow/realm/index').
-            namespace (str): The required namespace for the endpoint.
-            params (dict, optional): A dictionary of query parameters. Defaults to None.
+    Args:
+        chunks (iterable): Byte chunks of a UTF-8 encoded JSON document.
+        key (str): Name of the array member to yield.
 
-        Returns:
-            dict: The JSON response from the API.
-            
-        Raises:
-            BattleNetAPIError: If the request fails due to authentication, network issues, or an API error.
-        """
-        self._get_access_token()
-        if not self.access_token:
-            # This case is now more theoretical since _get_access_token will raise an exception if it fails.
-            # However, it's good practice to keep it as a safeguard.
-            raise BattleNetAPIError("Cannot make request: No valid access token and failed to retrieve a new one.")
+    Raises:
+        BattleNetAPIError: If the document ends before the array is complete.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    array_start = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+    chunks = iter(chunks)
+    buffer = ''
+    pos = 0
+    in_array = False
 
-        endpoint = endpoint.lower() #Battlenet requires lowercase
-        url = f"{self.api_host}{endpoint}"
-        headers = {
-            'Authorization': f'Bearer {self.access_token}'
-        }
-        
-        # Add the namespace to the parameters
-        if params is None:
-            params = {}
-        params['namespace'] = namespace
-        params['locale'] = params.get('locale', 'en_US') # Default locale
+    while True:
+        if not in_array:
+            match = array_start.search(buffer)
+            if match:
+                in_array = True
+                pos = match.end()
+            else:
+                # Keep a tail in case the key is split across chunks
+                buffer = buffer[-(len(key) + 16):]
+        if in_array:
+            while True:
+                while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                    pos += 1
+                if pos == len(buffer):
+                    break
+                if buffer[pos] == ']':
+                    return
+                try:
+                    item, end = decoder.raw_decode(buffer, pos)
+                except ValueError:
+                    break # Element continues in the next chunk
+                if end == len(buffer):
+                    break # A number may continue in the next chunk; the array's ] or , ends it
+                pos = end
+                yield item
+            buffer = buffer[pos:]
+            pos = 0
 
-        last_exception = None #Track exceptions in case we deal with backoff
-        for attempt in range(MAX_RETRIES):
+        chunk = next(chunks, None)
+        if chunk is None:
+            raise BattleNetAPIError(f"Response ended before the '{key}' array was complete")
+        buffer += utf8.decode(chunk)
 
-            try:
-                response = requests.get(url, headers=headers, params=params)
-                response.raise_for_status()
-                return response.json()
-            except requests.exceptions.HTTPError as e:
-                if e.response.status_code in RETRY_STATUS_CODES: 
-                    last_exception = e
-                    if attempt < MAX_RETRIES - 1:
-                        wait_time = BASE_BACKOFF_SECONDS * (2 ** attempt)
-                        jitter = random.uniform(0, wait_time * 0.1)
-                        logger.warning(f"INFO: Received status {e.response.status_code}. Retrying in {wait_time + jitter:.2f} seconds... (Attempt {attempt + 1}/{MAX_RETRIES})")
-                        time.sleep(wait_time + jitter) # Sleep briefly
-                        continue
-                    else:
-                        logger.error(f"ERROR: Final attempt failed with status {e.response.status_code}.")
-                        break
-                elif e.response.status_code in NOT_FOUND_STATUS_CODES:
-                    raise BattleNetAPINotFoundError(f"HTTP Error: Not Found: {e}")
-                else:
-                    # Include more context in the raised exception
-                    error_message = f"HTTP Error for {url}: {e.response.status_code} - {e.response.text}"
-                    raise BattleNetAPIError(error_message) from e
 
-            except requests.exceptions.RequestException as e:
-                raise BattleNetAPIError(f"Request failed for {url}: {e}") from e
+def _bulk_getters(resource, media):
+    """
+    Resolves the getter names get_many calls for a resource.
+    """
+    if resource not in BULK_GETTERS or (media and f"{resource}_media" not in BULK_GETTERS):
+        raise ValueError(f"get_many does not support resource '{resource}'{' with media' if media else ''}")
+    getters = [BULK_GETTERS[resource]]
+    if media:
+        getters.append(BULK_GETTERS[f"{resource}_media"])
+    return getters
+
+
+class BattleNetEndpoints(object):
+    """
+    Endpoint definitions shared by BattleNetAPI and AsyncBattleNetAPI.
+
+    Every method builds an endpoint and namespace and hands them to
+    self._make_request, so the synchronous client returns the decoded JSON
+    while the asynchronous client returns an awaitable of the same.
+    Subclasses must provide `region` and `_make_request`.
+    """
 
     # --- World of Warcraft Game Data APIs ---
 
@@ -306,3 +475,721 @@ class BattleNetAPI:
         endpoint = f'/data/wow/media/item/{id}'
         return self._make_request(endpoint, namespace)
 
+
+class BattleNetAPI(BattleNetEndpoints):
+    """
+    A Python class to interact with the Blizzard Battle.net API.
+    This class handles authentication and provides methods to access
+    World of Warcraft game data and profile data.
+    """
+
+    def __init__(self, client_id, client_secret, region='us', pool_size=DEFAULT_POOL_SIZE,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT,
+                 rate_limiter=None, state_store=None, http_cache=None, transport=None,
+                 api_host=None, token_url=None, telemetry_callback=None, circuit_breaker=None,
+                 retry_budget=None):
+        """
+        Initializes the BattleNetAPI client.
+
+        Args:
+            client_id (str): Your Blizzard application client ID.
+            client_secret (str): Your Blizzard application client secret.
+            region (str, optional): The API region to use. Defaults to 'us'.
+                                    Other options include 'eu', 'kr', 'tw'.
+            pool_size (int, optional): Maximum number of keep-alive connections kept
+                                       open per host. Defaults to DEFAULT_POOL_SIZE.
+            connect_timeout (float, optional): Seconds to wait for a connection to be established.
+            read_timeout (float, optional): Seconds to wait between bytes of a response.
+            rate_limiter (RateLimiter, optional): Limiter every request must pass through.
+                                                  Defaults to one enforcing RATE_LIMITS.
+            state_store (optional): lib.sharedstate store holding the OAuth token and the default
+                                    rate limiter's buckets. Pass a file or cache store to share
+                                    the token and quota across processes.
+            http_cache (HTTPCache, optional): Persistent cache used to revalidate static namespace
+                                              responses with If-None-Match/If-Modified-Since.
+            transport (optional): A lib.transport transport. Defaults to a LiveTransport with
+                                  pool_size connections; pass a recording or replaying
+                                  transport to capture or reproduce traffic.
+            api_host (str, optional): Overrides the API base url, e.g. for the stand-in server.
+            token_url (str, optional): Overrides the OAuth token url.
+            telemetry_callback (callable, optional): Called as callback(template, event) for
+                                                     every request and cache hit (see stats()).
+            circuit_breaker (CircuitBreaker, optional): Breaker that fails requests fast while
+                                                        Battle.net is degraded. Defaults to one
+                                                        using the CIRCUIT_* settings, kept in
+                                                        state_store.
+            retry_budget (int or RetryBudget, optional): Total retries this client may make,
+                                                         e.g. over one import job. Unlimited
+                                                         by default.
+        """
+        if not client_id or not client_secret:
+            raise ValueError("Client ID and Client Secret cannot be empty.")
+
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.region = region
+        self.api_host = api_host or f"https://{self.region}.api.blizzard.com"
+        self.token_url = token_url or f"https://{self.region}.battle.net/oauth/token"
+        self.access_token = None
+        self.token_expiry = 0
+        self._token_lock = threading.Lock()
+        self.token_store = state_store if state_store is not None else sharedstate.default_store
+        self.token_key = f"battlenet-token:{client_id}:{region}"
+        self.timeout = (connect_timeout, read_timeout)
+        self.pool_size = pool_size
+        self.transport = transport if transport is not None else LiveTransport(pool_size=pool_size)
+        if rate_limiter is None:
+            rate_limiter = RateLimiter(RATE_LIMITS, store=state_store, key=f"battlenet-ratelimit:{client_id}:{region}")
+        self.rate_limiter = rate_limiter
+        if circuit_breaker is None:
+            circuit_breaker = CircuitBreaker(CIRCUIT_FAILURE_RATE, CIRCUIT_MIN_REQUESTS, CIRCUIT_WINDOW_SECONDS,
+                                             CIRCUIT_OPEN_SECONDS, store=state_store,
+                                             key=f"battlenet-circuit:{client_id}:{region}")
+        self.circuit_breaker = circuit_breaker
+        if not isinstance(retry_budget, RetryBudget):
+            retry_budget = RetryBudget(retry_budget)
+        self.retry_budget = retry_budget
+        self.http_cache = http_cache
+        self.telemetry = ClientTelemetry(callback=telemetry_callback)
+
+    def stats(self):
+        """
+        Returns a snapshot of per endpoint telemetry: request count, latency histogram,
+        response bytes, retries, 429/502 counts and cache hits.
+        """
+        return self.telemetry.stats()
+
+    def close(self):
+        """
+        Closes all pooled connections held by this client.
+        """
+        self.transport.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _get_access_token(self):
+        """
+        Retrieves an OAuth access token from the Blizzard API.
+        It caches the token and renews it only when it has expired.
+
+        Tokens are shared through the client's state store, keyed by client id and
+        region, so every client using the same store (other importers, other
+        processes) reuses one token. The store's lock is only held to read and
+        write the token, never during the token exchange itself.
+        
+        Raises:
+            BattleNetAPIError: If there's an issue obtaining the access token.
+        """
+        # If we have a token and it hasn't expired, reuse it
+        if self.access_token and time.time() < self.token_expiry:
+            return
+
+        # Concurrent callers (see AsyncBattleNetAPI) wait here for a single refresh
+        with self._token_lock:
+            if self.access_token and time.time() < self.token_expiry:
+                return
+
+            with self.token_store.locked(self.token_key) as shared_token:
+                # Another client may have refreshed it already
+                if shared_token.get('access_token') and time.time() < shared_token.get('expiry', 0):
+                    self.access_token = shared_token['access_token']
+                    self.token_expiry = shared_token['expiry']
+                    return
+
+            # The exchange happens outside the store's lock, which also guards rate limits and circuit
+            # breakers.  Processes refreshing at the same time each get a token; both are valid
+            try:
+                data = {'grant_type': 'client_credentials'}
+                response = self.transport.request('POST', self.token_url, data=data, auth=(self.client_id, self.client_secret), timeout=self.timeout)
+                response.raise_for_status()  # Raise an exception for bad status codes
+
+                token_data = response.json()
+                access_token = token_data['access_token']
+                # Set expiry time with a small buffer
+                token_expiry = time.time() + token_data['expires_in'] - 180
+
+            except requests.exceptions.RequestException as e:
+                # Wrap the original exception in our custom exception
+                raise BattleNetAPIError(f"Error obtaining access token: {e}") from e
+
+            with self.token_store.locked(self.token_key) as shared_token:
+                # Keep whichever token lasts longer
+                if token_expiry > shared_token.get('expiry', 0):
+                    shared_token['access_token'] = access_token
+                    shared_token['expiry'] = token_expiry
+                self.access_token = shared_token['access_token']
+                self.token_expiry = shared_token['expiry']
+
+    def _request(self, endpoint, namespace, params=None, headers=None, stream=False):
+        """
+        Makes an authenticated, rate limited GET request, retrying throttled and
+        bad gateway responses.
+
+        Every attempt first passes the circuit breaker, and every retry is paid for
+        from the retry budget, so a degraded Battle.net fails requests quickly
+        instead of sleeping through the full backoff schedule each time.
+
+        Args:
+            endpoint (str): The API endpoint to request (e.g., '/data/wow/realm/index').
+            namespace (str): The required namespace for the endpoint.
+            params (dict, optional): A dictionary of query parameters. Defaults to None.
+            headers (dict, optional): Extra request headers, e.g. conditional request validators.
+            stream (bool, optional): Defer downloading the body until it is accessed.
+
+        Returns:
+            requests.Response: A successful (2xx) or 304 Not Modified response.
+
+        Raises:
+            BattleNetAPIError: If the request fails due to authentication, network issues, or an API error.
+            BattleNetAPINotFoundError: If the resource does not exist.
+            BattleNetAPIUnavailableError: If the circuit breaker is open or the retry budget is spent.
+        """
+        self._get_access_token()
+        if not self.access_token:
+            # This case is now more theoretical since _get_access_token will raise an exception if it fails.
+            # However, it's good practice to keep it as a safeguard.
+            raise BattleNetAPIError("Cannot make request: No valid access token and failed to retrieve a new one.")
+
+        endpoint = endpoint.lower() #Battlenet requires lowercase
+        url = f"{self.api_host}{endpoint}"
+        template = _endpoint_template(endpoint)
+        request_headers = {
+            'Authorization': f'Bearer {self.access_token}'
+        }
+        if headers:
+            request_headers.update(headers)
+
+        # Add the namespace to the parameters
+        params = dict(params or {})
+        params['namespace'] = namespace
+        params['locale'] = params.get('locale', 'en_US') # Default locale
+
+        last_exception = None #Track exceptions in case we deal with backoff
+        for attempt in range(MAX_RETRIES):
+
+            wait = self.circuit_breaker.allow()
+            if wait:
+                raise BattleNetAPICircuitOpenError(f"Circuit open, not requesting {url}. Next probe in {wait:.1f} seconds")
+
+            self.rate_limiter.acquire()
+            started = time.perf_counter()
+            try:
+                response = self.transport.request('GET', url, headers=request_headers, params=params, timeout=self.timeout, stream=stream)
+            except requests.exceptions.RequestException as e:
+                self.telemetry.record_request(template, (time.perf_counter() - started) * 1000, retry=attempt > 0)
+                self.circuit_breaker.record_failure()
+                raise BattleNetAPIError(f"Request failed for {url}: {e}") from e
+
+            # Streamed bodies haven't been read yet, so fall back to the advertised length
+            response_bytes = int(response.headers.get('Content-Length') or 0) if stream else len(response.content)
+            self.telemetry.record_request(template, (time.perf_counter() - started) * 1000, status=response.status_code,
+                                          response_bytes=response_bytes, retry=attempt > 0)
+            if response.status_code in CIRCUIT_FAILURE_STATUS_CODES:
+                self.circuit_breaker.record_failure()
+            else:
+                self.circuit_breaker.record_success()
+            try:
+                response.raise_for_status()
+                return response
+            except requests.exceptions.HTTPError as e:
+                if e.response.status_code in RETRY_STATUS_CODES: 
+                    last_exception = e
+                    if attempt < MAX_RETRIES - 1:
+                        # Spend the budget before waiting, so an exhausted budget never sleeps
+                        if not self.retry_budget.spend():
+                            raise BattleNetAPIRetryBudgetError(
+                                f"Retry budget of {self.retry_budget.retries} exhausted, giving up on {url}: {e}"
+                            ) from e
+                        retry_after = _parse_retry_after(e.response.headers.get('Retry-After'))
+                        if retry_after is not None:
+                            # Pause every user of the quota; the next acquire() waits it out
+                            logger.warning(f"INFO: Received status {e.response.status_code}. Retrying after {retry_after:.2f} seconds... (Attempt {attempt + 1}/{MAX_RETRIES})")
+                            self.rate_limiter.penalize(retry_after)
+                            continue
+                        wait_time = BASE_BACKOFF_SECONDS * (2 ** attempt)
+                        jitter = random.uniform(0, wait_time * 0.1)
+                        logger.warning(f"INFO: Received status {e.response.status_code}. Retrying in {wait_time + jitter:.2f} seconds... (Attempt {attempt + 1}/{MAX_RETRIES})")
+                        time.sleep(wait_time + jitter) # Sleep briefly
+                        continue
+                    else:
+                        logger.error(f"ERROR: Final attempt failed with status {e.response.status_code}.")
+                        break
+                elif e.response.status_code in NOT_FOUND_STATUS_CODES:
+                    raise BattleNetAPINotFoundError(f"HTTP Error: Not Found: {e}")
+                else:
+                    # Include more context in the raised exception
+                    error_message = f"HTTP Error for {url}: {e.response.status_code} - {e.response.text}"
+                    raise BattleNetAPIError(error_message) from e
+
+        raise BattleNetAPIError(f"Request failed for {url} after {MAX_RETRIES} attempts: {last_exception}") from last_exception
+
+    def _make_request(self, endpoint, namespace, params=None):
+        """
+        A helper function to make authenticated requests to the API.
+
+        Args:
+            endpoint (str): The API endpoint to request (e.g., '/data/wow/realm/index').
+            namespace (str): The required namespace for the endpoint.
+            params (dict, optional): A dictionary of query parameters. Defaults to None.
+
+        Returns:
+            dict: The JSON response from the API.
+            
+        Raises:
+            BattleNetAPIError: If the request fails due to authentication, network issues, or an API error.
+        """
+        # Static data rarely changes, so revalidate a cached copy instead of downloading it again
+        cache_key = None
+        cache_entry = None
+        headers = {}
+        if self.http_cache is not None and namespace.startswith(CACHEABLE_NAMESPACE_PREFIXES):
+            cache_key = self.http_cache.make_key(endpoint.lower(), dict(params or {}, namespace=namespace))
+            cache_entry = self.http_cache.get(cache_key)
+            headers.update(self.http_cache.conditional_headers(cache_entry))
+
+        response = self._request(endpoint, namespace, params=params, headers=headers)
+        if response.status_code == NOT_MODIFIED_STATUS_CODE:
+            if cache_entry is None:
+                raise BattleNetAPIError(f"{endpoint} answered 304 Not Modified to a request with no cached copy")
+            logger.debug(f"DEBUG: {endpoint} not modified, serving from cache")
+            self.telemetry.record_cache_hit(_endpoint_template(endpoint.lower()))
+            return _decode(cache_entry[2], response.url)
+        data = _decode(response.content, response.url)
+        if cache_key is not None and ('ETag' in response.headers or 'Last-Modified' in response.headers):
+            self.http_cache.set(cache_key, response.headers.get('ETag'), response.headers.get('Last-Modified'), response.content)
+        return data
+
+    def search(self, document, params=None, page_size=SEARCH_PAGE_SIZE):
+        """
+        Iterates over every result of a search API query, fetching pages as needed.
+
+        Localized fields ({'en_US': ..., 'de_DE': ...}) are reduced to the client's
+        locale, so documents look like their non-search counterparts.
+
+        Args:
+            document (str): Search document, e.g. 'item', 'recipe' or 'media'.
+            params (dict, optional): Search filters, e.g. {'id': '[1,1000]', 'orderby': 'id'}.
+            page_size (int, optional): Documents per page, at most SEARCH_PAGE_SIZE.
+
+        Yields:
+            dict: The 'data' of each search result.
+        """
+        namespace = f'static-{self.region}'
+        endpoint = f'/data/wow/search/{document}'
+        page = 1
+        while True:
+            query = dict(params or {}, _page=page, _pageSize=page_size)
+            response = self._make_request(endpoint, namespace, query)
+            for result in response.get('results', []):
+                yield _delocalize(result['data'])
+            if page >= response.get('pageCount', 1):
+                return
+            page += 1
+
+    def search_by_ids(self, document, ids, params=None):
+        """
+        Retrieves many documents by id through the search API, one id range at a time.
+
+        Args:
+            document (str): Search document, e.g. 'item', 'recipe' or 'media'.
+            ids (iterable): Ids to retrieve.
+            params (dict, optional): Additional search filters.
+
+        Returns:
+            dict: Documents keyed by id. Ids the search did not return are missing.
+        """
+        wanted = set(ids)
+        found = {}
+        for low, high in _id_ranges(sorted(wanted), SEARCH_MAX_ID_GAP):
+            query = dict(params or {}, id=f'[{low},{high}]', orderby='id')
+            for data in self.search(document, query):
+                if data.get('id') in wanted:
+                    found[data['id']] = data
+        return found
+
+    def _search_many(self, resource, ids, media):
+        """
+        Fetches what it can of get_many's request through the search API.
+
+        Returns:
+            dict: get_many entries keyed by id. Ids the search could not supply are missing.
+        """
+        try:
+            documents = self.search_by_ids(SEARCH_DOCUMENTS[resource], ids)
+            if not media:
+                return documents
+
+            media_ids = {id: document.get('media', {}).get('id', id) for id, document in documents.items()}
+            media_documents = self.search_by_ids('media', media_ids.values(), params={'tags': resource})
+            return {
+                id: (document, media_documents[media_ids[id]])
+                for id, document in documents.items() if media_ids[id] in media_documents
+            }
+        except (BattleNetAPIError, BattleNetAPINotFoundError) as e:
+            logger.warning(f"WARNING: {resource} search failed, falling back to per id requests: {e}")
+            return {}
+
+    def get_many(self, resource, ids, media=False, max_workers=None, search=False):
+        """
+        Fetches a resource for many ids concurrently, under the client's rate limiter.
+
+        A failure for one id does not stop the others: its entry in the result
+        holds the BattleNetAPINotFoundError or BattleNetAPIError that was raised
+        instead of the data.
+
+        Args:
+            resource (str): A key of BULK_GETTERS, e.g. 'item' or 'recipe_media'.
+            ids (list): Ids to fetch.
+            media (bool, optional): Also fetch each id's media. Entries become
+                                    (data, media) tuples.
+            max_workers (int, optional): Concurrent requests. Defaults to the connection pool size.
+            search (bool, optional): For resources in SEARCH_DOCUMENTS, retrieve up to 1,000 ids
+                                     per request through the search API first, and only
+                                     request the ids it did not return one by one.
+
+        Returns:
+            list: One entry per id, in the same order as ids.
+        """
+        getters = [getattr(self, name) for name in _bulk_getters(resource, media)]
+        ids = list(ids)
+
+        found = {}
+        if search and resource in SEARCH_DOCUMENTS and ids:
+            found = self._search_many(resource, ids, media)
+            logger.debug(f"DEBUG: {resource} search returned {len(found)} of {len(ids)} ids")
+
+        def fetch(id):
+            if id in found:
+                return found[id]
+            try:
+                results = tuple(getter(id) for getter in getters)
+            except (BattleNetAPIError, BattleNetAPINotFoundError) as e:
+                return e
+            return results if media else results[0]
+
+        if not ids:
+            return []
+        with ThreadPoolExecutor(max_workers=max_workers or self.pool_size, thread_name_prefix='battlenet') as executor:
+            return list(executor.map(fetch, ids))
+
+    def get_commodities_snapshot(self, if_modified_since=None, stream=False):
+        """
+        Retrieves the hourly commodities snapshot along with its Last-Modified header.
+
+        When if_modified_since is the Last-Modified value of a snapshot that was
+        already imported, an unchanged snapshot is detected from the response
+        headers and its body is never downloaded.
+
+        Args:
+            if_modified_since (str, optional): Last-Modified header of the previous snapshot.
+            stream (bool, optional): Leave the body on the wire and parse it incrementally
+                                     through CommoditiesSnapshot.iter_auctions.
+
+        Returns:
+            CommoditiesSnapshot: The snapshot. `not_modified` is set and `data` is None
+                                 when it has not changed since if_modified_since.
+        """
+        namespace = f'dynamic-{self.region}'
+        endpoint = '/data/wow/auctions/commodities'
+        headers = {'If-Modified-Since': if_modified_since} if if_modified_since else None
+
+        response = self._request(endpoint, namespace, headers=headers, stream=True)
+        last_modified = response.headers.get('Last-Modified')
+
+        # Servers may ignore If-Modified-Since, so compare the header ourselves before reading the body
+        if response.status_code == NOT_MODIFIED_STATUS_CODE or (if_modified_since and last_modified == if_modified_since):
+            response.close()
+            self.telemetry.record_cache_hit(endpoint)
+            return CommoditiesSnapshot(self.region, last_modified or if_modified_since, not_modified=True)
+
+        origin = None
+        if last_modified:
+            origin = hashlib.sha256(f"{self.region}:{last_modified}".encode('utf-8')).hexdigest()
+        if stream:
+            return CommoditiesSnapshot(self.region, last_modified, origin=origin, response=response)
+
+        body = response.content
+        if origin is None:
+            origin = hashlib.sha256(body).hexdigest()
+        return CommoditiesSnapshot(self.region, last_modified, data=_decode(body, response.url), origin=origin)
+
+_LOCALE_KEY = re.compile(r'^[a-z]{2}_[A-Z]{2}$')
+
+
+def _delocalize(value, locale='en_US'):
+    """
+    Replaces localized mappings ({'en_US': 'Linen Cloth', 'de_DE': 'Leinenstoff', ...})
+    found anywhere in a search document with their value for locale.
+    """
+    if isinstance(value, dict):
+        if value and locale in value and all(_LOCALE_KEY.match(key) for key in value):
+            return value[locale]
+        return {key: _delocalize(item, locale) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_delocalize(item, locale) for item in value]
+    return value
+
+
+def _id_ranges(sorted_ids, max_gap, max_size=SEARCH_PAGE_SIZE):
+    """
+    Groups sorted ids into inclusive (low, high) ranges, starting a new range
+    whenever the next id is more than max_gap away or the range holds max_size ids.
+    """
+    ranges = []
+    low = previous = None
+    size = 0
+    for id in sorted_ids:
+        if low is None:
+            low, size = id, 0
+        elif id - previous > max_gap or size >= max_size:
+            ranges.append((low, previous))
+            low, size = id, 0
+        previous = id
+        size += 1
+    if low is not None:
+        ranges.append((low, previous))
+    return ranges
+
+
+# Path segments replaced by placeholders so telemetry groups requests by endpoint rather than by url
+_TEMPLATE_PATTERNS = [
+    (re.compile(r'^(/profile/wow/character|/data/wow/guild)/[^/]+/[^/]+'), r'\1/{realm}/{name}'),
+    (re.compile(r'/\d+(?=/|$)'), '/{id}'),
+]
+
+
+@functools.lru_cache(maxsize=4096)
+def _endpoint_template(endpoint):
+    """
+    Turns an endpoint into its template, e.g. '/data/wow/item/19019' into '/data/wow/item/{id}'.
+    """
+    for pattern, replacement in _TEMPLATE_PATTERNS:
+        endpoint = pattern.sub(replacement, endpoint)
+    return endpoint
+
+
+def _parse_retry_after(value):
+    """
+    Parses a Retry-After header, given either as seconds or as an HTTP date.
+
+    Returns:
+        float: Seconds to wait, or None if the header is missing or malformed.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class AsyncBattleNetAPI(BattleNetEndpoints):
+    """
+    asyncio flavour of BattleNetAPI with bounded fan-out.
+
+    Every get_* and search method of BattleNetAPI is available as a coroutine
+    (search as an async generator), with the same arguments, except that
+    get_many is bounded by max_concurrency rather than max_workers. Requests are
+    dispatched to the pooled session of an underlying BattleNetAPI on a worker
+    thread, so token caching, retries and BattleNetAPINotFoundError behave exactly
+    as they do for the synchronous client. At most `max_concurrency` requests are
+    in flight at any time.
+
+    Example:
+        client = AsyncBattleNetAPI(client_id, client_secret)
+        summary, media = await asyncio.gather(
+            client.get_character_summary(realm, name),
+            client.get_character_media(realm, name),
+        )
+    """
+
+    def __init__(self, client_id, client_secret, region='us', max_concurrency=DEFAULT_MAX_CONCURRENCY, **kwargs):
+        """
+        Initializes the AsyncBattleNetAPI client.
+
+        Args:
+            client_id (str): Your Blizzard application client ID.
+            client_secret (str): Your Blizzard application client secret.
+            region (str, optional): The API region to use. Defaults to 'us'.
+            max_concurrency (int, optional): Maximum number of requests in flight.
+            **kwargs: Passed through to BattleNetAPI (pool_size, timeouts).
+        """
+        kwargs.setdefault('pool_size', max_concurrency)
+        client = BattleNetAPI(client_id, client_secret, region=region, **kwargs)
+        self._init_from_client(client, max_concurrency)
+        self._owns_client = True
+
+    @classmethod
+    def from_client(cls, client, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        """
+        Wraps an existing BattleNetAPI, sharing its connection pool and token.
+
+        Args:
+            client (BattleNetAPI): The synchronous client to dispatch requests to.
+            max_concurrency (int, optional): Maximum number of requests in flight.
+        """
+        instance = cls.__new__(cls)
+        instance._init_from_client(client, max_concurrency)
+        instance._owns_client = False
+        return instance
+
+    def _init_from_client(self, client, max_concurrency):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1.")
+        self.client = client
+        self.region = client.region
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='battlenet')
+        self._semaphore = None
+        self._semaphore_loop = None
+
+    def _get_semaphore(self):
+        """
+        asyncio primitives are bound to the loop they are first used on, so a fresh
+        semaphore is created whenever the client is reused from a new event loop
+        (e.g. successive asyncio.run calls from an importer).
+        """
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    async def _make_request(self, endpoint, namespace, params=None):
+        """
+        Awaitable counterpart of BattleNetAPI._make_request.
+
+        Raises:
+            BattleNetAPIError: If the request fails.
+            BattleNetAPINotFoundError: If the resource does not exist.
+        """
+        return await self._run(self.client._make_request, endpoint, namespace, params)
+
+    async def _run(self, function, *args, **kwargs):
+        """
+        Calls a blocking method of the underlying client on a worker thread, counting
+        against max_concurrency
+        """
+        async with self._get_semaphore():
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(function, *args, **kwargs))
+
+    async def search(self, document, params=None, page_size=SEARCH_PAGE_SIZE):
+        """
+        Awaitable counterpart of BattleNetAPI.search, an async generator.
+
+        Yields:
+            dict: The 'data' of each search result.
+        """
+        namespace = f'static-{self.region}'
+        endpoint = f'/data/wow/search/{document}'
+        page = 1
+        while True:
+            query = dict(params or {}, _page=page, _pageSize=page_size)
+            response = await self._make_request(endpoint, namespace, query)
+            for result in response.get('results', []):
+                yield _delocalize(result['data'])
+            if page >= response.get('pageCount', 1):
+                return
+            page += 1
+
+    async def search_by_ids(self, document, ids, params=None):
+        """
+        Awaitable counterpart of BattleNetAPI.search_by_ids.  Id ranges are searched concurrently.
+
+        Returns:
+            dict: Documents keyed by id. Ids the search did not return are missing.
+        """
+        wanted = set(ids)
+
+        async def search_range(low, high):
+            query = dict(params or {}, id=f'[{low},{high}]', orderby='id')
+            return [data async for data in self.search(document, query) if data.get('id') in wanted]
+
+        found = {}
+        ranges = _id_ranges(sorted(wanted), SEARCH_MAX_ID_GAP)
+        for documents in await asyncio.gather(*[search_range(low, high) for low, high in ranges]):
+            found.update((data['id'], data) for data in documents)
+        return found
+
+    async def _search_many(self, resource, ids, media):
+        """
+        Awaitable counterpart of BattleNetAPI._search_many
+        """
+        try:
+            documents = await self.search_by_ids(SEARCH_DOCUMENTS[resource], ids)
+            if not media:
+                return documents
+
+            media_ids = {id: document.get('media', {}).get('id', id) for id, document in documents.items()}
+            media_documents = await self.search_by_ids('media', media_ids.values(), params={'tags': resource})
+            return {
+                id: (document, media_documents[media_ids[id]])
+                for id, document in documents.items() if media_ids[id] in media_documents
+            }
+        except (BattleNetAPIError, BattleNetAPINotFoundError) as e:
+            logger.warning(f"WARNING: {resource} search failed, falling back to per id requests: {e}")
+            return {}
+
+    async def get_many(self, resource, ids, media=False, search=False):
+        """
+        Awaitable counterpart of BattleNetAPI.get_many, bounded by max_concurrency
+        instead of max_workers.
+
+        Returns:
+            list: One entry per id, in order: the data (or (data, media) tuple),
+                  or the exception raised for that id.
+        """
+        getters = [getattr(self, name) for name in _bulk_getters(resource, media)]
+        ids = list(ids)
+
+        found = {}
+        if search and resource in SEARCH_DOCUMENTS and ids:
+            found = await self._search_many(resource, ids, media)
+            logger.debug(f"DEBUG: {resource} search returned {len(found)} of {len(ids)} ids")
+
+        async def fetch(id):
+            if id in found:
+                return found[id]
+            try:
+                results = tuple(await asyncio.gather(*[getter(id) for getter in getters]))
+            except (BattleNetAPIError, BattleNetAPINotFoundError) as e:
+                return e
+            return results if media else results[0]
+
+        return await asyncio.gather(*[fetch(id) for id in ids])
+
+    async def get_commodities_snapshot(self, if_modified_since=None, stream=False):
+        """
+        Awaitable counterpart of BattleNetAPI.get_commodities_snapshot.
+
+        With stream, only the headers are awaited.  Iterating the snapshot's
+        auctions reads the body and blocks, so do it off the event loop.
+
+        Returns:
+            CommoditiesSnapshot: The snapshot, see BattleNetAPI.get_commodities_snapshot.
+        """
+        return await self._run(self.client.get_commodities_snapshot, if_modified_since=if_modified_since, stream=stream)
+
+    def stats(self):
+        """
+        Returns the underlying client's telemetry snapshot (see BattleNetAPI.stats).
+        """
+        return self.client.stats()
+
+    def close(self):
+        """
+        Shuts down the worker threads. The underlying client's connections are only
+        closed if this instance created it; a client passed to from_client stays usable.
+        """
+        self._executor.shutdown(wait=True)
+        if self._owns_client:
+            self.client.close()
@@ -0,0 +1,112 @@
+import numpy as np
+
+# Candle intervals, in seconds
+INTERVALS = {
+    '1h': 3600,
+    '1d': 86400,
+    '1w': 7 * 86400,
+}
+
+# Weeks start on Monday, 00:00 UTC.  The Unix epoch was a Thursday
+WEEK_OFFSET = 4 * 86400
+
+
+def bucket_starts(times, interval):
+    """
+    Start of the interval each time falls in.
+
+    Args:
+        times (array-like): Unix timestamps, in seconds.
+        interval (str): One of INTERVALS.
+
+    Returns:
+        numpy.ndarray: Unix timestamps (int64) of the interval starts.
+    """
+    if interval not in INTERVALS:
+        raise ValueError(f"Unknown candle interval '{interval}'.  Expected one of {', '.join(INTERVALS)}")
+    seconds = INTERVALS[interval]
+    offset = WEEK_OFFSET if interval == '1w' else 0
+    times = np.asarray(times, dtype=np.int64)
+    return (times - offset) // seconds * seconds + offset
+
+
+class Candles(object):
+    """
+    Open/high/low/close market price candles of many items, as parallel int64 columns.
+
+    A candle summarizes every snapshot of an item within one interval: the
+    market price of its first (open) and last (close) snapshot, the highest
+    and lowest market price, the estimated units sold (volume), the units
+    listed at close (quantity) and the number of snapshots it covers.
+
+    Candles of the same item and start merge into one, so candles can be
+    built incrementally, one snapshot at a time, with the same results as
+    building them from the whole history at once.
+    """
+
+    COLUMNS = ('item_id', 'start', 'open', 'high', 'low', 'close', 'volume', 'quantity', 'snapshots')
+
+    def __init__(self, **columns):
+        for column in self.COLUMNS:
+            setattr(self, column, np.asarray(columns[column], dtype=np.int64))
+
+    def __len__(self):
+        return len(self.item_id)
+
+    @classmethod
+    def empty(cls):
+        return cls(**{column: np.empty(0, dtype=np.int64) for column in cls.COLUMNS})
+
+    @classmethod
+    def from_observations(cls, item_id, time, price, quantity, volume, interval):
+        """
+        Resamples snapshots of item prices into candles.
+
+        Args:
+            item_id, time, price, quantity (array-like): One observation per item and snapshot: the item, the
+                         snapshot's Unix timestamp, the market price and the listed quantity.
+            volume (array-like): Estimated units sold since the previous snapshot.  NaN counts as 0.
+            interval (str): One of INTERVALS.
+        """
+        time = np.asarray(time, dtype=np.int64)
+        price = np.asarray(price, dtype=np.int64)
+        volume = np.nan_to_num(np.asarray(volume, dtype=np.float64)).astype(np.int64)
+        candles = cls(
+            item_id=item_id, start=bucket_starts(time, interval),
+            open=price, high=price, low=price, close=price,
+            volume=volume, quantity=quantity, snapshots=np.ones(len(time), dtype=np.int64)
+        )
+        return candles._reduce(time)
+
+    def merge(self, later):
+        """
+        Merges candles built from later snapshots into these ones.
+
+        Returns:
+            Candles: One candle per item and start of either.
+        """
+        combined = Candles(**{column: np.concatenate((getattr(self, column), getattr(later, column))) for column in self.COLUMNS})
+        return combined._reduce(np.repeat([0, 1], [len(self), len(later)]))
+
+    def _reduce(self, sequence):
+        """
+        Combines candles sharing an item and start, in the order of sequence
+        """
+        if not len(self):
+            return self
+        order = np.lexsort((sequence, self.start, self.item_id))
+        item_id = self.item_id[order]
+        start = self.start[order]
+        first = np.flatnonzero(np.concatenate(([True], (item_id[1:] != item_id[:-1]) | (start[1:] != start[:-1]))))
+        last = np.append(first[1:], len(order)) - 1
+        return Candles(
+            item_id=item_id[first],
+            start=start[first],
+            open=self.open[order][first],
+            high=np.maximum.reduceat(self.high[order], first),
+            low=np.minimum.reduceat(self.low[order], first),
+            close=self.close[order][last],
+            volume=np.add.reduceat(self.volume[order], first),
+            quantity=self.quantity[order][last],
+            snapshots=np.add.reduceat(self.snapshots[order], first),
+        )
@@ -0,0 +1,185 @@
+import logging
+import threading
+import time
+from lib import sharedstate
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker(object):
+    """
+    Circuit breaker that stops requests to an upstream that is failing.
+
+    Outcomes are counted in one second buckets over a sliding window. Once the
+    window holds at least min_requests outcomes and the failure rate reaches
+    failure_rate, the circuit opens and requests are refused without being
+    sent. After open_seconds it becomes half-open and lets up to
+    half_open_probes requests through: one success closes it again, a failure
+    reopens it for another open_seconds.
+
+    State lives in a shared state store, so breakers in other threads or
+    processes that use the same store and key trip together.
+    """
+
+    def __init__(self, failure_rate=0.5, min_requests=20, window_seconds=60, open_seconds=30,
+                 half_open_probes=1, store=None, key='circuitbreaker'):
+        """
+        Args:
+            failure_rate (float, optional): Fraction of failed requests that opens the circuit.
+            min_requests (int, optional): Outcomes needed in the window before the rate is considered.
+            window_seconds (int, optional): Length of the sliding window.
+            open_seconds (float, optional): Seconds the circuit stays open before probing.
+            half_open_probes (int, optional): Concurrent probe requests allowed while half-open.
+            store (optional): A lib.sharedstate store. Defaults to the process wide memory store.
+            key (str, optional): Name of the circuit inside the store.
+        """
+        if not 0 < failure_rate <= 1:
+            raise ValueError("failure_rate must be in (0, 1].")
+        self.failure_rate = failure_rate
+        self.min_requests = max(1, int(min_requests))
+        self.window_seconds = max(1, int(window_seconds))
+        self.open_seconds = float(open_seconds)
+        self.half_open_probes = max(1, int(half_open_probes))
+        self.store = store if store is not None else sharedstate.default_store
+        self.key = key
+
+    def _trim(self, state, now):
+        """
+        Drops buckets that fell out of the window. Returns (requests, failures) over the window.
+        """
+        oldest = int(now) - self.window_seconds
+        window = {second: counts for second, counts in state.get('window', {}).items() if int(second) > oldest}
+        state['window'] = window
+        requests = sum(counts[0] for counts in window.values())
+        failures = sum(counts[1] for counts in window.values())
+        return requests, failures
+
+    def _open(self, state, now):
+        state['state'] = OPEN
+        state['opened_at'] = now
+        state['window'] = {}
+        state['probes'] = []
+
+    @property
+    def state(self):
+        with self.store.locked(self.key) as state:
+            return state.get('state', CLOSED)
+
+    def allow(self):
+        """
+        Checks whether a request may be sent. While half-open, an allowed request
+        is a probe and its outcome must be recorded.
+
+        Returns:
+            float: 0 if the request may proceed, otherwise the number of seconds
+                   until the circuit will let a probe through.
+        """
+        with self.store.locked(self.key) as state:
+            current = state.get('state', CLOSED)
+            if current == CLOSED:
+                return 0
+
+            now = time.time()
+            if current == OPEN:
+                remaining = state.get('opened_at', 0) + self.open_seconds - now
+                if remaining > 0:
+                    return remaining
+                logger.info(f"INFO: Circuit {self.key} half-open, probing")
+                state['state'] = HALF_OPEN
+                state['probes'] = []
+
+            # Forget probes that never reported back, e.g. because their worker died
+            probes = [started for started in state.get('probes', []) if now - started < self.open_seconds]
+            if len(probes) >= self.half_open_probes:
+                state['probes'] = probes
+                return min(probes) + self.open_seconds - now
+            probes.append(now)
+            state['probes'] = probes
+            return 0
+
+    def record_success(self):
+        with self.store.locked(self.key) as state:
+            if state.get('state', CLOSED) != CLOSED:
+                logger.info(f"INFO: Circuit {self.key} closed after a successful probe")
+                state['state'] = CLOSED
+                state['window'] = {}
+                state['probes'] = []
+                return
+
+            now = time.time()
+            self._trim(state, now)
+            counts = state['window'].setdefault(str(int(now)), [0, 0])
+            counts[0] += 1
+
+    def record_failure(self):
+        with self.store.locked(self.key) as state:
+            now = time.time()
+            current = state.get('state', CLOSED)
+            if current == HALF_OPEN:
+                logger.warning(f"WARNING: Circuit {self.key} probe failed, reopening for {self.open_seconds:g} seconds")
+                self._open(state, now)
+                return
+            if current == OPEN:
+                return
+
+            self._trim(state, now)
+            counts = state['window'].setdefault(str(int(now)), [0, 0])
+            counts[0] += 1
+            counts[1] += 1
+            requests, failures = self._trim(state, now)
+            if requests >= self.min_requests and failures / requests >= self.failure_rate:
+                logger.warning(f"WARNING: Circuit {self.key} opened: {failures}/{requests} requests failed "
+                               f"in the last {self.window_seconds} seconds")
+                self._open(state, now)
+
+    def reset(self):
+        with self.store.locked(self.key) as state:
+            state['state'] = CLOSED
+            state['window'] = {}
+            state['probes'] = []
+
+
+class RetryBudget(object):
+    """
+    Caps the total number of retries a job may make, across every request and thread.
+
+    Per request retries alone let a degraded upstream stretch a job by the full
+    backoff schedule for every call; with a budget, the job gives up once it has
+    spent its retries.
+    """
+
+    def __init__(self, retries):
+        """
+        Args:
+            retries (int): Retries available. None for an unlimited budget.
+        """
+        self.retries = retries
+        self.spent = 0
+        self._lock = threading.Lock()
+
+    @property
+    def remaining(self):
+        if self.retries is None:
+            return None
+        return max(0, self.retries - self.spent)
+
+    def spend(self):
+        """
+        Takes one retry from the budget.
+
+        Returns:
+            bool: True if the retry may be made, False if the budget is exhausted.
+        """
+        with self._lock:
+            if self.retries is not None and self.spent >= self.retries:
+                return False
+            self.spent += 1
+            return True
+
+    def reset(self):
+        with self._lock:
+            self.spent = 0
@@ -0,0 +1,118 @@
+import numpy as np
+
+
+def dbscan_1d(values, eps, min_samples=5):
+    """
+    DBSCAN for one dimensional data, in O(n log n).
+
+    Produces the same labels as sklearn.cluster.DBSCAN(eps=eps, min_samples=min_samples)
+    fitted on values.reshape(-1, 1): clusters are numbered in the order sklearn
+    discovers them and noise is labelled -1.
+
+    Args:
+        values (array-like): The samples.
+        eps (float): Maximum distance between two samples for them to be neighbours.
+        min_samples (int, optional): Neighbourhood size (the sample included) that makes a core sample.
+
+    Returns:
+        numpy.ndarray: Cluster label of each sample, in input order.
+    """
+    values = np.asarray(values)
+    return segmented_dbscan_1d(values, [len(values)], eps, min_samples)
+
+
+def segmented_dbscan_1d(values, counts, eps, min_samples=5):
+    """
+    Runs dbscan_1d independently on many segments at once.
+
+    Segments are contiguous runs of values, e.g. the listings of each item
+    in an ItemGroups. Every segment is labelled as if it had been clustered
+    on its own, so labels restart at 0 in each segment.
+
+    In one dimension, neighbourhoods are intervals of the sorted samples:
+    a sample is core when enough of its sorted neighbours lie within eps,
+    consecutive core samples closer than eps share a cluster, and a border
+    sample joins the earliest discovered cluster with a core sample within
+    eps of it. Everything is computed with vectorized passes over all
+    segments together.
+
+    Args:
+        values (array-like): Samples of every segment, one segment after the other.
+        counts (array-like): Length of each segment.
+        eps (float or array-like): Neighbourhood radius, shared or one per segment.
+        min_samples (int, optional): Neighbourhood size (the sample included) that makes a core sample.
+
+    Returns:
+        numpy.ndarray: Cluster label of each sample within its segment, in input order.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    counts = np.asarray(counts, dtype=np.intp)
+    n = len(values)
+    if counts.sum() != n:
+        raise ValueError("Segment counts must add up to the number of values.")
+    if min_samples < 1:
+        raise ValueError("min_samples must be at least 1.")
+    labels = np.full(n, -1, dtype=np.int64)
+    if not n:
+        return labels
+
+    segment = np.repeat(np.arange(len(counts)), counts)
+    eps = np.broadcast_to(np.asarray(eps, dtype=np.float64), (len(counts),))[segment]
+    # Position of each value within its segment, which is the order sklearn visits samples in
+    offset = np.arange(n) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    # Sort by segment, then value.  lexsort is stable, so equal values keep their input order
+    order = np.lexsort((values, segment))
+    x = values[order]
+    segment = segment[order]
+    eps = eps[order]
+    offset = offset[order]
+
+    # A sample has at least k neighbours on one side iff its k-th sorted neighbour on that side is within eps
+    neighbours = np.ones(n, dtype=np.int64)
+    for k in range(1, min(min_samples, n)):
+        close = (segment[k:] == segment[:-k]) & (x[k:] - x[:-k] <= eps[k:])
+        neighbours[k:] += close # k-th neighbour to the left
+        neighbours[:-k] += close # k-th neighbour to the right
+    core = neighbours >= min_samples
+    if not core.any():
+        return labels
+
+    # Clusters are runs of consecutive core samples no further than eps apart
+    core_index = np.flatnonzero(core)
+    core_x = x[core_index]
+    core_segment = segment[core_index]
+    linked = (core_segment[1:] == core_segment[:-1]) & (core_x[1:] - core_x[:-1] <= eps[core_index[1:]])
+    run = np.concatenate(([0], np.cumsum(~linked)))
+    run_starts = np.flatnonzero(np.concatenate(([True], ~linked)))
+
+    # sklearn starts a new cluster at the first unlabelled core sample in input order,
+    # so clusters are numbered by their earliest core sample within the segment
+    first_seen = np.minimum.reduceat(offset[core_index], run_starts)
+    run_segment = core_segment[run_starts]
+    run_order = np.lexsort((first_seen, run_segment))
+    segment_first = np.flatnonzero(np.concatenate(([True], run_segment[run_order][1:] != run_segment[run_order][:-1])))
+    rank = np.arange(len(run_order)) - np.repeat(segment_first, np.diff(np.append(segment_first, len(run_order))))
+    run_label = np.empty(len(run_order), dtype=np.int64)
+    run_label[run_order] = rank
+
+    sorted_labels = np.full(n, -1, dtype=np.int64)
+    sorted_labels[core_index] = run_label[run]
+
+    # Border samples: the nearest core sample on either side is the only candidate cluster on that side
+    border = ~core
+    if min_samples > 2 and border.any():
+        positions = np.arange(n)
+        previous_core = np.maximum.accumulate(np.where(core, positions, -1))
+        next_core = np.minimum.accumulate(np.where(core, positions, n)[::-1])[::-1]
+        candidates = []
+        for neighbour, valid in ((previous_core, previous_core >= 0), (next_core, next_core < n)):
+            neighbour = np.where(valid, neighbour, 0)
+            reachable = valid & border & (segment[neighbour] == segment) & (np.abs(x - x[neighbour]) <= eps)
+            candidates.append(np.where(reachable, sorted_labels[neighbour], np.iinfo(np.int64).max))
+        best = np.minimum(*candidates)
+        assign = border & (best != np.iinfo(np.int64).max)
+        sorted_labels[assign] = best[assign]
+
+    labels[order] = sorted_labels
+    return labels
@@ -0,0 +1,89 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+
+class HTTPCache(object):
+    """
+    Persistent store of validators (ETag/Last-Modified) and bodies for
+    conditional GET requests, kept in a local SQLite database.
+
+    Entries are keyed on the endpoint and its query parameters, so a 304
+    Not Modified response can be answered with the body stored for the
+    exact same request.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Location of the SQLite database file. Created if missing.
+        """
+        self.path = str(path)
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS http_cache ("
+                " key TEXT PRIMARY KEY,"
+                " etag TEXT,"
+                " last_modified TEXT,"
+                " body BLOB NOT NULL,"
+                " updated REAL NOT NULL)"
+            )
+
+    def _connection(self):
+        """
+        SQLite connections can't be shared across threads, so each thread keeps its own.
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def make_key(endpoint, params):
+        """
+        Builds a stable key for an endpoint and its query parameters.
+        """
+        raw = json.dumps([endpoint, sorted((params or {}).items())], default=str)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """
+        Returns:
+            tuple: (etag, last_modified, body) for the key, or None if it is not cached.
+        """
+        row = self._connection().execute(
+            "SELECT etag, last_modified, body FROM http_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        etag, last_modified, body = row
+        return etag, last_modified, bytes(body)
+
+    def set(self, key, etag, last_modified, body):
+        """
+        Stores the validators and body of a successful response.
+        """
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO http_cache (key, etag, last_modified, body, updated) VALUES (?, ?, ?, ?, ?)",
+                (key, etag, last_modified, sqlite3.Binary(body), time.time())
+            )
+
+    def conditional_headers(self, entry):
+        """
+        Returns the If-None-Match/If-Modified-Since headers for a cached entry.
+        """
+        headers = {}
+        if entry is None:
+            return headers
+        etag, last_modified, body = entry
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        return headers
@@ -0,0 +1,125 @@
+"""
+Technical indicators over price and volume history, without any plotting.
+
+Every function takes matrices with one row per item and one column per
+period (a single series may also be passed as a 1-D array) and computes
+all rows in the same vectorized passes. Missing observations are NaN;
+they propagate through rolling windows the way pandas' rolling sums do.
+Results have the shape of the input.
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def _series(*arrays):
+    """
+    Float64 2-D views of equally shaped inputs, and whether they were 1-D
+    """
+    arrays = [np.asarray(values, dtype=np.float64) for values in arrays]
+    shape = arrays[0].shape
+    if any(values.shape != shape for values in arrays) or len(shape) not in (1, 2):
+        raise ValueError("Indicator inputs must be equally shaped 1-D or 2-D (items x time) arrays.")
+    return [np.atleast_2d(values) for values in arrays], len(shape) == 1
+
+
+def _result(values, one_dimensional):
+    return values[0] if one_dimensional else values
+
+
+def rolling_sum(values, period):
+    """
+    Sum of each window of period consecutive columns, ending at each column.
+    The first period - 1 columns, and any window containing NaN, are NaN.
+    """
+    if period < 1:
+        raise ValueError("period must be at least 1.")
+    (values,), one_dimensional = _series(values)
+    sums = np.full(values.shape, np.nan)
+    if values.shape[1] >= period:
+        sums[:, period - 1:] = sliding_window_view(values, period, axis=1).sum(axis=2)
+    return _result(sums, one_dimensional)
+
+
+def vwap(prices, volumes):
+    """
+    Cumulative Volume Weighted Average Price: the running average price weighted by volume.
+    NaN until some volume has been observed.
+
+    Args:
+        prices (array-like): Typical price of each period.
+        volumes (array-like): Volume of each period.
+    """
+    (prices, volumes), one_dimensional = _series(prices, volumes)
+    observed = np.isfinite(prices) & np.isfinite(volumes)
+    cumulative_price_volume = np.cumsum(np.where(observed, prices * volumes, 0), axis=1)
+    cumulative_volume = np.cumsum(np.where(observed, volumes, 0), axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        average = cumulative_price_volume / cumulative_volume
+    average[cumulative_volume == 0] = np.nan
+    return _result(average, one_dimensional)
+
+
+def money_flow_index(prices, volumes, period=14):
+    """
+    Money Flow Index: the volume weighted RSI, between 0 and 100. Prices are used as the typical price.
+
+    Windows without any negative money flow are capped at a money flow ratio of 9999, like
+    calculate_and_graph_money_flow_index always did; windows without any flow are NaN.
+
+    Args:
+        prices (array-like): Typical price of each period.
+        volumes (array-like): Volume of each period.
+        period (int, optional): Look-back period.
+    """
+    (prices, volumes), one_dimensional = _series(prices, volumes)
+    money_flow = prices * volumes
+    price_change = np.diff(prices, axis=1, prepend=np.nan)
+
+    positive_flow = rolling_sum(np.where(price_change > 0, money_flow, 0), period)
+    negative_flow = rolling_sum(np.where(price_change < 0, money_flow, 0), period)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        money_flow_ratio = positive_flow / negative_flow
+    money_flow_ratio[np.isposinf(money_flow_ratio)] = 9999
+    return _result(100 - (100 / (1 + money_flow_ratio)), one_dimensional)
+
+
+def chaikin_money_flow(highs, lows, closes, volumes, period=20):
+    """
+    Chaikin Money Flow: money flow volume over volume across the look-back period, between -1 and 1.
+    Positive values indicate buying pressure, negative values selling pressure.
+
+    Args:
+        highs, lows, closes (array-like): High, low and close price of each period.
+        volumes (array-like): Volume of each period.
+        period (int, optional): Look-back period.
+    """
+    (highs, lows, closes, volumes), one_dimensional = _series(highs, lows, closes, volumes)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        multiplier = ((closes - lows) - (highs - closes)) / (highs - lows)
+    # A period where high == low didn't move
+    multiplier[np.isnan(multiplier)] = 0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        flow = rolling_sum(multiplier * volumes, period) / rolling_sum(volumes, period)
+    return _result(flow, one_dimensional)
+
+
+def price_volume_correlation(prices, volumes):
+    """
+    Pearson correlation between price and volume of each item, over the periods where both were observed.
+    NaN for items with fewer than two observations or a constant price or volume.
+
+    Returns:
+        numpy.ndarray: One coefficient per item (a float for a 1-D series).
+    """
+    (prices, volumes), one_dimensional = _series(prices, volumes)
+    observed = np.isfinite(prices) & np.isfinite(volumes)
+    count = observed.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        price_deviation = np.where(observed, prices - np.where(observed, prices, 0).sum(axis=1, keepdims=True) / count[:, None], 0)
+        volume_deviation = np.where(observed, volumes - np.where(observed, volumes, 0).sum(axis=1, keepdims=True) / count[:, None], 0)
+        correlation = (price_deviation * volume_deviation).sum(axis=1) / np.sqrt(
+            (price_deviation ** 2).sum(axis=1) * (volume_deviation ** 2).sum(axis=1)
+        )
+    correlation[(count < 2) | ~np.isfinite(correlation)] = np.nan
+    return float(correlation[0]) if one_dimensional else correlation
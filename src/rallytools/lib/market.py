@@ -1,56 +1,502 @@
+import io
+import os
 import numpy as np
-from sklearn.cluster import DBSCAN
-from collections import defaultdict
-import matplotlib.pyplot as plt
-import pandas as pd
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from lib.clustering import dbscan_1d, segmented_dbscan_1d
 
-def analyze_market_data(data):
+# Quantities the importer stores the cost of buying for every commodity
+DEPTH_POINTS = (1, 10, 100, 1000)
+
+# Smaller snapshots are analyzed serially; starting worker processes would cost more than it saves
+PARALLEL_MIN_LISTINGS = 200000
+
+
+class CommodityListings(object):
+    """
+    Columnar, typed representation of a commodities snapshot.
+
+    Each listing is one position across four parallel int64 arrays, which takes
+    a fraction of the memory of the per-auction dictionaries Battle.net returns.
+    """
+
+    COLUMNS = ('auction_id', 'item_id', 'unit_price', 'quantity')
+
+    def __init__(self, auction_id, item_id, unit_price, quantity):
+        self.auction_id = np.asarray(auction_id, dtype=np.int64)
+        self.item_id = np.asarray(item_id, dtype=np.int64)
+        self.unit_price = np.asarray(unit_price, dtype=np.int64)
+        self.quantity = np.asarray(quantity, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.item_id)
+
+    @classmethod
+    def from_auctions(cls, auctions):
+        """
+        Builds columns from an iterable of Battle.net auction dictionaries.
+
+        The iterable is consumed one auction at a time, so it can be a streaming
+        parser (see BattleNetAPI.get_commodities_snapshot) and the full list of
+        dictionaries never needs to exist. Listings without an item id are dropped.
+
+        Args:
+            auctions (iterable): Dictionaries with 'id', 'item', 'unit_price' and 'quantity'.
+        """
+        columns = [array('q') for _ in cls.COLUMNS]
+        auction_ids, item_ids, unit_prices, quantities = columns
+        for listing in auctions:
+            item_id = listing.get('item', {}).get('id')
+            if not item_id:
+                continue
+            auction_ids.append(listing.get('id', 0))
+            item_ids.append(item_id)
+            unit_prices.append(listing['unit_price'])
+            quantities.append(listing['quantity'])
+
+        return cls(*[np.frombuffer(column, dtype=np.int64) if len(column) else np.empty(0, dtype=np.int64) for column in columns])
+
+    def take(self, selection):
+        """
+        Listings at the given indices or boolean mask, as a new CommodityListings
+        """
+        return CommodityListings(*[getattr(self, column)[selection] for column in self.COLUMNS])
+
+
+class ItemGroups(object):
+    """
+    Listings grouped by item: every column stably sorted by item id, plus the
+    offset and length of each item's contiguous segment.
+
+    Stable sorting keeps each item's listings in snapshot order, so per item
+    results don't depend on how the grouping was computed.
+    """
+
+    def __init__(self, listings):
+        """
+        Args:
+            listings (CommodityListings): Listings to group.
+        """
+        order = np.argsort(listings.item_id, kind='stable')
+        self.auction_id = listings.auction_id[order]
+        self.item_id = listings.item_id[order]
+        self.unit_price = listings.unit_price[order]
+        self.quantity = listings.quantity[order]
+
+        boundaries = np.flatnonzero(np.diff(self.item_id)) + 1
+        self.starts = np.concatenate(([0], boundaries)).astype(np.intp) if len(order) else np.empty(0, dtype=np.intp)
+        self.counts = np.diff(np.append(self.starts, len(order)))
+        self.keys = self.item_id[self.starts]
+
+    def __len__(self):
+        return len(self.starts)
+
+    def reduce(self, ufunc, column):
+        """
+        Applies a ufunc's reduction to every item's segment of a column in one pass,
+        e.g. reduce(np.add, groups.quantity) for the total quantity of each item.
+        """
+        if not len(self.starts):
+            return np.empty(0, dtype=column.dtype)
+        return ufunc.reduceat(column, self.starts)
+
+
+class OrderBookDepth(object):
+    """
+    Cumulative order book of every item in a snapshot.
+
+    Listings are sorted by item, then unit price, with a running quantity and
+    cost over the whole snapshot. Because every quantity is positive the running
+    quantity is strictly increasing, so the cheapest way to buy N units of every
+    item is found with a single searchsorted.
+    """
+
+    def __init__(self, listings):
+        """
+        Args:
+            listings (CommodityListings or ItemGroups): Listings of the snapshot.
+        """
+        order = np.lexsort((listings.unit_price, listings.item_id))
+        self.item_id = listings.item_id[order]
+        self.unit_price = listings.unit_price[order]
+        self.quantity = listings.quantity[order]
+
+        boundaries = np.flatnonzero(np.diff(self.item_id)) + 1
+        self.starts = np.concatenate(([0], boundaries)).astype(np.intp) if len(order) else np.empty(0, dtype=np.intp)
+        self.keys = self.item_id[self.starts]
+        ends = np.append(self.starts[1:], len(order)).astype(np.intp)
+
+        self.cumulative_quantity = np.cumsum(self.quantity)
+        # The running cost of the whole snapshot may wrap around int64, but differences
+        # within one item stay exact as long as that item's book fits in an int64
+        self.cumulative_cost = np.cumsum(self.unit_price * self.quantity)
+        if len(order):
+            self._base_quantity = self.cumulative_quantity[self.starts] - self.quantity[self.starts]
+            self._base_cost = self.cumulative_cost[self.starts] - self.unit_price[self.starts] * self.quantity[self.starts]
+            self.total_quantity = self.cumulative_quantity[ends - 1] - self._base_quantity
+        else:
+            self._base_quantity = self._base_cost = self.total_quantity = np.empty(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def cost_to_buy(self, units):
+        """
+        Prices buying units of every item from the cheapest listings up.
+
+        Args:
+            units (int or array-like): Units to buy, for all items or one per item (in the order of keys).
+
+        Returns:
+            dict: Arrays in the order of keys: 'cost' (total copper), 'average_price'
+                  and 'marginal_price' (unit price of the last listing bought from).
+                  Items with fewer than units available are NaN.
+        """
+        units = np.broadcast_to(np.asarray(units, dtype=np.int64), self.keys.shape)
+        enough = (units > 0) & (units <= self.total_quantity)
+
+        # First listing at which the running quantity covers the order
+        last = np.searchsorted(self.cumulative_quantity, self._base_quantity + units, side='left')
+        last = np.where(enough, last, self.starts) # Any valid index; masked out below
+        bought_before = self.cumulative_quantity[last] - self.quantity[last] - self._base_quantity
+        cost_before = self.cumulative_cost[last] - self.unit_price[last] * self.quantity[last] - self._base_cost
+        cost = cost_before + (units - bought_before) * self.unit_price[last]
+
+        cost = np.where(enough, cost, 0).astype(np.float64)
+        cost[~enough] = np.nan
+        with np.errstate(invalid='ignore', divide='ignore'):
+            average_price = cost / units
+        marginal_price = np.where(enough, self.unit_price[last].astype(np.float64), np.nan)
+        return {'cost': cost, 'average_price': average_price, 'marginal_price': marginal_price}
+
+    def depth_points(self, points=DEPTH_POINTS):
+        """
+        Average and marginal price to buy each of the given quantities, for every item.
+
+        Returns:
+            dict: {item_id: {str(units): {'average_price': float, 'marginal_price': int}}}.
+                  Prices are None when fewer units are listed.
+        """
+        results = {item_id: {} for item_id in self.keys.tolist()}
+        for units in points:
+            prices = self.cost_to_buy(units)
+            for item_id, average_price, marginal_price in zip(self.keys.tolist(), prices['average_price'].tolist(), prices['marginal_price'].tolist()):
+                results[item_id][str(units)] = {
+                    'average_price': None if np.isnan(average_price) else average_price,
+                    'marginal_price': None if np.isnan(marginal_price) else int(marginal_price),
+                }
+        return results
+
+
+class SnapshotDiff(object):
+    """
+    Listing level changes between two snapshots of the same region, per item.
+
+    Auctions keep their id for as long as they are listed, and a commodity
+    auction only ever changes by units being bought from it. Comparing
+    snapshots by auction id therefore splits every listing into new (only in
+    the current snapshot), removed (only in the previous one), partially
+    filled (same auction, lower quantity) or unchanged.
+
+    Every per item attribute is an int64 array in the order of keys.
+    """
+
+    def __init__(self, previous, current):
+        """
+        Args:
+            previous (CommodityListings): Listings of the previous snapshot.
+            current (CommodityListings): Listings of the current snapshot.
+        """
+        _, previous_index, current_index = np.intersect1d(previous.auction_id, current.auction_id, return_indices=True)
+        # Auctions that changed item or price are not the same listing anymore
+        same_listing = (previous.item_id[previous_index] == current.item_id[current_index]) & \
+            (previous.unit_price[previous_index] == current.unit_price[current_index])
+        previous_index = previous_index[same_listing]
+        current_index = current_index[same_listing]
+        filled = previous.quantity[previous_index] - current.quantity[current_index]
+
+        is_new = np.ones(len(current), dtype=bool)
+        is_new[current_index] = False
+        is_removed = np.ones(len(previous), dtype=bool)
+        is_removed[previous_index] = False
+        is_filled = filled > 0
+
+        self.keys = np.union1d(previous.item_id, current.item_id)
+        current_item = np.searchsorted(self.keys, current.item_id)
+        previous_item = np.searchsorted(self.keys, previous.item_id)
+        filled_item = current_item[current_index[is_filled]]
+
+        self.new_listings = self._count(current_item[is_new])
+        self.new_quantity = self._sum(current_item[is_new], current.quantity[is_new])
+        self.removed_listings = self._count(previous_item[is_removed])
+        self.removed_quantity = self._sum(previous_item[is_removed], previous.quantity[is_removed])
+        self.partially_filled_listings = self._count(filled_item)
+        self.filled_quantity = self._sum(filled_item, filled[is_filled])
+        self.changed = (self.new_listings + self.removed_listings + self.partially_filled_listings) > 0
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _count(self, item_index):
+        return np.bincount(item_index, minlength=len(self.keys)).astype(np.int64)
+
+    def _sum(self, item_index, values):
+        totals = np.zeros(len(self.keys), dtype=np.int64)
+        np.add.at(totals, item_index, values)
+        return totals
+
+    @property
+    def sold_quantity(self):
+        """
+        Estimated units sold since the previous snapshot: units bought from partially filled listings plus
+        the units of removed listings.  Removed listings also include expired and cancelled ones, so this is an upper bound
+        """
+        return self.filled_quantity + self.removed_quantity
+
+    @property
+    def changed_items(self):
+        return self.keys[self.changed]
+
+    @property
+    def unchanged_items(self):
+        return self.keys[~self.changed]
+
+    def item_changes(self):
+        """
+        Returns:
+            dict: {item_id: {'new_listings', 'new_quantity', 'removed_listings', 'removed_quantity',
+                  'partially_filled_listings', 'filled_quantity', 'sold_quantity'}} for every item of either snapshot.
+        """
+        columns = {
+            'new_listings': self.new_listings,
+            'new_quantity': self.new_quantity,
+            'removed_listings': self.removed_listings,
+            'removed_quantity': self.removed_quantity,
+            'partially_filled_listings': self.partially_filled_listings,
+            'filled_quantity': self.filled_quantity,
+            'sold_quantity': self.sold_quantity,
+        }
+        columns = {name: values.tolist() for name, values in columns.items()}
+        return {item_id: {name: values[i] for name, values in columns.items()} for i, item_id in enumerate(self.keys.tolist())}
+
+
+def analyze_market_data(data, workers=1, min_parallel_listings=PARALLEL_MIN_LISTINGS):
     """
     Analyzes a list of market data to calculate metrics for each unique item.
 
     This function groups items by their ID and calculates the minimum price,
-    maximum price, total quantity, and a market price for each item. The market
-    price is determined by finding the lowest-priced cluster of listings.
+    maximum price, total quantity, listing count, and a market price for each
+    item. The market price is determined by finding the lowest-priced cluster
+    of listings.
+
+    Grouping is a single stable sort, the per item minimum, maximum, total
+    quantity and count are segmented reductions over the sorted columns, and
+    market prices are clustered for every item in one batch. With several
+    workers, the clustering is sharded by item across a process pool (see
+    calculate_market_prices); the results are identical either way.
 
     Args:
-        data (list): A list of dictionaries, where each dictionary represents
-                     a market listing with 'item', 'unit_price', and 'quantity'.
+        data (CommodityListings or list): Listings in columnar form, or a list of
+                     dictionaries, where each dictionary represents a market
+                     listing with 'item', 'unit_price', and 'quantity'.
+        workers (int, optional): Processes to cluster market prices in. 0 or None for one per core.
+        min_parallel_listings (int, optional): Snapshots with fewer listings are analyzed serially.
 
     Returns:
         dict: A dictionary where keys are item IDs and values are another
               dictionary containing the calculated metrics: 'min_price',
-              'max_price', 'market_price', 'total_quantity'.
+              'max_price', 'market_price', 'total_quantity', 'listing_count'.
     """
-    # Group listings by item ID
-    grouped_by_item = defaultdict(list)
-    for listing in data:
-        item_id = listing.get('item', {}).get('id')
-        if item_id:
-            grouped_by_item[item_id].append(listing)
+    if not isinstance(data, CommodityListings):
+        data = CommodityListings.from_auctions(data)
 
     # Dictionary to hold the final results
     market_analysis = {}
+    if not len(data):
+        return market_analysis
 
-    # Process each group of items
-    for item_id, listings in grouped_by_item.items():
-        prices = [d['unit_price'] for d in listings]
-        quantities = [d['quantity'] for d in listings]
-        total_quantity = sum(quantities)
+    if len(data) < min_parallel_listings:
+        workers = 1
 
-        min_price = min(prices)
-        max_price = max(prices)
-        
-        market_price = calculate_market_price(prices)
+    groups = ItemGroups(data)
+    min_prices = groups.reduce(np.minimum, groups.unit_price).tolist()
+    max_prices = groups.reduce(np.maximum, groups.unit_price).tolist()
+    total_quantities = groups.reduce(np.add, groups.quantity).tolist()
+    counts = groups.counts.tolist()
+    market_prices = calculate_market_prices(groups, workers=workers)
 
+    # Process each group of items
+    for i, item_id in enumerate(groups.keys.tolist()):
         market_analysis[item_id] = {
-            'min_price': min_price,
-            'max_price': max_price,
-            'market_price': market_price,
-            'total_quantity': total_quantity,
+            'min_price': min_prices[i],
+            'max_price': max_prices[i],
+            'market_price': market_prices[i],
+            'total_quantity': total_quantities[i],
+            'listing_count': counts[i],
         }
 
     return market_analysis
 
+def update_market_data(previous_analysis, diff, data, workers=1, min_parallel_listings=PARALLEL_MIN_LISTINGS):
+    """
+    analyze_market_data of the current snapshot, reusing the previous snapshot's
+    results for every item whose listings did not change.
+
+    Only the listings of changed items are analyzed again. Every metric of
+    an item only depends on the set of its listings, so the results are the
+    same as analyzing the whole snapshot.
+
+    Args:
+        previous_analysis (dict): analyze_market_data of the previous snapshot.
+        diff (SnapshotDiff): Changes from the previous snapshot to data.
+        data (CommodityListings): Listings of the current snapshot.
+        workers (int, optional): See analyze_market_data.
+        min_parallel_listings (int, optional): See analyze_market_data.
+
+    Returns:
+        dict: Same as analyze_market_data(data).
+    """
+    reused = {item_id: previous_analysis[item_id] for item_id in diff.unchanged_items.tolist() if item_id in previous_analysis}
+    changed = data.take(~np.isin(data.item_id, np.fromiter(reused, dtype=np.int64, count=len(reused))))
+    market_analysis = analyze_market_data(changed, workers=workers, min_parallel_listings=min_parallel_listings)
+    market_analysis.update(reused)
+    return {item_id: market_analysis[item_id] for item_id in sorted(market_analysis)}
+
+
+def pack_snapshot(listings, market_analysis):
+    """
+    Serializes a snapshot's listings and analyze_market_data results into compressed numpy arrays,
+    so the next snapshot can be diffed against them (see unpack_snapshot)
+    """
+    keys = list(market_analysis)
+    metrics = {
+        name: np.array([market_analysis[item_id][name] for item_id in keys], dtype=np.int64)
+        for name in ('min_price', 'max_price', 'total_quantity', 'listing_count')
+    }
+    market_prices = [market_analysis[item_id]['market_price'] for item_id in keys]
+    buffer = io.BytesIO()
+    np.savez_compressed(
+        buffer,
+        **{column: getattr(listings, column) for column in CommodityListings.COLUMNS},
+        keys=np.array(keys, dtype=np.int64),
+        market_price=np.array(market_prices, dtype=np.float64),
+        # Clustered market prices are floats, fallbacks to the minimum price are ints
+        market_price_clustered=np.array([isinstance(price, float) for price in market_prices], dtype=bool),
+        **metrics
+    )
+    return buffer.getvalue()
+
+
+def unpack_snapshot(data):
+    """
+    Returns:
+        tuple: The (CommodityListings, market analysis dict) serialized by pack_snapshot.
+    """
+    with np.load(io.BytesIO(data)) as arrays:
+        listings = CommodityListings(*[arrays[column] for column in CommodityListings.COLUMNS])
+        columns = {name: arrays[name].tolist() for name in ('min_price', 'max_price', 'total_quantity', 'listing_count')}
+        market_prices = arrays['market_price'].tolist()
+        clustered = arrays['market_price_clustered'].tolist()
+        keys = arrays['keys'].tolist()
+
+    market_analysis = {}
+    for i, item_id in enumerate(keys):
+        market_analysis[item_id] = {
+            'min_price': columns['min_price'][i],
+            'max_price': columns['max_price'][i],
+            'market_price': market_prices[i] if clustered[i] else int(market_prices[i]),
+            'total_quantity': columns['total_quantity'][i],
+            'listing_count': columns['listing_count'][i],
+        }
+    return listings, market_analysis
+
+
+def _market_price_eps(price_range):
+    """
+    A simple heuristic for DBSCAN's eps: 5% of the price range, with a minimum value.
+    Works on a single range or an array of them.
+    """
+    return np.maximum(np.asarray(price_range) * 0.05, 1000)
+
+
+def calculate_market_prices(groups, workers=1):
+    """
+    calculate_market_price for every item of an ItemGroups in one batch.
+
+    The listings of all items with enough of them are clustered together by
+    lib.clustering.segmented_dbscan_1d. In one dimension clusters never
+    overlap, so the cluster with the lowest average price is also the lowest
+    one, and its minimum is the lowest clustered price of the item.
+
+    Every item is clustered on its own, so with several workers the items are
+    split into contiguous shards of about the same number of listings, and
+    each process only receives the unit price and count arrays of its shard.
+    Shards are concatenated back in item order.
+
+    Args:
+        groups (ItemGroups): Listings grouped by item.
+        workers (int, optional): Processes to shard the items across. 0 or None for one per core.
+
+    Returns:
+        list: The market price of each item, in the order of groups.keys.
+    """
+    workers = workers or os.cpu_count() or 1
+    bounds = _shard_bounds(groups.counts, workers)
+    if len(bounds) <= 2:
+        return _market_prices(groups.unit_price, groups.counts)
+
+    listing_bounds = np.append(groups.starts, len(groups.unit_price))[bounds].tolist()
+    bounds = bounds.tolist()
+    shards = range(len(bounds) - 1)
+    # Workers are spawned rather than forked: the importer runs one thread per region
+    with ProcessPoolExecutor(max_workers=len(shards), mp_context=get_context('spawn')) as executor:
+        results = executor.map(
+            _market_prices,
+            [groups.unit_price[listing_bounds[i]:listing_bounds[i + 1]] for i in shards],
+            [groups.counts[bounds[i]:bounds[i + 1]] for i in shards],
+        )
+        return [price for shard in results for price in shard]
+
+
+def _shard_bounds(counts, shards):
+    """
+    Item offsets splitting items into at most shards contiguous runs of about the same number of listings,
+    starting with 0 and ending with the number of items
+    """
+    cumulative = np.cumsum(counts)
+    if shards <= 1 or len(counts) <= 1:
+        return np.array([0, len(counts)], dtype=np.intp)
+    targets = cumulative[-1] * np.arange(1, shards) / shards
+    cuts = np.searchsorted(cumulative, targets, side='left') + 1
+    return np.unique(np.concatenate(([0], np.minimum(cuts, len(counts)), [len(counts)]))).astype(np.intp)
+
+
+def _market_prices(unit_price, counts):
+    """
+    Market price of each segment of unit_price, one segment per item.  Runs in worker processes
+    """
+    starts = np.cumsum(counts) - counts
+    min_prices = np.minimum.reduceat(unit_price, starts) if len(counts) else np.empty(0, dtype=unit_price.dtype)
+    market_prices = min_prices.tolist()
+    clustered = counts >= 3
+    if not clustered.any():
+        return market_prices
+
+    price_ranges = np.maximum.reduceat(unit_price, starts) - min_prices
+    in_clustered = np.repeat(clustered, counts)
+    prices = unit_price[in_clustered]
+    counts = counts[clustered]
+    labels = segmented_dbscan_1d(prices, counts, _market_price_eps(price_ranges[clustered]), min_samples=2)
+
+    lowest = np.minimum.reduceat(np.where(labels >= 0, prices.astype(np.float64), np.inf), np.cumsum(counts) - counts)
+    # Items without any cluster keep their minimum price, like calculate_market_price
+    for i, price in zip(np.flatnonzero(clustered).tolist(), lowest.tolist()):
+        if price != np.inf:
+            market_prices[i] = price
+    return market_prices
+
+
 def calculate_market_price(prices):
     """
     Calculates the market price from a list of prices using clustering.
@@ -81,11 +527,10 @@ def calculate_market_price(prices):
     # It defines the maximum distance between two samples for one to be considered
     # as in the neighborhood of the other. We can set it dynamically.
     price_range = np.ptp(prices_array) # Peak-to-peak (max - min)
-    # A simple heuristic for eps: 5% of the price range, with a minimum value.
-    eps_value = max(price_range * 0.05, 1000) 
+    eps_value = float(_market_price_eps(price_range))
 
-    db = DBSCAN(eps=eps_value, min_samples=2).fit(prices_array)
-    labels = db.labels_
+    # Prices are one dimensional, so an exact sorted-gap DBSCAN replaces sklearn's
+    labels = dbscan_1d(prices_array.ravel(), eps=eps_value, min_samples=2)
 
     # -1 represents noise/outliers in DBSCAN
     unique_labels = set(labels)
@@ -112,267 +557,18 @@ def calculate_market_price(prices):
     market_price_cluster = prices_array[labels == best_cluster_label]
     return float(np.min(market_price_cluster))
 
-# --- Data Validation ---
-
-def _validate_data(data):
-    """
-    Validates the input data dictionary to ensure it has the required keys
-    and that the lists are of equal length.
-    """
-    required_keys = ["commodity", "quantities", "market_prices"]
-    for key in required_keys:
-        if key not in data:
-            raise ValueError(f"Missing required key in data: '{key}'")
-
-    quantities = data["quantities"]
-    prices = data["market_prices"]
-
-    if len(quantities) != len(prices):
-        raise ValueError("The 'quantities' and 'market_prices' lists must be of the same length.")
-
-    if len(prices) == 0:
-        raise ValueError("Input lists cannot be empty.")
-
-    # Check for additional keys needed for advanced metrics
-    has_ohlc = all(k in data for k in ['high_prices', 'low_prices', 'close_prices'])
-
-    return True, has_ohlc
-
-
-# --- Metric Calculation and Graphing Functions ---
-
-def calculate_and_graph_vwap(data: dict):
-    """
-    Calculates and graphs the Volume Weighted Average Price (VWAP).
-
-    VWAP is the average price of a commodity weighted by its trading volume.
-    It provides a benchmark of the "true" average price for a given period.
-
-    Args:
-        data (dict): A dictionary containing 'market_prices' and 'quantities'.
-    """
-    try:
-        _validate_data(data)
-    except ValueError as e:
-        print(f"Data validation error: {e}")
-        return
-
-    prices = np.array(data['market_prices'])
-    volumes = np.array(data['quantities'])
-    commodity_name = data['commodity'].title()
-
-    # Calculate VWAP
-    # In this context, we assume 'market_prices' represents the typical price for the period.
-    cumulative_price_volume = np.cumsum(prices * volumes)
-    cumulative_volume = np.cumsum(volumes)
-
-    # Avoid division by zero if the first volume is 0
-    vwap = np.full_like(prices, fill_value=np.nan)
-    non_zero_mask = cumulative_volume != 0
-    vwap[non_zero_mask] = cumulative_price_volume[non_zero_mask] / cumulative_volume[non_zero_mask]
-
-    # Plotting
-    plt.style.use('seaborn-v0_8-darkgrid')
-    fig, ax = plt.subplots(figsize=(12, 6))
-
-    time_periods = np.arange(len(prices))
-
-    ax.plot(time_periods, prices, label='Market Price', color='skyblue', marker='o', linestyle='-')
-    ax.plot(time_periods, vwap, label='VWAP', color='coral', marker='x', linestyle='--')
-
-    ax.set_title(f'Market Price vs. VWAP for {commodity_name}', fontsize=16)
-    ax.set_xlabel('Time Period', fontsize=12)
-    ax.set_ylabel('Price', fontsize=12)
-    ax.legend(fontsize=10)
-    ax.grid(True, which='both', linestyle='--', linewidth=0.5)
-
-    plt.tight_layout()
-    plt.show()
-
-
-def calculate_and_graph_price_volume_correlation(data: dict):
-    """
-    Calculates Price-Volume correlation and displays it on a scatter plot.
-
-    This helps visualize the relationship between price movements and trading
-    activity. A positive correlation means price tends to rise on higher volume.
-
-    Args:
-        data (dict): A dictionary containing 'market_prices' and 'quantities'.
-    """
-    try:
-        _validate_data(data)
-    except ValueError as e:
-        print(f"Data validation error: {e}")
-        return
-
-    prices = np.array(data['market_prices'])
-    volumes = np.array(data['quantities'])
-    commodity_name = data['commodity'].title()
-
-    # Calculate the Pearson correlation coefficient
-    correlation_matrix = np.corrcoef(prices, volumes)
-    correlation = correlation_matrix[0, 1] if correlation_matrix.shape == (2, 2) else 0
-
-    # Plotting
-    plt.style.use('seaborn-v0_8-darkgrid')
-    fig, ax = plt.subplots(figsize=(10, 6))
-
-    ax.scatter(volumes, prices, alpha=0.7, color='mediumseagreen', edgecolors='k')
-
-    ax.set_title(f'Price vs. Volume Correlation for {commodity_name}', fontsize=16)
-    ax.set_xlabel('Quantity (Volume)', fontsize=12)
-    ax.set_ylabel('Market Price', fontsize=12)
-
-    # Add correlation text to the plot
-    ax.text(0.05, 0.95, f'Correlation: {correlation:.4f}',
-            transform=ax.transAxes, fontsize=12,
-            verticalalignment='top', bbox=dict(boxstyle='round,pad=0.5', fc='wheat', alpha=0.5))
-
-    ax.grid(True, which='both', linestyle='--', linewidth=0.5)
-
-    plt.tight_layout()
-    plt.show()
-
-
-def calculate_and_graph_money_flow_index(data: dict, period: int = 14):
-    """
-    Calculates and graphs the Money Flow Index (MFI).
-
-    MFI is a momentum indicator that uses both price and volume to measure
-    buying and selling pressure. It is often called the volume-weighted RSI.
-    Values above 80 are considered overbought, and below 20 are oversold.
-
-    Note: This calculation uses 'market_prices' as the 'Typical Price'
-    since High and Low prices are not provided.
-
-    Args:
-        data (dict): A dictionary containing 'market_prices' and 'quantities'.
-        period (int): The look-back period for the MFI calculation.
-    """
-    try:
-        _validate_data(data)
-    except ValueError as e:
-        print(f"Data validation error: {e}")
-        return
-
-    prices = pd.Series(data['market_prices'])
-    volumes = pd.Series(data['quantities'])
-    commodity_name = data['commodity'].title()
-
-    if len(prices) <= period:
-        print(f"Error: Not enough data for the specified period of {period}. "
-              f"Need at least {period + 1} data points.")
-        return
-
-    # Using market_price as the typical price
-    typical_price = prices
-    money_flow = typical_price * volumes
-
-    price_diff = typical_price.diff(1)
-
-    positive_flow = pd.Series(np.where(price_diff > 0, money_flow, 0))
-    negative_flow = pd.Series(np.where(price_diff < 0, money_flow, 0))
-
-    positive_mf = positive_flow.rolling(window=period).sum()
-    negative_mf = negative_flow.rolling(window=period).sum()
-
-    # Avoid division by zero
-    money_flow_ratio = positive_mf / negative_mf
-    money_flow_ratio = money_flow_ratio.replace([np.inf], 9999) # Handle cases where negative_mf is 0
-
-    mfi = 100 - (100 / (1 + money_flow_ratio))
-
-    # Plotting
-    plt.style.use('seaborn-v0_8-darkgrid')
-    fig, ax = plt.subplots(figsize=(12, 6))
-
-    time_periods = np.arange(len(prices))
-
-    ax.plot(time_periods, mfi, label=f'MFI ({period}-period)', color='purple')
-    ax.axhline(80, linestyle='--', color='red', alpha=0.7, label='Overbought (80)')
-    ax.axhline(50, linestyle='--', color='gray', alpha=0.5)
-    ax.axhline(20, linestyle='--', color='green', alpha=0.7, label='Oversold (20)')
-
-    ax.set_title(f'Money Flow Index (MFI) for {commodity_name}', fontsize=16)
-    ax.set_xlabel('Time Period', fontsize=12)
-    ax.set_ylabel('MFI Value', fontsize=12)
-    ax.set_ylim(0, 100)
-    ax.legend(fontsize=10)
-    ax.grid(True, which='both', linestyle='--', linewidth=0.5)
-
-    plt.tight_layout()
-    plt.show()
-
-
-def calculate_and_graph_chaikin_money_flow(data: dict, period: int = 20):
-    """
-    Calculates and graphs the Chaikin Money Flow (CMF).
-
-    CMF measures the amount of Money Flow Volume over a specific period.
-    It can be used to confirm trends or signal reversals. Values above zero
-    indicate buying pressure, while values below zero indicate selling pressure.
-
-    *** IMPORTANT NOTE ***
-    This indicator REQUIRES High, Low, Close prices, and Volume.
-    The function will not run without these keys in the input dictionary:
-    'high_prices', 'low_prices', 'close_prices', 'quantities'.
-
-    Args:
-        data (dict): A dictionary containing high, low, close prices and quantities.
-        period (int): The look-back period for the CMF calculation.
-    """
-    try:
-        is_valid, has_ohlc = _validate_data(data)
-        if not has_ohlc:
-            print("--- Chaikin Money Flow Warning ---")
-            print("Calculation skipped: This function requires 'high_prices', 'low_prices', "
-                  "'close_prices', and 'quantities' in the data dictionary.")
-            print("---------------------------------")
-            return
-    except ValueError as e:
-        print(f"Data validation error: {e}")
-        return
-
-    highs = pd.Series(data['high_prices'])
-    lows = pd.Series(data['low_prices'])
-    closes = pd.Series(data['close_prices'])
-    volumes = pd.Series(data['quantities'])
-    commodity_name = data['commodity'].title()
-
-    if len(closes) < period:
-        print(f"Error: Not enough data for the specified period of {period}. "
-              f"Need at least {period} data points.")
-        return
-
-    # Calculate Money Flow Multiplier and Volume
-    # Handle division by zero if High == Low
-    mf_multiplier = ((closes - lows) - (highs - closes)) / (highs - lows)
-    mf_multiplier = mf_multiplier.fillna(0) # If High == Low, the change is 0
-
-    mf_volume = mf_multiplier * volumes
-
-    # Calculate Chaikin Money Flow
-    cmf = mf_volume.rolling(window=period).sum() / volumes.rolling(window=period).sum()
-
-    # Plotting
-    plt.style.use('seaborn-v0_8-darkgrid')
-    fig, ax = plt.subplots(figsize=(12, 6))
-
-    time_periods = np.arange(len(closes))
-
-    ax.plot(time_periods, cmf, label=f'CMF ({period}-period)', color='darkcyan')
-    ax.axhline(0, linestyle='--', color='black', alpha=0.8)
-
-    # Fill between CMF line and zero line for better visualization
-    ax.fill_between(time_periods, cmf, 0, where=(cmf > 0), facecolor='green', alpha=0.3)
-    ax.fill_between(time_periods, cmf, 0, where=(cmf < 0), facecolor='red', alpha=0.3)
-
-    ax.set_title(f'Chaikin Money Flow (CMF) for {commodity_name}', fontsize=16)
-    ax.set_xlabel('Time Period', fontsize=12)
-    ax.set_ylabel('CMF Value', fontsize=12)
-    ax.legend(fontsize=10)
-    ax.grid(True, which='both', linestyle='--', linewidth=0.5)
-
-    plt.tight_layout()
-    plt.show()
+# Charts moved to lib.plotting, next to the lib.indicators they draw.  They are still importable from
+# here, but lib.plotting (and matplotlib with it) is only imported once one of them is asked for
+PLOTTING_FUNCTIONS = (
+    'calculate_and_graph_vwap',
+    'calculate_and_graph_price_volume_correlation',
+    'calculate_and_graph_money_flow_index',
+    'calculate_and_graph_chaikin_money_flow',
+)
+
+
+def __getattr__(name):
+    if name in PLOTTING_FUNCTIONS:
+        from lib import plotting
+        return getattr(plotting, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,257 @@
+"""
+Charts of the lib.indicators technical indicators.
+
+The plot_* functions draw one item's series onto a matplotlib Axes, so the
+same charts can be shown interactively or rendered headless onto a
+matplotlib.figure.Figure. The calculate_and_graph_* functions compute an
+indicator from a single commodity's data dictionary and show it.
+
+matplotlib is only imported by the functions that need it, so importing
+this module stays cheap.
+"""
+
+import numpy as np
+from lib import indicators
+
+STYLE = 'seaborn-v0_8-darkgrid'
+
+
+def _time_periods(values, x):
+    return np.arange(len(values)) if x is None else x
+
+
+def _finish(ax):
+    ax.legend(fontsize=10)
+    ax.grid(True, which='both', linestyle='--', linewidth=0.5)
+
+
+def plot_price(ax, close, high, low, commodity_name, x=None):
+    """
+    Closing market price over time, within its high/low range.
+    """
+    time_periods = _time_periods(close, x)
+    ax.fill_between(time_periods, low, high, color='skyblue', alpha=0.3, label='High/Low')
+    ax.plot(time_periods, close, label='Market Price', color='steelblue', linestyle='-')
+
+    ax.set_title(f'Market Price of {commodity_name}', fontsize=16)
+    ax.set_xlabel('Time Period', fontsize=12)
+    ax.set_ylabel('Price', fontsize=12)
+    _finish(ax)
+
+
+def plot_vwap(ax, prices, vwap, commodity_name, x=None):
+    """
+    Market price and VWAP over time.
+    """
+    time_periods = _time_periods(prices, x)
+    ax.plot(time_periods, prices, label='Market Price', color='skyblue', marker='o', linestyle='-')
+    ax.plot(time_periods, vwap, label='VWAP', color='coral', marker='x', linestyle='--')
+
+    ax.set_title(f'Market Price vs. VWAP for {commodity_name}', fontsize=16)
+    ax.set_xlabel('Time Period', fontsize=12)
+    ax.set_ylabel('Price', fontsize=12)
+    _finish(ax)
+
+
+def plot_price_volume_correlation(ax, prices, volumes, correlation, commodity_name):
+    """
+    Scatter plot of price against volume, annotated with their correlation.
+    """
+    ax.scatter(volumes, prices, alpha=0.7, color='mediumseagreen', edgecolors='k')
+
+    ax.set_title(f'Price vs. Volume Correlation for {commodity_name}', fontsize=16)
+    ax.set_xlabel('Quantity (Volume)', fontsize=12)
+    ax.set_ylabel('Market Price', fontsize=12)
+
+    # Add correlation text to the plot
+    ax.text(0.05, 0.95, f'Correlation: {correlation:.4f}',
+            transform=ax.transAxes, fontsize=12,
+            verticalalignment='top', bbox=dict(boxstyle='round,pad=0.5', fc='wheat', alpha=0.5))
+
+    ax.grid(True, which='both', linestyle='--', linewidth=0.5)
+
+
+def plot_money_flow_index(ax, mfi, period, commodity_name, x=None):
+    """
+    Money Flow Index with its overbought (80) and oversold (20) levels.
+    """
+    ax.plot(_time_periods(mfi, x), mfi, label=f'MFI ({period}-period)', color='purple')
+    ax.axhline(80, linestyle='--', color='red', alpha=0.7, label='Overbought (80)')
+    ax.axhline(50, linestyle='--', color='gray', alpha=0.5)
+    ax.axhline(20, linestyle='--', color='green', alpha=0.7, label='Oversold (20)')
+
+    ax.set_title(f'Money Flow Index (MFI) for {commodity_name}', fontsize=16)
+    ax.set_xlabel('Time Period', fontsize=12)
+    ax.set_ylabel('MFI Value', fontsize=12)
+    ax.set_ylim(0, 100)
+    _finish(ax)
+
+
+def plot_chaikin_money_flow(ax, cmf, period, commodity_name, x=None):
+    """
+    Chaikin Money Flow, filled green above zero and red below.
+    """
+    time_periods = _time_periods(cmf, x)
+    ax.plot(time_periods, cmf, label=f'CMF ({period}-period)', color='darkcyan')
+    ax.axhline(0, linestyle='--', color='black', alpha=0.8)
+
+    # Fill between CMF line and zero line for better visualization
+    ax.fill_between(time_periods, cmf, 0, where=(cmf > 0), facecolor='green', alpha=0.3)
+    ax.fill_between(time_periods, cmf, 0, where=(cmf < 0), facecolor='red', alpha=0.3)
+
+    ax.set_title(f'Chaikin Money Flow (CMF) for {commodity_name}', fontsize=16)
+    ax.set_xlabel('Time Period', fontsize=12)
+    ax.set_ylabel('CMF Value', fontsize=12)
+    _finish(ax)
+
+
+# --- Data Validation ---
+
+def _validate_data(data):
+    """
+    Validates the input data dictionary to ensure it has the required keys
+    and that the lists are of equal length.
+    """
+    required_keys = ["commodity", "quantities", "market_prices"]
+    for key in required_keys:
+        if key not in data:
+            raise ValueError(f"Missing required key in data: '{key}'")
+
+    quantities = data["quantities"]
+    prices = data["market_prices"]
+
+    if len(quantities) != len(prices):
+        raise ValueError("The 'quantities' and 'market_prices' lists must be of the same length.")
+
+    if len(prices) == 0:
+        raise ValueError("Input lists cannot be empty.")
+
+    # Check for additional keys needed for advanced metrics
+    has_ohlc = all(k in data for k in ['high_prices', 'low_prices', 'close_prices'])
+
+    return True, has_ohlc
+
+
+def _show(plot, *args, figsize=(12, 6)):
+    import matplotlib.pyplot as plt
+
+    plt.style.use(STYLE)
+    fig, ax = plt.subplots(figsize=figsize)
+    plot(ax, *args)
+    plt.tight_layout()
+    plt.show()
+
+
+# --- Metric Calculation and Graphing Functions ---
+
+def calculate_and_graph_vwap(data: dict):
+    """
+    Calculates and graphs the Volume Weighted Average Price (VWAP).
+
+    VWAP is the average price of a commodity weighted by its trading volume.
+    It provides a benchmark of the "true" average price for a given period.
+
+    Args:
+        data (dict): A dictionary containing 'market_prices' and 'quantities'.
+    """
+    try:
+        _validate_data(data)
+    except ValueError as e:
+        print(f"Data validation error: {e}")
+        return
+
+    prices = np.array(data['market_prices'])
+    vwap = indicators.vwap(prices, data['quantities'])
+    _show(plot_vwap, prices, vwap, data['commodity'].title())
+
+
+def calculate_and_graph_price_volume_correlation(data: dict):
+    """
+    Calculates Price-Volume correlation and displays it on a scatter plot.
+
+    This helps visualize the relationship between price movements and trading
+    activity. A positive correlation means price tends to rise on higher volume.
+
+    Args:
+        data (dict): A dictionary containing 'market_prices' and 'quantities'.
+    """
+    try:
+        _validate_data(data)
+    except ValueError as e:
+        print(f"Data validation error: {e}")
+        return
+
+    prices = np.array(data['market_prices'])
+    volumes = np.array(data['quantities'])
+    correlation = indicators.price_volume_correlation(prices, volumes)
+    if np.isnan(correlation):
+        correlation = 0
+    _show(plot_price_volume_correlation, prices, volumes, correlation, data['commodity'].title(), figsize=(10, 6))
+
+
+def calculate_and_graph_money_flow_index(data: dict, period: int = 14):
+    """
+    Calculates and graphs the Money Flow Index (MFI).
+
+    MFI is a momentum indicator that uses both price and volume to measure
+    buying and selling pressure. It is often called the volume-weighted RSI.
+    Values above 80 are considered overbought, and below 20 are oversold.
+
+    Note: This calculation uses 'market_prices' as the 'Typical Price'
+    since High and Low prices are not provided.
+
+    Args:
+        data (dict): A dictionary containing 'market_prices' and 'quantities'.
+        period (int): The look-back period for the MFI calculation.
+    """
+    try:
+        _validate_data(data)
+    except ValueError as e:
+        print(f"Data validation error: {e}")
+        return
+
+    if len(data['market_prices']) <= period:
+        print(f"Error: Not enough data for the specified period of {period}. "
+              f"Need at least {period + 1} data points.")
+        return
+
+    mfi = indicators.money_flow_index(data['market_prices'], data['quantities'], period)
+    _show(plot_money_flow_index, mfi, period, data['commodity'].title())
+
+
+def calculate_and_graph_chaikin_money_flow(data: dict, period: int = 20):
+    """
+    Calculates and graphs the Chaikin Money Flow (CMF).
+
+    CMF measures the amount of Money Flow Volume over a specific period.
+    It can be used to confirm trends or signal reversals. Values above zero
+    indicate buying pressure, while values below zero indicate selling pressure.
+
+    *** IMPORTANT NOTE ***
+    This indicator REQUIRES High, Low, Close prices, and Volume.
+    The function will not run without these keys in the input dictionary:
+    'high_prices', 'low_prices', 'close_prices', 'quantities'.
+
+    Args:
+        data (dict): A dictionary containing high, low, close prices and quantities.
+        period (int): The look-back period for the CMF calculation.
+    """
+    try:
+        is_valid, has_ohlc = _validate_data(data)
+        if not has_ohlc:
+            print("--- Chaikin Money Flow Warning ---")
+            print("Calculation skipped: This function requires 'high_prices', 'low_prices', "
+                  "'close_prices', and 'quantities' in the data dictionary.")
+            print("---------------------------------")
+            return
+    except ValueError as e:
+        print(f"Data validation error: {e}")
+        return
+
+    if len(data['close_prices']) < period:
+        print(f"Error: Not enough data for the specified period of {period}. "
+              f"Need at least {period} data points.")
+        return
+
+    cmf = indicators.chaikin_money_flow(data['high_prices'], data['low_prices'], data['close_prices'], data['quantities'], period)
+    _show(plot_chaikin_money_flow, cmf, period, data['commodity'].title())
@@ -0,0 +1,92 @@
+import logging
+import time
+from lib import sharedstate
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter(object):
+    """
+    Token bucket rate limiter enforcing several quotas at once.
+
+    Each limit is a (requests, period_seconds) pair backed by its own bucket,
+    e.g. [(100, 1), (36000, 3600)] for 100 requests/second and 36,000/hour.
+    A request may only go out once every bucket has a token. Bucket levels
+    live in a shared state store, so limiters in other threads or processes
+    that use the same store and key draw from the same quota.
+    """
+
+    def __init__(self, limits, store=None, key='ratelimit'):
+        """
+        Args:
+            limits (list): (requests, period_seconds) pairs to enforce.
+            store (optional): A lib.sharedstate store. Defaults to the process wide memory store.
+            key (str, optional): Name of the quota inside the store.
+        """
+        if not limits:
+            raise ValueError("At least one rate limit is required.")
+        self.limits = [(int(requests), float(period)) for requests, period in limits]
+        self.store = store if store is not None else sharedstate.default_store
+        self.key = key
+
+    def _refill(self, state, now):
+        """
+        Tops up every bucket for the time elapsed since it was last updated.
+        """
+        buckets = state.setdefault('buckets', {})
+        for requests, period in self.limits:
+            name = f"{requests}/{period:g}"
+            tokens, updated = buckets.get(name, (requests, now))
+            tokens = min(requests, tokens + (now - updated) * requests / period)
+            buckets[name] = [tokens, now]
+        return buckets
+
+    def reserve(self):
+        """
+        Takes a token from every bucket if all of them have one.
+
+        Returns:
+            float: 0 if the request may proceed, otherwise the number of seconds
+                   to wait before trying again.
+        """
+        with self.store.locked(self.key) as state:
+            now = time.time()
+            blocked_until = state.get('blocked_until', 0)
+            if blocked_until > now:
+                return blocked_until - now
+
+            buckets = self._refill(state, now)
+            wait = 0
+            for requests, period in self.limits:
+                tokens = buckets[f"{requests}/{period:g}"][0]
+                if tokens < 1:
+                    wait = max(wait, (1 - tokens) * period / requests)
+            if wait:
+                return wait
+
+            for bucket in buckets.values():
+                bucket[0] -= 1
+            return 0
+
+    def acquire(self):
+        """
+        Blocks until a request may be made under every quota.
+        """
+        while True:
+            wait = self.reserve()
+            if not wait:
+                return
+            time.sleep(wait)
+
+    def penalize(self, retry_after):
+        """
+        Pauses every user of this quota, e.g. after the server answered with Retry-After.
+
+        Args:
+            retry_after (float): Seconds from now before the next request may be made.
+        """
+        with self.store.locked(self.key) as state:
+            blocked_until = time.time() + retry_after
+            if blocked_until > state.get('blocked_until', 0):
+                logger.warning(f"WARNING: Rate limit {self.key} paused for {retry_after:.2f} seconds")
+                state['blocked_until'] = blocked_until
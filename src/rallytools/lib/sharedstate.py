@@ -0,0 +1,183 @@
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+
+
+class SharedStateError(Exception):
+    """Base exception class for shared state backends."""
+    pass
+
+
+class MemoryStateStore(object):
+    """
+    Keeps state in a dictionary, with one lock per key.
+    Only shared between threads of the current process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._locks = {}
+        self._state = {}
+
+    @contextmanager
+    def locked(self, key):
+        """
+        Yields the dictionary stored under key while holding an exclusive lock.
+        Changes made to the dictionary are persisted on exit.
+        """
+        with self._lock:
+            key_lock = self._locks.setdefault(key, threading.Lock())
+        with key_lock:
+            state = self._state.setdefault(key, {})
+            yield state
+
+
+class FileStateStore(object):
+    """
+    Keeps each key in a JSON file under `directory`, serialized with an flock.
+    Shared between all processes on the same host.
+    """
+
+    def __init__(self, directory):
+        if fcntl is None:
+            raise SharedStateError("FileStateStore requires fcntl, which is unavailable on this platform.")
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        safe_key = re.sub(r'[^A-Za-z0-9_.-]', '_', key)
+        return os.path.join(self.directory, safe_key)
+
+    @contextmanager
+    def locked(self, key):
+        """
+        Yields the dictionary stored under key while holding an exclusive lock.
+        Changes made to the dictionary are persisted on exit.
+        """
+        path = self._path(key)
+        with open(f"{path}.lock", 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(f"{path}.json") as f:
+                        state = json.load(f)
+                except (FileNotFoundError, ValueError):
+                    state = {}
+
+                yield state
+
+                tmp_path = f"{path}.json.{os.getpid()}.tmp"
+                with open(tmp_path, 'w') as f:
+                    json.dump(state, f)
+                os.replace(tmp_path, f"{path}.json")
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class DjangoCacheStateStore(object):
+    """
+    Keeps state in a Django cache, serialized with an add()-based lock.
+    Shared between every process using the same cache (e.g. redis or memcached).
+
+    The lock expires after LOCK_TIMEOUT_SECONDS in case its holder dies, so
+    nothing slow, in particular no network request, may be done while holding it.
+    """
+
+    # Far longer than reading and writing the state takes, even from a busy cache
+    LOCK_TIMEOUT_SECONDS = 60
+    # Waiters outlast the lock of a holder that died
+    LOCK_WAIT_SECONDS = LOCK_TIMEOUT_SECONDS + 5
+    LOCK_POLL_SECONDS = 0.005
+
+    def __init__(self, alias='default'):
+        from django.core.cache import caches
+        self.cache = caches[alias]
+
+    @contextmanager
+    def locked(self, key):
+        """
+        Yields the dictionary stored under key while holding an exclusive lock.
+        Changes made to the dictionary are persisted on exit.
+        """
+        lock_key = f"{key}:lock"
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.LOCK_WAIT_SECONDS
+        # cache.add is atomic on the shared backends; the lock expires on its own if a holder dies
+        while not self.cache.add(lock_key, token, timeout=self.LOCK_TIMEOUT_SECONDS):
+            if time.monotonic() > deadline:
+                raise SharedStateError(f"Timed out waiting for shared state lock {lock_key}")
+            time.sleep(self.LOCK_POLL_SECONDS)
+
+        try:
+            state = self.cache.get(key) or {}
+            yield state
+            self.cache.set(key, state, timeout=None)
+        finally:
+            if self.cache.get(lock_key) == token:
+                self.cache.delete(lock_key)
+
+
+# Process wide default so every client in a process shares state without configuration
+default_store = MemoryStateStore()
+
+
+class Checkpoint(object):
+    """
+    Remembers how far a job got, so a run that stopped early (e.g. because
+    Battle.net became unavailable) can resume where it left off.
+    """
+
+    def __init__(self, name, store=None):
+        """
+        Args:
+            name (str): Name of the job.
+            store (optional): A state store. Defaults to the process wide memory store;
+                              use a file or cache store to resume across processes.
+        """
+        self.store = store if store is not None else default_store
+        self.key = f"checkpoint:{name}"
+
+    def load(self):
+        """
+        Returns:
+            The saved position, or None if the last run completed.
+        """
+        with self.store.locked(self.key) as state:
+            return state.get('position')
+
+    def save(self, position):
+        with self.store.locked(self.key) as state:
+            state['position'] = position
+
+    def clear(self):
+        with self.store.locked(self.key) as state:
+            state.pop('position', None)
+
+
+def get_store(backend='memory', location=None):
+    """
+    Returns a state store for the named backend.
+
+    Args:
+        backend (str): 'memory', 'file' or 'cache'.
+        location (str, optional): Directory for the 'file' backend, or cache alias
+                                  for the 'cache' backend.
+    """
+    if backend == 'memory':
+        return default_store
+    if backend == 'file':
+        if not location:
+            raise SharedStateError("The file backend requires a directory location.")
+        return FileStateStore(location)
+    if backend == 'cache':
+        return DjangoCacheStateStore(location or 'default')
+    raise SharedStateError(f"Unknown shared state backend: {backend}")
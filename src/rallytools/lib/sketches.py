@@ -0,0 +1,164 @@
+"""
+Mergeable quantile sketches.
+
+A TDigest summarizes a stream of values as at most about compression / 2
+weighted centroids, small near the extremes and large in the middle, so
+tail percentiles stay accurate. Digests merge into a digest of their
+combined streams, which is what lets percentiles over a long range be
+answered from one stored digest per day instead of every observation.
+
+Digests holding at most compression centroids keep every value apart, so
+small streams lose nothing to compression.
+"""
+
+import struct
+import numpy as np
+
+DEFAULT_COMPRESSION = 100
+
+# Serialized form: compression, min and max, then the centroid means (float64) and weights (uint32)
+HEADER = struct.Struct('<Hdd')
+
+
+class TDigest(object):
+    """
+    A merging t-digest (Dunning & Ertl) of weighted values.
+
+    Centroids are merged, in order of their mean, while they fit within one
+    unit of the k1 scale function, k(q) = compression / (2 pi) * asin(2q - 1).
+    New values are buffered as centroids of their own and only compressed
+    once there are more than compression centroids.
+    """
+
+    def __init__(self, compression=DEFAULT_COMPRESSION, means=(), weights=(), min=np.inf, max=-np.inf):
+        """
+        Args:
+            compression (int, optional): Accuracy/size trade-off.  A digest keeps about compression / 2 centroids.
+            means, weights (array-like, optional): Initial centroids.  Weights are counts.
+            min, max (float, optional): Smallest and largest value seen.
+        """
+        self.compression = int(compression)
+        self.means = np.asarray(means, dtype=np.float64)
+        self.weights = np.asarray(weights, dtype=np.int64)
+        self.min = float(min)
+        self.max = float(max)
+
+    def __len__(self):
+        """
+        Number of centroids
+        """
+        return len(self.means)
+
+    @property
+    def count(self):
+        return int(self.weights.sum())
+
+    def add(self, values, weights=None):
+        """
+        Adds values, each counted weights times (once by default)
+        """
+        values = np.atleast_1d(np.asarray(values, dtype=np.float64))
+        weights = np.ones(len(values), dtype=np.int64) if weights is None else np.atleast_1d(np.asarray(weights, dtype=np.int64))
+        if len(values) != len(weights):
+            raise ValueError("values and weights must have the same length.")
+        observed = np.isfinite(values) & (weights > 0)
+        values, weights = values[observed], weights[observed]
+        if not len(values):
+            return self
+
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.means = np.concatenate((self.means, values))
+        self.weights = np.concatenate((self.weights, weights))
+        if len(self.means) > self.compression:
+            self.compress()
+        return self
+
+    def compress(self):
+        """
+        Merges neighbouring centroids that fit within one unit of the scale function
+        """
+        if not len(self.means):
+            return self
+        order = np.argsort(self.means, kind='stable')
+        means, weights = self.means[order], self.weights[order]
+        # Centroids are binned by where their left edge falls on the k scale
+        before = (np.cumsum(weights) - weights) / weights.sum()
+        bins = np.floor(self.compression / (2 * np.pi) * np.arcsin(2 * before - 1))
+        first = np.flatnonzero(np.concatenate(([True], bins[1:] != bins[:-1])))
+        self.weights = np.add.reduceat(weights, first)
+        self.means = np.add.reduceat(means * weights, first) / self.weights
+        return self
+
+    @classmethod
+    def merge(cls, digests, compression=None):
+        """
+        Merges digests into one digest of all their values.
+
+        Args:
+            digests (iterable): TDigests to merge.
+            compression (int, optional): Compression of the result.  Defaults to the largest of digests.
+        """
+        digests = list(digests)
+        if compression is None:
+            compression = max((digest.compression for digest in digests), default=DEFAULT_COMPRESSION)
+        merged = cls(
+            compression,
+            means=np.concatenate([digest.means for digest in digests]) if digests else (),
+            weights=np.concatenate([digest.weights for digest in digests]) if digests else (),
+            min=min((digest.min for digest in digests), default=np.inf),
+            max=max((digest.max for digest in digests), default=-np.inf),
+        )
+        if len(merged) > compression:
+            merged.compress()
+        return merged
+
+    def quantile(self, q):
+        """
+        Estimated value below which a fraction q of the values fall.
+
+        Interpolates between centroid means, each placed at the middle of its
+        weight, and the smallest and largest value at 0 and 1.
+
+        Args:
+            q (float or array-like): Quantiles, between 0 and 1.
+
+        Returns:
+            float or numpy.ndarray: The estimates, NaN for an empty digest.
+        """
+        q = np.asarray(q, dtype=np.float64)
+        if np.any((q < 0) | (q > 1)):
+            raise ValueError("Quantiles must be between 0 and 1.")
+        if not len(self.means):
+            return np.full(q.shape, np.nan)[()]
+        order = np.argsort(self.means, kind='stable')
+        means, weights = self.means[order], self.weights[order]
+        total = weights.sum()
+        centers = np.cumsum(weights) - weights / 2
+        positions = np.concatenate(([0], centers, [total]))
+        values = np.concatenate(([self.min], means, [self.max]))
+        return np.interp(q * total, positions, values)[()]
+
+    def to_bytes(self):
+        """
+        Compact serialized form, see from_bytes
+        """
+        return (
+            HEADER.pack(self.compression, self.min, self.max)
+            + self.means.astype('<f8').tobytes()
+            + self.weights.astype('<u4').tobytes()
+        )
+
+    @classmethod
+    def from_bytes(cls, data):
+        data = bytes(data)
+        compression, minimum, maximum = HEADER.unpack_from(data)
+        body = memoryview(data)[HEADER.size:]
+        num_centroids = len(body) // 12
+        return cls(
+            compression,
+            means=np.frombuffer(body[:num_centroids * 8], dtype='<f8'),
+            weights=np.frombuffer(body[num_centroids * 8:], dtype='<u4'),
+            min=minimum,
+            max=maximum,
+        )
@@ -0,0 +1,127 @@
+import json
+import logging
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl
+from lib.transport import FixtureStore, REPLAY_TOKEN
+
+logger = logging.getLogger(__name__)
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Serves recorded fixtures as if it were the Battle.net API.
+    Behaviour is configured on the server instance (see BattleNetStandInServer).
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def _send(self, status, body=b'', headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body and self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def do_POST(self):
+        # Drain the form body so the connection can be kept alive
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self._send(200, json.dumps(REPLAY_TOKEN).encode('utf-8'), {'Content-Type': 'application/json'})
+
+    def do_GET(self):
+        server = self.server
+        parts = urlsplit(self.path)
+        params = dict(parse_qsl(parts.query))
+
+        if server.latency:
+            time.sleep(server.latency)
+
+        outcome = server.draw()
+        if outcome < server.throttle_rate:
+            self._send(429, b'', {'Retry-After': f"{server.retry_after:g}"})
+            return
+        if outcome < server.throttle_rate + server.error_rate:
+            self._send(502)
+            return
+
+        recorded = server.store.load('GET', parts.path, params)
+        if recorded is None:
+            self._send(404, json.dumps({'code': 404, 'type': 'BLZWEBAPI00000404', 'detail': 'Not Found'}).encode('utf-8'),
+                       {'Content-Type': 'application/json'})
+            return
+
+        meta, body = recorded
+        headers = dict(meta['headers'])
+        if headers.get('ETag') and self.headers.get('If-None-Match') == headers['ETag']:
+            self._send(304, b'', headers)
+            return
+        if headers.get('Last-Modified') and self.headers.get('If-Modified-Since') == headers['Last-Modified']:
+            self._send(304, b'', headers)
+            return
+        self._send(meta['status'], body, headers)
+
+    def log_message(self, format, *args):
+        logger.debug(f"DEBUG: stand-in {self.address_string()} {format % args}")
+
+
+class BattleNetStandInServer(ThreadingHTTPServer):
+    """
+    Local HTTP server standing in for Battle.net, for offline benchmarks and load tests.
+
+    Answers token requests with a fixed token and GET requests from a fixture
+    directory written by lib.transport.RecordingTransport. Latency, bad gateway
+    errors and throttling (429 with Retry-After) can be injected. Injected
+    faults are drawn from a seeded generator, so runs are reproducible.
+
+    Point a client at it with BattleNetAPI(..., api_host=server.url,
+    token_url=f"{server.url}/oauth/token").
+    """
+
+    daemon_threads = True
+
+    def __init__(self, fixture_dir, host='127.0.0.1', port=0, latency=0.0, error_rate=0.0,
+                 throttle_rate=0.0, retry_after=1.0, seed=None):
+        """
+        Args:
+            fixture_dir (str): Directory of recorded fixtures.
+            host (str, optional): Interface to bind.
+            port (int, optional): Port to bind. 0 picks a free port.
+            latency (float, optional): Seconds added to every GET.
+            error_rate (float, optional): Fraction of GETs answered with 502.
+            throttle_rate (float, optional): Fraction of GETs answered with 429.
+            retry_after (float, optional): Retry-After seconds sent with injected 429s.
+            seed (int, optional): Seed for fault injection.
+        """
+        super().__init__((host, port), StandInHandler)
+        self.store = FixtureStore(fixture_dir)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def draw(self):
+        with self._random_lock:
+            return self._random.random()
+
+    def start(self):
+        """
+        Serves from a background thread. Returns the thread.
+        """
+        thread = threading.Thread(target=self.serve_forever, name='battlenet-standin', daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
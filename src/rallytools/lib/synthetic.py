@@ -0,0 +1,133 @@
+"""
+Synthetic commodities snapshots, for benchmarks and load tests.
+
+Listings are shaped like the real auction house: a few popular items hold
+most of the listings (Zipf), item prices span several orders of magnitude
+(lognormal), listings of an item undercut each other just above its going
+price with a long tail of overpriced ones, a small fraction are absurd
+outliers, and most listings are of a handful of units while a few sellers
+post thousands.
+
+Every generator takes a seed, so the same arguments always produce the same
+snapshot.
+"""
+
+import json
+import numpy as np
+from lib.market import CommodityListings
+
+# Item ids are drawn from the range commodities actually use
+ITEM_ID_RANGE = (2000, 250000)
+
+# Battle.net prices commodities in whole silver (100 copper)
+PRICE_STEP = 100
+
+MAX_QUANTITY = 20000
+
+FIRST_AUCTION_ID = 2000000000
+
+
+def _prices(rng, base_price, outlier_rate):
+    """
+    Unit prices of listings of items with the given going prices
+    """
+    # Most listings sit within a few percent of the going price, some far above it
+    prices = base_price * (1 + rng.exponential(0.04, len(base_price)) + rng.pareto(3.0, len(base_price)) * 0.05)
+    outliers = rng.random(len(prices)) < outlier_rate
+    prices[outliers] *= rng.uniform(5, 100, outliers.sum())
+    return np.maximum(np.round(prices / PRICE_STEP), 1).astype(np.int64) * PRICE_STEP
+
+
+def _quantities(rng, size):
+    """
+    Heavy tailed listing quantities: mostly small stacks, a few bulk sellers
+    """
+    return np.minimum(rng.zipf(1.6, size), MAX_QUANTITY).astype(np.int64)
+
+
+def generate_listings(num_listings=100000, num_items=5000, seed=0, outlier_rate=0.01, median_price=5000,
+                      price_sigma=2.0, popularity=1.1):
+    """
+    Generates a commodities snapshot.
+
+    Args:
+        num_listings (int, optional): Number of listings.
+        num_items (int, optional): Number of distinct items.  Each is listed at least once.
+        seed (int, optional): Seed of the random generator.
+        outlier_rate (float, optional): Fraction of listings priced 5 to 100 times the item's going price.
+        median_price (int, optional): Median going price of an item, in copper.
+        price_sigma (float, optional): Spread of going prices across items (sigma of their log).
+        popularity (float, optional): Zipf exponent of how listings are spread across items.
+
+    Returns:
+        CommodityListings: The listings, in increasing auction id order, items interleaved.
+    """
+    if num_items < 1 or num_listings < num_items:
+        raise ValueError(f"Need at least one item and one listing per item, got {num_items} items and {num_listings} listings")
+    if num_items > ITEM_ID_RANGE[1] - ITEM_ID_RANGE[0]:
+        raise ValueError(f"At most {ITEM_ID_RANGE[1] - ITEM_ID_RANGE[0]} items can be generated")
+
+    rng = np.random.default_rng(seed)
+    item_ids = np.sort(rng.choice(np.arange(*ITEM_ID_RANGE), num_items, replace=False))
+    base_prices = np.exp(rng.normal(np.log(median_price), price_sigma, num_items))
+
+    weights = 1.0 / np.arange(1, num_items + 1) ** popularity
+    rng.shuffle(weights)
+    counts = 1 + rng.multinomial(num_listings - num_items, weights / weights.sum())
+
+    item_index = rng.permutation(np.repeat(np.arange(num_items), counts))
+    return CommodityListings(
+        auction_id=FIRST_AUCTION_ID + np.cumsum(rng.integers(1, 20, num_listings)),
+        item_id=item_ids[item_index],
+        unit_price=_prices(rng, base_prices[item_index], outlier_rate),
+        quantity=_quantities(rng, num_listings),
+    )
+
+
+def next_listings(listings, seed=0, sold_rate=0.1, partial_rate=0.05, new_rate=0.1, outlier_rate=0.01):
+    """
+    Generates the snapshot following listings, as Battle.net would an hour later.
+
+    Some listings sell out or expire, some sell part of their quantity, and new
+    ones are posted around the price of a listing of the same item.
+
+    Args:
+        listings (CommodityListings): The previous snapshot.
+        seed (int, optional): Seed of the random generator.
+        sold_rate (float, optional): Fraction of listings gone.
+        partial_rate (float, optional): Fraction of the remaining listings of several units that sell some of them.
+        new_rate (float, optional): New listings, as a fraction of the previous snapshot's.
+        outlier_rate (float, optional): Fraction of new listings that are outliers.
+
+    Returns:
+        CommodityListings: The next snapshot, in increasing auction id order.
+    """
+    rng = np.random.default_rng(seed)
+    kept = listings.take(rng.random(len(listings)) >= sold_rate)
+
+    quantity = kept.quantity.copy()
+    partial = (rng.random(len(kept)) < partial_rate) & (quantity > 1)
+    quantity[partial] -= rng.integers(1, quantity[partial])
+    kept = CommodityListings(kept.auction_id, kept.item_id, kept.unit_price, quantity)
+
+    num_new = int(len(listings) * new_rate)
+    templates = rng.integers(0, len(listings), num_new)
+    new = CommodityListings(
+        auction_id=listings.auction_id.max(initial=FIRST_AUCTION_ID) + np.cumsum(rng.integers(1, 20, num_new)),
+        item_id=listings.item_id[templates],
+        unit_price=_prices(rng, listings.unit_price[templates] * rng.uniform(0.95, 1.0, num_new), outlier_rate),
+        quantity=_quantities(rng, num_new),
+    )
+    return CommodityListings(*[np.concatenate((getattr(kept, column), getattr(new, column))) for column in CommodityListings.COLUMNS])
+
+
+def commodities_body(listings):
+    """
+    Listings as the JSON body of Battle.net's commodities endpoint
+    """
+    columns = [getattr(listings, column).tolist() for column in CommodityListings.COLUMNS]
+    auctions = [
+        {'id': auction_id, 'item': {'id': item_id}, 'quantity': quantity, 'unit_price': unit_price, 'time_left': 'SHORT'}
+        for auction_id, item_id, unit_price, quantity in zip(*columns)
+    ]
+    return json.dumps({'_links': {'self': {'href': 'https://us.api.blizzard.com/data/wow/auctions/commodities'}}, 'auctions': auctions}).encode()
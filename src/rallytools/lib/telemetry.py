@@ -0,0 +1,130 @@
+import bisect
+import threading
+
+# Upper bounds (milliseconds) of the latency histogram buckets; slower requests land in an overflow bucket
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class EndpointStats(object):
+    """
+    Counters for one endpoint template.
+    """
+
+    __slots__ = ('count', 'errors', 'retries', 'throttled', 'bad_gateway', 'cache_hits',
+                 'bytes', 'latency_total', 'latency_max', 'latency_buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.retries = 0
+        self.throttled = 0
+        self.bad_gateway = 0
+        self.cache_hits = 0
+        self.bytes = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.latency_buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def snapshot(self):
+        histogram = {f"<={bound}": n for bound, n in zip(LATENCY_BUCKETS_MS, self.latency_buckets)}
+        histogram[f">{LATENCY_BUCKETS_MS[-1]}"] = self.latency_buckets[-1]
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'retries': self.retries,
+            'throttled': self.throttled,
+            'bad_gateway': self.bad_gateway,
+            'cache_hits': self.cache_hits,
+            'bytes': self.bytes,
+            'latency_ms': {
+                'total': round(self.latency_total, 3),
+                'mean': round(self.latency_total / self.count, 3) if self.count else 0,
+                'max': round(self.latency_max, 3),
+                'histogram': histogram,
+            },
+        }
+
+
+class ClientTelemetry(object):
+    """
+    Per endpoint request telemetry for an API client: request counts, a latency
+    histogram, response bytes, retries, 429/502 counts and cache hits.
+
+    Recording is a dictionary lookup and a few integer increments under a lock,
+    cheap enough to leave on in production.
+    """
+
+    def __init__(self, callback=None):
+        """
+        Args:
+            callback (callable, optional): Called as callback(template, event) after every
+                                           recorded event, e.g. to forward metrics elsewhere.
+        """
+        self.callback = callback
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def _get(self, template):
+        stats = self._endpoints.get(template)
+        if stats is None:
+            stats = self._endpoints[template] = EndpointStats()
+        return stats
+
+    def record_request(self, template, latency_ms, status=None, response_bytes=0, retry=False):
+        """
+        Records one HTTP request.
+
+        Args:
+            template (str): Endpoint template, e.g. '/data/wow/item/{id}'.
+            latency_ms (float): Time until the response headers arrived.
+            status (int, optional): Response status. None if the request failed without a response.
+            response_bytes (int, optional): Size of the response body.
+            retry (bool, optional): Whether the request was a retry of an earlier attempt.
+        """
+        with self._lock:
+            stats = self._get(template)
+            stats.count += 1
+            stats.bytes += response_bytes
+            stats.latency_total += latency_ms
+            if latency_ms > stats.latency_max:
+                stats.latency_max = latency_ms
+            stats.latency_buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, latency_ms)] += 1
+            if retry:
+                stats.retries += 1
+            if status is None or status >= 400:
+                stats.errors += 1
+            if status == 429:
+                stats.throttled += 1
+            elif status == 502:
+                stats.bad_gateway += 1
+
+        if self.callback is not None:
+            self.callback(template, {
+                'type': 'request',
+                'latency_ms': latency_ms,
+                'status': status,
+                'bytes': response_bytes,
+                'retry': retry,
+            })
+
+    def record_cache_hit(self, template):
+        """
+        Records a response served from a cache (e.g. after a 304 Not Modified).
+        """
+        with self._lock:
+            self._get(template).cache_hits += 1
+
+        if self.callback is not None:
+            self.callback(template, {'type': 'cache_hit'})
+
+    def stats(self):
+        """
+        Returns:
+            dict: A snapshot of the counters, keyed by endpoint template.
+        """
+        with self._lock:
+            return {template: stats.snapshot() for template, stats in sorted(self._endpoints.items())}
+
+    def reset(self):
+        with self._lock:
+            self._endpoints = {}
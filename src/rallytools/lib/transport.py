@@ -0,0 +1,242 @@
+import hashlib
+import http
+import io
+import json
+import logging
+import os
+from urllib.parse import urlsplit, parse_qsl
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+# Response headers worth keeping in a fixture; everything else is connection specific
+RECORDED_HEADERS = ['Content-Type', 'ETag', 'Last-Modified', 'Retry-After', 'Battlenet-Namespace']
+
+# Request headers RecordingTransport drops, so that fixtures always hold a full body instead of a 304
+CONDITIONAL_HEADERS = ['If-None-Match', 'If-Modified-Since']
+
+# Token handed out by ReplayTransport and the stand-in server
+REPLAY_TOKEN = {'access_token': 'replay-token', 'token_type': 'bearer', 'expires_in': 86399}
+
+
+class TransportError(Exception):
+    """Base exception class for transport errors."""
+    pass
+
+
+class LiveTransport(object):
+    """
+    Sends requests over the network through a pooled keep-alive session.
+    """
+
+    def __init__(self, pool_size=10):
+        """
+        Args:
+            pool_size (int, optional): Maximum number of keep-alive connections kept open per host.
+        """
+        self.session = requests.Session()
+        # Retries are handled by the API clients, so the adapter itself never retries
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'Accept': 'application/json',
+            'Accept-Encoding': 'gzip, deflate',
+        })
+
+    def request(self, method, url, **kwargs):
+        """
+        Sends a request. Accepts the same keyword arguments as requests.Session.request.
+
+        Returns:
+            requests.Response: The response.
+        """
+        return self.session.request(method, url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+class FixtureStore(object):
+    """
+    Directory of recorded responses, one <key>.json metadata file and one
+    <key>.body file per request. Keys ignore the host, so fixtures recorded
+    against Battle.net can be replayed against the stand-in server.
+    """
+
+    def __init__(self, directory):
+        self.directory = str(directory)
+
+    @staticmethod
+    def make_key(method, path, params):
+        normalized = sorted((str(k), str(v)) for k, v in (params or {}).items())
+        raw = json.dumps([method.upper(), path.lower(), normalized])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def split_url(url, params=None):
+        """
+        Returns the path and merged query parameters of a url.
+        """
+        parts = urlsplit(url)
+        merged = dict(parse_qsl(parts.query))
+        merged.update(params or {})
+        return parts.path, merged
+
+    def _paths(self, key):
+        base = os.path.join(self.directory, key)
+        return f"{base}.json", f"{base}.body"
+
+    def load(self, method, path, params):
+        """
+        Returns:
+            tuple: (metadata dict, body bytes), or None if nothing was recorded.
+        """
+        meta_path, body_path = self._paths(self.make_key(method, path, params))
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            with open(body_path, 'rb') as f:
+                body = f.read()
+        except FileNotFoundError:
+            return None
+        return meta, body
+
+    def save(self, method, path, params, status, headers, body):
+        os.makedirs(self.directory, exist_ok=True)
+        meta_path, body_path = self._paths(self.make_key(method, path, params))
+        meta = {
+            'method': method.upper(),
+            'path': path,
+            'params': {str(k): str(v) for k, v in (params or {}).items()},
+            'status': status,
+            'headers': {name: headers[name] for name in RECORDED_HEADERS if name in headers},
+        }
+        with open(body_path, 'wb') as f:
+            f.write(body)
+        with open(meta_path, 'w') as f:
+            json.dump(meta, f, indent=2)
+
+
+class RecordingTransport(object):
+    """
+    Sends GET requests through another transport and saves their successful
+    responses to disk. Token requests pass through without being recorded so
+    that credentials never end up in fixtures.
+
+    Conditional request headers are dropped, so a client revalidating its HTTP
+    cache still records the full body rather than an empty 304. Throttled and
+    failed responses are never saved, so a transient error can't replace a
+    good fixture.
+    """
+
+    def __init__(self, directory, transport=None):
+        """
+        Args:
+            directory (str): Where fixtures are written.
+            transport (optional): Transport that performs the requests. Defaults to LiveTransport.
+        """
+        self.store = FixtureStore(directory)
+        self.transport = transport if transport is not None else LiveTransport()
+
+    def request(self, method, url, **kwargs):
+        if method.upper() != 'GET':
+            return self.transport.request(method, url, **kwargs)
+
+        headers = CaseInsensitiveDict(kwargs.get('headers') or {})
+        for name in CONDITIONAL_HEADERS:
+            headers.pop(name, None)
+        kwargs['headers'] = headers
+        response = self.transport.request(method, url, **kwargs)
+        if 200 <= response.status_code < 300:
+            path, params = self.store.split_url(url, kwargs.get('params'))
+            # Reading content also keeps it available for streaming consumers
+            self.store.save(method, path, params, response.status_code, response.headers, response.content)
+        else:
+            logger.warning(f"WARNING: Not recording {method} {url}, it answered {response.status_code}")
+        return response
+
+    def close(self):
+        self.transport.close()
+
+
+def build_response(method, url, status, headers, body):
+    """
+    Builds a requests.Response from recorded parts, so clients can't tell it apart
+    from a live one.
+    """
+    response = requests.Response()
+    response.status_code = status
+    response.headers = CaseInsensitiveDict(headers)
+    response._content = body
+    # The body is already in memory: streaming consumers read it from _content, and close() has nothing to release
+    response._content_consumed = True
+    response.raw = io.BytesIO(body)
+    response.url = url
+    response.encoding = 'utf-8'
+    try:
+        response.reason = http.HTTPStatus(status).phrase
+    except ValueError:
+        response.reason = ''
+    response.request = requests.Request(method, url).prepare()
+    return response
+
+
+class ReplayTransport(object):
+    """
+    Answers requests from fixtures recorded by RecordingTransport, without
+    touching the network. Token requests always succeed.
+    """
+
+    def __init__(self, directory, missing_status=404):
+        """
+        Args:
+            directory (str): Where fixtures are read from.
+            missing_status (int, optional): Status returned for requests with no fixture.
+        """
+        self.store = FixtureStore(directory)
+        self.missing_status = missing_status
+
+    def request(self, method, url, **kwargs):
+        if method.upper() == 'POST':
+            return build_response(method, url, 200, {'Content-Type': 'application/json'}, json.dumps(REPLAY_TOKEN).encode('utf-8'))
+
+        path, params = self.store.split_url(url, kwargs.get('params'))
+        recorded = self.store.load(method, path, params)
+        if recorded is None:
+            logger.warning(f"WARNING: No fixture recorded for {method} {path} {params}")
+            return build_response(method, url, self.missing_status, {}, b'')
+
+        meta, body = recorded
+        headers = meta['headers']
+        request_headers = CaseInsensitiveDict(kwargs.get('headers') or {})
+        if headers.get('ETag') and request_headers.get('If-None-Match') == headers['ETag']:
+            return build_response(method, url, 304, headers, b'')
+        if headers.get('Last-Modified') and request_headers.get('If-Modified-Since') == headers['Last-Modified']:
+            return build_response(method, url, 304, headers, b'')
+        return build_response(method, url, meta['status'], headers, body)
+
+    def close(self):
+        pass
+
+
+def get_transport(mode='live', directory=None, pool_size=10):
+    """
+    Returns a transport for the named mode.
+
+    Args:
+        mode (str): 'live', 'record' or 'replay'.
+        directory (str, optional): Fixture directory, required for 'record' and 'replay'.
+        pool_size (int, optional): Connection pool size for network transports.
+    """
+    if mode == 'live':
+        return LiveTransport(pool_size=pool_size)
+    if mode in ('record', 'replay') and not directory:
+        raise TransportError(f"The {mode} transport requires a fixture directory.")
+    if mode == 'record':
+        return RecordingTransport(directory, LiveTransport(pool_size=pool_size))
+    if mode == 'replay':
+        return ReplayTransport(directory)
+    raise TransportError(f"Unknown transport: {mode}")
@@ -1,5 +1,7 @@
 import requests
 import json
+import time
+from lib.telemetry import ClientTelemetry
 
 class WarcraftLogsAPI:
     """
@@ -16,18 +18,41 @@ class WarcraftLogsAPI:
         api_endpoint (str): The URL of the Warcraft Logs GraphQL API endpoint.
     """
 
-    def __init__(self, client_id, client_secret):
+    def __init__(self, client_id, client_secret, telemetry_callback=None):
         """
         Initializes the WarcraftLogsAPI client.
 
         Args:
             client_id (str): Your Warcraft Logs API client ID.
             client_secret (str): Your Warcraft Logs API client secret.
+            telemetry_callback (callable, optional): Called as callback(operation, event) for every request.
         """
         self.client_id = client_id
         self.client_secret = client_secret
         self.access_token = None
         self.api_endpoint = "https://www.warcraftlogs.com/api/v2/client"
+        self.telemetry = ClientTelemetry(callback=telemetry_callback)
+
+    def stats(self):
+        """
+        Returns a snapshot of per operation telemetry: request count, latency histogram,
+        response bytes and error counts.
+        """
+        return self.telemetry.stats()
+
+    def _post(self, operation, url, **kwargs):
+        """
+        Sends a POST request, recording it under the given operation name.
+        """
+        started = time.perf_counter()
+        try:
+            response = requests.post(url, **kwargs)
+        except requests.exceptions.RequestException:
+            self.telemetry.record_request(operation, (time.perf_counter() - started) * 1000)
+            raise
+        self.telemetry.record_request(operation, (time.perf_counter() - started) * 1000,
+                                      status=response.status_code, response_bytes=len(response.content))
+        return response
 
     def get_access_token(self):
         """
@@ -41,7 +66,7 @@ class WarcraftLogsAPI:
             "grant_type": "client_credentials"
         }
         try:
-            response = requests.post(token_url, data=data, auth=(self.client_id, self.client_secret))
+            response = self._post('oauth/token', token_url, data=data, auth=(self.client_id, self.client_secret))
             response.raise_for_status()  # Raise an exception for bad status codes
             self.access_token = response.json().get("access_token")
             print("Successfully obtained access token.")
@@ -50,13 +75,14 @@ class WarcraftLogsAPI:
             self.access_token = None
 
 
-    def execute_query(self, query, variables=None):
+    def execute_query(self, query, variables=None, operation='query'):
         """
         Executes a GraphQL query against the Warcraft Logs API.
 
         Args:
             query (str): The GraphQL query string.
             variables (dict, optional): A dictionary of variables for the query.
+            operation (str, optional): Name the request is recorded under in stats().
 
         Returns:
             dict: The JSON response from the API, or None if an error occurs.
@@ -76,7 +102,7 @@ class WarcraftLogsAPI:
             payload["variables"] = variables
 
         try:
-            response = requests.post(self.api_endpoint, headers=headers, data=json.dumps(payload))
+            response = self._post(operation, self.api_endpoint, headers=headers, data=json.dumps(payload))
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -116,7 +142,7 @@ class WarcraftLogsAPI:
             }
         """
         variables = {"report_code": report_code}
-        return self.execute_query(query, variables)
+        return self.execute_query(query, variables, operation='get_report')
 
 
     def get_fight(self, report_code, fight_id):
@@ -147,7 +173,7 @@ class WarcraftLogsAPI:
             }
         """
         variables = {"report_code": report_code, "fight_id": [fight_id]}
-        return self.execute_query(query, variables)
+        return self.execute_query(query, variables, operation='get_fight')
 
     def get_character_rankings(self, character_name, server_name, server_region):
         """
@@ -178,4 +204,4 @@ class WarcraftLogsAPI:
             "server_name": server_name.lower().replace(" ", "-"), # Server slug format
             "server_region": server_region
         }
-        return self.execute_query(query, variables)
+        return self.execute_query(query, variables, operation='get_character_rankings')
@@ -0,0 +1,132 @@
+import threading
+from rallytools import settings
+from lib import battlenet, sharedstate, transport
+from lib.circuitbreaker import CircuitBreaker
+from lib.httpcache import HTTPCache
+
+# Pick the JSON decoder once, at startup
+battlenet.set_json_backend(settings.BATTLENET_JSON_BACKEND)
+
+
+def get_shared_state_store():
+    """
+    Returns the store configured to share Battle.net client state (OAuth tokens
+    and rate limits) between processes
+    """
+    return sharedstate.get_store(
+        settings.BATTLENET_SHARED_STATE_BACKEND,
+        settings.BATTLENET_SHARED_STATE_LOCATION
+    )
+
+
+def get_http_cache():
+    """
+    Returns the persistent cache for static namespace responses, or None if disabled
+    """
+    if not settings.BATTLENET_HTTP_CACHE_PATH:
+        return None
+    return HTTPCache(settings.BATTLENET_HTTP_CACHE_PATH)
+
+
+def get_battlenet_client(region=None):
+    """
+    Builds a pooled, rate limited BattleNetAPI client from settings, for region or the first of BATTLENET_REGIONS.
+    Each client gets its own retry budget, so one is built per import job
+    """
+    region = region or settings.BATTLENET_REGIONS[0]
+    state_store = get_shared_state_store()
+    return battlenet.BattleNetAPI(
+        settings.BATTLENET_CLIENT_ID,
+        settings.BATTLENET_CLIENT_SECRET,
+        region=region,
+        pool_size=settings.BATTLENET_POOL_SIZE,
+        connect_timeout=settings.BATTLENET_CONNECT_TIMEOUT,
+        read_timeout=settings.BATTLENET_READ_TIMEOUT,
+        state_store=state_store,
+        http_cache=get_http_cache(),
+        transport=transport.get_transport(
+            settings.BATTLENET_TRANSPORT,
+            settings.BATTLENET_FIXTURE_DIR,
+            pool_size=settings.BATTLENET_POOL_SIZE
+        ),
+        api_host=settings.BATTLENET_API_HOST,
+        token_url=settings.BATTLENET_TOKEN_URL,
+        circuit_breaker=CircuitBreaker(
+            failure_rate=settings.BATTLENET_CIRCUIT_FAILURE_RATE,
+            min_requests=settings.BATTLENET_CIRCUIT_MIN_REQUESTS,
+            window_seconds=settings.BATTLENET_CIRCUIT_WINDOW_SECONDS,
+            open_seconds=settings.BATTLENET_CIRCUIT_OPEN_SECONDS,
+            store=state_store,
+            key=f"battlenet-circuit:{settings.BATTLENET_CLIENT_ID}:{region}"
+        ),
+        retry_budget=settings.BATTLENET_RETRY_BUDGET
+    )
+
+
+class BattleNetClients(object):
+    """
+    Registry handing out one pooled, rate limited BattleNetAPI client per region,
+    built on first use.  Each region's client has its own connection pool, rate
+    limit quota and circuit breaker, so work for one region never waits behind another.
+    Pass one registry to several importers and they share its clients, and so their
+    connections and token, instead of each building their own.
+    """
+
+    def __init__(self, regions=None, client_factory=None):
+        """
+        regions defaults to BATTLENET_REGIONS; its first entry is the default region.
+        client_factory builds the client of a region, get_battlenet_client by default
+        """
+        self.regions = list(regions or settings.BATTLENET_REGIONS)
+        self.default_region = self.regions[0]
+        self.client_factory = client_factory or get_battlenet_client
+        self._clients = {}
+        self._async_clients = {}
+        self._lock = threading.Lock()
+
+    def get(self, region=None):
+        """
+        Returns the client for region, or for the default region.
+        Regions outside BATTLENET_REGIONS are served too, e.g. for a guild in another region
+        """
+        region = (region or self.default_region).lower()
+        with self._lock:
+            if region not in self._clients:
+                self._clients[region] = self.client_factory(region)
+            return self._clients[region]
+
+    def get_async(self, region=None):
+        """
+        Returns an AsyncBattleNetAPI sharing the region's client
+        """
+        client = self.get(region)
+        with self._lock:
+            if client.region not in self._async_clients:
+                self._async_clients[client.region] = battlenet.AsyncBattleNetAPI.from_client(
+                    client,
+                    max_concurrency=settings.BATTLENET_MAX_CONCURRENCY
+                )
+            return self._async_clients[client.region]
+
+    def stats(self):
+        """
+        Per endpoint telemetry of every client built so far, keyed by region
+        """
+        with self._lock:
+            clients = dict(self._clients)
+        return {region: client.stats() for region, client in sorted(clients.items())}
+
+    def close(self):
+        """
+        Closes every client built so far.  Clients asked for afterwards are built anew
+        """
+        with self._lock:
+            clients = list(self._clients.values())
+            async_clients = list(self._async_clients.values())
+            self._clients = {}
+            self._async_clients = {}
+        # Async clients only own their worker threads; the clients they wrap are closed below
+        for async_client in async_clients:
+            async_client.close()
+        for client in clients:
+            client.close()
@@ -0,0 +1,69 @@
+import json
+import time
+from django.core.management.base import BaseCommand, CommandError
+from lib import battlenet
+
+
+class Command(BaseCommand):
+    """
+    """
+    help = "Compares JSON decoding backends on a recorded commodities dump"
+
+    def add_arguments(self, parser):
+        """
+        """
+        parser.add_argument(
+            "--dump",
+            action="store",
+            required=True,
+            help="Commodities response body, e.g. the .body fixture recorded with BATTLENET_TRANSPORT=record"
+        )
+
+        parser.add_argument(
+            "--repeat",
+            action="store",
+            type=int,
+            default=5,
+            help="Runs per backend.  The fastest run is reported"
+        )
+
+    def handle(self, *args, **options):
+        """
+        """
+        try:
+            with open(options['dump'], 'rb') as f:
+                body = f.read()
+        except OSError as e:
+            raise CommandError(f"Can't read {options['dump']}: {e}")
+
+        def stream(data):
+            chunks = (data[i:i + battlenet.STREAM_CHUNK_SIZE] for i in range(0, len(data), battlenet.STREAM_CHUNK_SIZE))
+            return list(battlenet.iter_json_array(chunks, 'auctions'))
+
+        candidates = {
+            # What requests' response.json() does: decode to str first, then parse
+            'json (str)': lambda data: json.loads(data.decode('utf-8')),
+            # Incremental parser used when BATTLENET_STREAM_COMMODITIES is on
+            'stream': stream,
+        }
+        for name, loads in battlenet.JSON_BACKENDS.items():
+            if loads is not None:
+                candidates[name] = loads
+
+        megabytes = len(body) / (1 << 20)
+        results = {'size_mb': round(megabytes, 2), 'selected_backend': battlenet.JSON_BACKEND, 'backends': {}}
+        for name, loads in candidates.items():
+            timings = []
+            for _ in range(max(1, options['repeat'])):
+                started = time.perf_counter()
+                decoded = loads(body)
+                timings.append(time.perf_counter() - started)
+                del decoded
+            best = min(timings)
+            results['backends'][name] = {
+                'best_seconds': round(best, 4),
+                'mean_seconds': round(sum(timings) / len(timings), 4),
+                'mb_per_second': round(megabytes / best, 1) if best else None,
+            }
+
+        self.stdout.write(self.style.SUCCESS(results))
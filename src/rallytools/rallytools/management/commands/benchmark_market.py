@@ -0,0 +1,174 @@
+import json
+from datetime import datetime, timezone
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from lib import synthetic
+from auctionhouse import benchmark
+
+
+class Command(BaseCommand):
+    """
+    """
+    help = "Benchmarks market analysis, indicators and, optionally, the commodity import on synthetic snapshots"
+
+    def add_arguments(self, parser):
+        """
+        """
+        parser.add_argument(
+            "--listings",
+            action="store",
+            type=int,
+            default=100000,
+            help="Listings per snapshot, up to 500000 like the largest live snapshots"
+        )
+
+        parser.add_argument(
+            "--items",
+            action="store",
+            type=int,
+            default=5000,
+            help="Distinct items per snapshot"
+        )
+
+        parser.add_argument(
+            "--outlier-rate",
+            action="store",
+            type=float,
+            default=0.01,
+            help="Fraction of listings priced far above their item's going price"
+        )
+
+        parser.add_argument(
+            "--seed",
+            action="store",
+            type=int,
+            default=0,
+            help="Seed of the synthetic snapshots.  The same seed generates the same snapshots"
+        )
+
+        parser.add_argument(
+            "--repeat",
+            action="store",
+            type=int,
+            default=3,
+            help="Runs per stage.  The fastest run is compared"
+        )
+
+        parser.add_argument(
+            "--workers",
+            action="store",
+            type=int,
+            default=0,
+            help="Processes for the analyze_parallel stage.  0 for one per core"
+        )
+
+        parser.add_argument(
+            "--stages",
+            action="store",
+            required=False,
+            help=f"Comma separated analysis stages to run.  Defaults to all of {','.join(benchmark.ANALYSIS_STAGES)}"
+        )
+
+        parser.add_argument(
+            "--import",
+            action="store_true",
+            dest="import",
+            help="Also time the commodity import, into a throwaway test database"
+        )
+
+        parser.add_argument(
+            "--snapshots",
+            action="store",
+            type=int,
+            default=3,
+            help="Snapshots to import with --import.  All but the first are incremental imports"
+        )
+
+        parser.add_argument(
+            "--output",
+            action="store",
+            required=False,
+            help="Also write the results to this JSON file"
+        )
+
+        parser.add_argument(
+            "--baseline",
+            action="store",
+            required=False,
+            help="Results of an earlier run to compare with.  Fails if any stage got slower than --tolerance allows"
+        )
+
+        parser.add_argument(
+            "--tolerance",
+            action="store",
+            type=float,
+            default=0.2,
+            help="How much slower than the baseline a stage may get, e.g. 0.2 for 20%%"
+        )
+
+    def handle(self, *args, **options):
+        """
+        """
+        stages = [stage.strip() for stage in options['stages'].split(',')] if options['stages'] else list(benchmark.ANALYSIS_STAGES)
+        unknown = [stage for stage in stages if stage not in benchmark.ANALYSIS_STAGES]
+        if unknown:
+            raise CommandError(f"Unknown stages: {', '.join(unknown)}.  Expected some of {', '.join(benchmark.ANALYSIS_STAGES)}")
+
+        if options['import'] and options['snapshots'] < 1:
+            raise CommandError("--snapshots must be at least 1")
+
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Can't read baseline {options['baseline']}: {e}")
+
+        parameters = {
+            'listings': options['listings'],
+            'items': options['items'],
+            'outlier_rate': options['outlier_rate'],
+            'seed': options['seed'],
+            'workers': options['workers'],
+            'snapshots': options['snapshots'] if options['import'] else 0,
+        }
+        if baseline is not None and baseline.get('parameters') != parameters:
+            raise CommandError(f"Baseline was run with different parameters: {baseline.get('parameters')}")
+
+        try:
+            snapshots = [synthetic.generate_listings(options['listings'], options['items'], seed=options['seed'], outlier_rate=options['outlier_rate'])]
+        except ValueError as e:
+            raise CommandError(str(e))
+        for i in range(1, max(2, parameters['snapshots'])):
+            snapshots.append(synthetic.next_listings(snapshots[-1], seed=options['seed'] + i, outlier_rate=options['outlier_rate']))
+
+        results = {
+            'started': datetime.now(timezone.utc).isoformat(),
+            'parameters': parameters,
+            'environment': benchmark.environment(),
+            'stages': benchmark.run_analysis_benchmarks(
+                snapshots[0], snapshots[1], stages=stages, repeat=options['repeat'], workers=options['workers'], seed=options['seed']
+            ),
+        }
+
+        if options['import']:
+            old_name = connection.settings_dict['NAME']
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                results['stages'].update(benchmark.run_import_benchmark(snapshots[:parameters['snapshots']]))
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        regressions = []
+        if baseline is not None:
+            results['comparison'], regressions = benchmark.compare_results(results, baseline, options['tolerance'])
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+
+        self.stdout.write(self.style.SUCCESS(json.dumps(results, indent=2)))
+
+        if regressions:
+            raise CommandError(f"Stages slower than the baseline by more than {options['tolerance']:.0%}: {', '.join(regressions)}")
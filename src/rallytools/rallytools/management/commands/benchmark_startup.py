@@ -0,0 +1,72 @@
+import json
+from django.core.management import get_commands
+from django.core.management.base import BaseCommand, CommandError
+from rallytools import startup
+
+
+class Command(BaseCommand):
+    """
+    """
+    help = "Reports the time and memory manage.py and each management command take to import, each in a fresh process"
+
+    def add_arguments(self, parser):
+        """
+        """
+        parser.add_argument(
+            "--commands",
+            action="store",
+            required=False,
+            help="Comma separated commands to measure.  Defaults to this project's commands"
+        )
+
+        parser.add_argument(
+            "--repeat",
+            action="store",
+            type=int,
+            default=3,
+            help="Runs per command.  The fastest run is reported"
+        )
+
+        parser.add_argument(
+            "--max-seconds",
+            action="store",
+            type=float,
+            required=False,
+            help="Fail if any command takes longer than this to import"
+        )
+
+    def handle(self, *args, **options):
+        """
+        """
+        available = get_commands()
+        if options['commands']:
+            names = [name.strip() for name in options['commands'].split(',')]
+            unknown = [name for name in names if name not in available]
+            if unknown:
+                raise CommandError(f"Unknown commands: {', '.join(unknown)}")
+        else:
+            names = sorted(name for name, app in available.items() if not app.startswith('django.'))
+
+        def best(**kwargs):
+            runs = [startup.measure_imports(**kwargs) for _ in range(max(1, options['repeat']))]
+            return min(runs, key=lambda run: run['import_seconds'])
+
+        def summary(run):
+            return {
+                'wall_seconds': round(run['wall_seconds'], 3),
+                'import_seconds': round(run['import_seconds'], 3),
+                'max_rss_mb': round(run['max_rss_mb'], 1),
+                'heavy_modules': run['heavy_modules'],
+            }
+
+        # What every manage.py invocation pays before a command is even loaded
+        results = {'manage.py': summary(best(django_setup=True)), 'commands': {}}
+        for name in names:
+            results['commands'][name] = summary(best(command=(available[name], name)))
+
+        self.stdout.write(self.style.SUCCESS(json.dumps(results, indent=2)))
+
+        if options['max_seconds'] is not None:
+            slow = {name: run['import_seconds'] for name, run in results['commands'].items() if run['import_seconds'] > options['max_seconds']}
+            if slow:
+                raise CommandError(f"Commands slower to import than {options['max_seconds']}s: {slow}")
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from rallytools import settings
+from auctionhouse import candles
+from lib.candles import INTERVALS
+
+
+class Command(BaseCommand):
+    """
+    """
+    help = "Rebuilds the OHLC candles of a region from every stored commodities snapshot.  Imports keep them up to date afterwards"
+
+    def add_arguments(self, parser):
+        """
+        """
+        parser.add_argument(
+            "--region",
+            action="store",
+            required=False,
+            help="Region to rebuild, e.g. us or eu.  Defaults to every one of BATTLENET_REGIONS"
+        )
+
+        parser.add_argument(
+            "--intervals",
+            action="store",
+            required=False,
+            help="Comma separated intervals to rebuild, e.g. 1h,1d.  Defaults to CANDLE_INTERVALS"
+        )
+
+    def handle(self, *args, **options):
+        """
+        """
+        regions = [options['region']] if options['region'] else settings.BATTLENET_REGIONS
+        intervals = [interval.strip() for interval in options['intervals'].split(',')] if options['intervals'] else settings.CANDLE_INTERVALS
+        unknown = [interval for interval in intervals if interval not in INTERVALS]
+        if unknown:
+            raise CommandError(f"Unknown intervals: {', '.join(unknown)}.  Expected some of {', '.join(INTERVALS)}")
+
+        results = {region: {"num_candles": candles.rebuild_candles(region, intervals)} for region in regions}
+
+        self.stdout.write(self.style.SUCCESS(results))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from rallytools import settings
+from auctionhouse import sketches
+
+
+class Command(BaseCommand):
+    """
+    """
+    help = "Rebuilds the daily market price sketches of a region from every stored commodities snapshot.  Imports keep them up to date afterwards"
+
+    def add_arguments(self, parser):
+        """
+        """
+        parser.add_argument(
+            "--region",
+            action="store",
+            required=False,
+            help="Region to rebuild, e.g. us or eu.  Defaults to every one of BATTLENET_REGIONS"
+        )
+
+    def handle(self, *args, **options):
+        """
+        """
+        regions = [options['region']] if options['region'] else settings.BATTLENET_REGIONS
+
+        results = {region: {"num_sketches": sketches.rebuild_sketches(region)} for region in regions}
+
+        self.stdout.write(self.style.SUCCESS(results))
@@ -5,7 +5,17 @@ from auctionhouse.jobs import AuctionHouseImporter
 class Command(BaseCommand):
     """
     """
-    help = "Imports all Auction House commodities data from a battlenet snapshot"
+    help = "Imports all Auction House commodities data from a battlenet snapshot, for every configured region at once"
+
+    def add_arguments(self, parser):
+        """
+        """
+        parser.add_argument(
+            "--regions",
+            action="store",
+            required=False,
+            help="Comma separated regions to import, e.g. us,eu.  Defaults to BATTLENET_REGIONS"
+        )
 
     def handle(self, *args, **options):
         """
@@ -13,7 +23,8 @@ class Command(BaseCommand):
 
         ahi = AuctionHouseImporter()
 
-        results = ahi.import_commodities()
+        regions = [region.strip() for region in options['regions'].split(',')] if options['regions'] else None
+        results = ahi.import_commodities(regions=regions)
 
         self.stdout.write(self.style.SUCCESS(results))
 
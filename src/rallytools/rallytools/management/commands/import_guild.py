@@ -24,11 +24,18 @@ class Command(BaseCommand):
             help="Realm name/slug"
         )
 
+        parser.add_argument(
+            "--region",
+            action="store",
+            required=False,
+            help="Guild region, e.g. us or eu.  Defaults to the first of BATTLENET_REGIONS"
+        )
+
     def handle(self, *args, **options):
         """
         """
 
         gdi = GuildDataImporter()
-        results = gdi.import_guild(options['realm'], options['guild'])
+        results = gdi.import_guild(options['realm'], options['guild'], region=options['region'])
 
         self.stdout.write(self.style.SUCCESS(results))
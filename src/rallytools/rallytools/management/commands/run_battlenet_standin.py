@@ -0,0 +1,101 @@
+from django.core.management.base import BaseCommand, CommandError
+from lib.standin import BattleNetStandInServer
+
+
+class Command(BaseCommand):
+    """
+    """
+    help = "Serves recorded Battle.net fixtures locally, with optional latency, error and 429 injection"
+
+    def add_arguments(self, parser):
+        """
+        """
+        parser.add_argument(
+            "--fixtures",
+            action="store",
+            required=True,
+            help="Fixture directory written with BATTLENET_TRANSPORT=record"
+        )
+
+        parser.add_argument(
+            "--host",
+            action="store",
+            default="127.0.0.1",
+            help="Interface to bind"
+        )
+
+        parser.add_argument(
+            "--port",
+            action="store",
+            type=int,
+            default=8765,
+            help="Port to bind"
+        )
+
+        parser.add_argument(
+            "--latency-ms",
+            action="store",
+            type=float,
+            default=0,
+            help="Milliseconds added to every request"
+        )
+
+        parser.add_argument(
+            "--error-rate",
+            action="store",
+            type=float,
+            default=0,
+            help="Fraction of requests answered with 502"
+        )
+
+        parser.add_argument(
+            "--throttle-rate",
+            action="store",
+            type=float,
+            default=0,
+            help="Fraction of requests answered with 429"
+        )
+
+        parser.add_argument(
+            "--retry-after",
+            action="store",
+            type=float,
+            default=1,
+            help="Retry-After seconds sent with injected 429s"
+        )
+
+        parser.add_argument(
+            "--seed",
+            action="store",
+            type=int,
+            default=None,
+            help="Seed for reproducible fault injection"
+        )
+
+    def handle(self, *args, **options):
+        """
+        """
+        if options['error_rate'] + options['throttle_rate'] > 1:
+            raise CommandError("--error-rate and --throttle-rate can't add up to more than 1")
+
+        server = BattleNetStandInServer(
+            options['fixtures'],
+            host=options['host'],
+            port=options['port'],
+            latency=options['latency_ms'] / 1000,
+            error_rate=options['error_rate'],
+            throttle_rate=options['throttle_rate'],
+            retry_after=options['retry_after'],
+            seed=options['seed']
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Battle.net stand-in serving {options['fixtures']} on {server.url}. "
+            f"Set BATTLENET_API_HOST={server.url} and BATTLENET_TOKEN_URL={server.url}/oauth/token"
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -24,11 +24,18 @@ class Command(BaseCommand):
             help="Realm name/slug"
         )
 
+        parser.add_argument(
+            "--region",
+            action="store",
+            required=False,
+            help="Guild region, to tell apart guilds with the same name and realm"
+        )
+
     def handle(self, *args, **options):
         """
         """
 
         gdi = GuildDataImporter()
-        results = gdi.sync_guild_roster(options['realm'], options['guild'])
+        results = gdi.sync_guild_roster(options['realm'], options['guild'], region=options['region'])
 
         self.stdout.write(self.style.SUCCESS(results))
@@ -178,6 +178,53 @@ DISCORD_CLIENT_SECRET = getenv('DISCORD_CLIENT_SECRET')
 BATTLENET_CLIENT_ID = getenv('BATTLENET_CLIENT_ID')
 BATTLENET_CLIENT_SECRET = getenv('BATTLENET_CLIENT_SECRET')
 BATTLENET_CLIENT_REGION = getenv('BATTLENET_CLIENT_REGION')
+# Regions commodities are imported for, comma separated.  The first one also serves static game data
+BATTLENET_REGIONS = [region.strip().lower() for region in getenv('BATTLENET_REGIONS', BATTLENET_CLIENT_REGION or 'us').split(',') if region.strip()]
+BATTLENET_POOL_SIZE = int(getenv('BATTLENET_POOL_SIZE', 10))
+BATTLENET_MAX_CONCURRENCY = int(getenv('BATTLENET_MAX_CONCURRENCY', 10))
+# Where clients share OAuth tokens and rate limit state: 'memory' (this process), 'file' (this host) or 'cache' (Django cache).
+# Sync job checkpoints live there too, so stopped syncs only resume in a later run with 'file' or 'cache'
+BATTLENET_SHARED_STATE_BACKEND = getenv('BATTLENET_SHARED_STATE_BACKEND', 'memory')
+# Directory for the 'file' backend, or cache alias for the 'cache' backend
+BATTLENET_SHARED_STATE_LOCATION = getenv('BATTLENET_SHARED_STATE_LOCATION')
+# SQLite file caching static namespace responses for conditional requests.  Set to an empty string to disable
+BATTLENET_HTTP_CACHE_PATH = getenv('BATTLENET_HTTP_CACHE_PATH', str(BASE_DIR / 'battlenet_http_cache.sqlite3'))
+# 'live', 'record' (live + save fixtures) or 'replay' (fixtures only)
+BATTLENET_TRANSPORT = getenv('BATTLENET_TRANSPORT', 'live')
+BATTLENET_FIXTURE_DIR = getenv('BATTLENET_FIXTURE_DIR')
+# Override the Battle.net endpoints, e.g. to point at run_battlenet_standin
+BATTLENET_API_HOST = getenv('BATTLENET_API_HOST')
+BATTLENET_TOKEN_URL = getenv('BATTLENET_TOKEN_URL')
+BATTLENET_CONNECT_TIMEOUT = float(getenv('BATTLENET_CONNECT_TIMEOUT', 5))
+BATTLENET_READ_TIMEOUT = float(getenv('BATTLENET_READ_TIMEOUT', 30))
+# Circuit breaker: fail fast once this fraction of the requests in the window failed (given enough requests)
+BATTLENET_CIRCUIT_FAILURE_RATE = float(getenv('BATTLENET_CIRCUIT_FAILURE_RATE', 0.5))
+BATTLENET_CIRCUIT_MIN_REQUESTS = int(getenv('BATTLENET_CIRCUIT_MIN_REQUESTS', 20))
+BATTLENET_CIRCUIT_WINDOW_SECONDS = int(getenv('BATTLENET_CIRCUIT_WINDOW_SECONDS', 60))
+# Seconds the circuit stays open before a probe request is let through
+BATTLENET_CIRCUIT_OPEN_SECONDS = float(getenv('BATTLENET_CIRCUIT_OPEN_SECONDS', 30))
+# Total retries one import job may spend across all of its requests
+BATTLENET_RETRY_BUDGET = int(getenv('BATTLENET_RETRY_BUDGET', 100))
+# Decoder for API responses: 'auto' (orjson when installed), 'orjson' or 'json'.  Streamed commodities snapshots
+# (BATTLENET_STREAM_COMMODITIES) are always parsed with the json module
+BATTLENET_JSON_BACKEND = getenv('BATTLENET_JSON_BACKEND', 'auto')
+# Parse the commodities snapshot incrementally as it downloads (low memory, json module only), or download it whole
+# and decode it in one call with BATTLENET_JSON_BACKEND, which is faster with orjson.  Compare both on your data
+# with the benchmark_json command
+BATTLENET_STREAM_COMMODITIES = getenv('BATTLENET_STREAM_COMMODITIES', 'True').lower() in ('true', '1', 'yes')
+# Processes the market analysis of a snapshot is spread over; 0 for one per core.  Snapshots with fewer
+# listings than MARKET_ANALYSIS_PARALLEL_MIN_LISTINGS are analyzed in the importing process
+MARKET_ANALYSIS_WORKERS = int(getenv('MARKET_ANALYSIS_WORKERS', 0))
+MARKET_ANALYSIS_PARALLEL_MIN_LISTINGS = int(getenv('MARKET_ANALYSIS_PARALLEL_MIN_LISTINGS', 200000))
+# Candle intervals updated after every commodities import, comma separated (see lib.candles.INTERVALS)
+CANDLE_INTERVALS = [interval.strip() for interval in getenv('CANDLE_INTERVALS', '1h,1d,1w').split(',') if interval.strip()]
+# Accuracy/size trade-off of the daily market price sketches kept for percentile queries (see lib.sketches.TDigest)
+PRICE_SKETCH_COMPRESSION = int(getenv('PRICE_SKETCH_COMPRESSION', 100))
+# Rendered auction house charts are cached in this Django cache until a new snapshot is imported, or for at most CHART_CACHE_SECONDS
+CHART_CACHE_ALIAS = getenv('CHART_CACHE_ALIAS', 'default')
+CHART_CACHE_SECONDS = int(getenv('CHART_CACHE_SECONDS', 3600))
+# Charts rendered at once; further requests wait their turn
+CHART_RENDER_WORKERS = int(getenv('CHART_RENDER_WORKERS', 2))
 
 WARCRAFTLOGS_CLIENT_ID = getenv('WARCRAFTLOGS_CLIENT_ID')
 WARCRAFTLOGS_CLIENT_SECRET = getenv('WARCRAFTLOGS_CLIENT_SECRET')
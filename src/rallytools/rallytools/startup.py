@@ -0,0 +1,69 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+# Libraries only the code paths that use them may import (charts, reference implementations)
+HEAVY_MODULES = ('matplotlib', 'pandas', 'sklearn', 'scipy')
+
+# Runs in a fresh interpreter, so nothing the caller already imported is counted
+PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+options = json.loads(sys.argv[1])
+results = {}
+if options['django_setup']:
+    import django
+    django.setup()
+    results['setup_seconds'] = time.perf_counter() - started
+from importlib import import_module
+for module in options['modules']:
+    import_module(module)
+if options['command']:
+    from django.core.management import load_command_class
+    load_command_class(*options['command'])
+results['import_seconds'] = time.perf_counter() - started
+results['max_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+results['heavy_modules'] = sorted(module for module in options['heavy_modules'] if module in sys.modules)
+print(json.dumps(results))
+"""
+
+
+def measure_imports(modules=(), command=None, django_setup=False):
+    """
+    Measures what importing modules, or loading a management command, costs a new process.
+
+    Args:
+        modules (iterable, optional): Modules to import.
+        command (tuple, optional): (app_name, command_name) of a management command to load, like manage.py does.
+        django_setup (bool, optional): Set up Django first, with the DJANGO_SETTINGS_MODULE of the environment.
+                                       Implied by command.
+
+    Returns:
+        dict: 'wall_seconds' (including interpreter startup), 'import_seconds', 'setup_seconds' (with django_setup),
+              'max_rss_mb' and the HEAVY_MODULES that ended up imported, as 'heavy_modules'.
+    """
+    options = {
+        'modules': list(modules),
+        'command': list(command) if command else None,
+        'django_setup': django_setup or command is not None,
+        'heavy_modules': HEAVY_MODULES,
+    }
+    started = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, '-c', PROBE, json.dumps(options)],
+        cwd=BASE_DIR,
+        env=os.environ.copy(),
+        capture_output=True,
+        text=True,
+    )
+    wall_seconds = time.perf_counter() - started
+    if process.returncode:
+        raise RuntimeError(f"Import probe failed: {process.stderr.strip()}")
+    results = json.loads(process.stdout.strip().splitlines()[-1])
+    results['wall_seconds'] = wall_seconds
+    return results